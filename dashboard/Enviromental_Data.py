@@ -5,94 +5,47 @@ import pandas as pd
 from datetime import datetime
 import time as t
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
-import requests
+import charts
+import telemetry_data
 
 def get_sensor_data():
-    try:
-        # Utiliser l'URL correcte pour récupérer les données
-        response = requests.get("http://192.168.174.45:8000/get_data/")
-        response.raise_for_status()
-        data = response.json()
-        # Assurez-vous que les données sont au format liste de dictionnaires
-        if isinstance(data, dict):
-            data = [data]
-        
-        return data
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération des données : {e}")
-        return []
+    """Returns the most recent sample from the shared cache (None before the first one)."""
+    cache = telemetry_data.get_cache()
+    if cache.error:
+        st.error(f"Erreur lors de la récupération des données : {cache.error}")
+    return cache.latest()
 
 # Set Seaborn style for better aesthetics
-sns.set(style="whitegrid")
 
-def plot_temperature_history(time_stamps_filtered, temperature_filtered, start_of_day, end_of_day):
-    plt.figure(figsize=(8, 4))
-    plt.xlim([start_of_day, end_of_day])
-    plt.plot(time_stamps_filtered, temperature_filtered, marker='o', color='green', linestyle='-', linewidth=2, markersize=6)
-    plt.xlabel('Hour', fontsize=12)
-    plt.ylabel('Temperature (°C)', fontsize=12)
-    plt.title('Temperature History', fontsize=14, loc='center')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    st.pyplot(plt)
+def history_charts():
+    """Temperature, humidity and light level charts of the current session."""
+    return [
+        charts.session_chart('temperature', lambda: charts.HistoryChart(
+            'temperature', 'Temperature History', 'Temperature (°C)', 'green')),
+        charts.session_chart('humidity', lambda: charts.HistoryChart(
+            'humidity', 'Humidity History', 'Humidity (%)', 'royalblue')),
+        charts.session_chart('current_light_level', lambda: charts.HistoryChart(
+            'current_light_level', 'Light Level History', 'Light Level (lux)', 'darkorange')),
+    ]
 
-def plot_humidity_history(time_stamps_filtered,humidity_filtered,start_of_day,end_of_day):
-
-    plt.figure(figsize=(8, 4))
-    plt.xlim([start_of_day, end_of_day])
-    plt.plot(time_stamps_filtered, humidity_filtered, marker='o', color='royalblue', linestyle='-', linewidth=2, markersize=6)
-    plt.xlabel('Hour', fontsize=12)
-    plt.ylabel('Humidity (%)', fontsize=12)
-    plt.title('Humidity History', fontsize=14, loc='center')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    st.pyplot(plt)
-
-def plot_light_level_history(time_stamps_filtered, light_levels_filtered, start_of_day, end_of_day):
-    plt.figure(figsize=(8, 4))
-    plt.xlim([start_of_day, end_of_day])
-    plt.plot(time_stamps_filtered, light_levels_filtered, marker='o', color='darkorange', linestyle='-', linewidth=2, markersize=6)
-    plt.xlabel('Hour', fontsize=12)
-    plt.ylabel('Light Level (lux)', fontsize=12)
-    plt.title('Light Level History', fontsize=14, loc='center')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    st.pyplot(plt)
-
-def main():
+def main(view=None):
+    """Environmental page; ``view`` is the (start, end) range to chart, None for today live."""
     st.markdown("<h1 style='text-align: center; font-size: 24px; color: royalblue;'>Environmental Data</h1>", unsafe_allow_html=True)
     data = get_sensor_data()
-    if data:
-        new_df = pd.DataFrame(data)
-        if os.path.exists('position_data.csv'):
-            try:
-                existing_df = pd.read_csv('position_data.csv', on_bad_lines='skip')
-                df = pd.concat([existing_df, new_df], ignore_index=True)
-            except pd.errors.EmptyDataError:
-                df = new_df
-        else:
-            df = new_df
-        df.to_csv('position_data.csv', index=False)
+    if data is not None:
         # Filtrer les données pour n'inclure que celles du jour en cours
         start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_day = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
 
-        # Convertir la colonne 'datetime' en objets datetime
-        df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
-        # Filtrer les données pour inclure uniquement celles du jour en cours
-        df_filtered = df[(df['datetime'] >= start_of_day) & (df['datetime'] <= end_of_day)]
-
-        # Mettre à jour le tracé en fonction des données filtrées
-        time_stamps_filtered = df_filtered['datetime']
-        light_levels_filtered = df_filtered['current_light_level']
-        temperature_filtered = df_filtered['temperature']
-        humidity_filtered = df_filtered['humidity']
-        data = data[-1]
+        # Aujourd'hui : ajouter les seuls échantillons reçus depuis le dernier rafraîchissement ;
+        # autre période : points représentatifs tirés de la pyramide de sous-échantillonnage
+        cache = telemetry_data.get_cache()
+        temperature_chart, humidity_chart, light_level_chart = history_charts()
+        for chart in (temperature_chart, humidity_chart, light_level_chart):
+            if view is None:
+                chart.refresh(cache, start_of_day, end_of_day)
+            else:
+                chart.show(cache.pyramid, *view)
     
         temperature = data.get('temperature', 'N/A')
         humidity = data.get('humidity', 'N/A')
@@ -191,12 +144,12 @@ def main():
     
         with col4:
             st.subheader("Temperature History")
-            plot_temperature_history(time_stamps_filtered, temperature_filtered, start_of_day, end_of_day)
+            temperature_chart.render()
         col5 = st.columns(1)[0]
         with col5:
             st.subheader("humidity History")
-            plot_humidity_history(time_stamps_filtered,humidity_filtered,start_of_day,end_of_day)
+            humidity_chart.render()
         col6 = st.columns(1)[0]
         with col6:
             st.subheader("light_level History")
-            plot_light_level_history(time_stamps_filtered, light_levels_filtered, start_of_day, end_of_day) 
\ No newline at end of file
+            light_level_chart.render() 
\ No newline at end of file
@@ -7,23 +7,53 @@ import plotly.graph_objects as go
 import streamlit as st
 import matplotlib.pyplot as plt
 import requests
+import telemetry_data
+import telemetry_client
 from fpdf import FPDF
 from io import BytesIO
 
+SERVER_URL = telemetry_data.SERVER_URL
+VEHICLE_ID = "ugv-1"
+
 def get_sensor_data():
+    """Returns the most recent sample from the shared cache (None before the first one)."""
+    cache = telemetry_data.get_cache()
+    if cache.error:
+        st.error(f"Erreur lors de la récupération des données : {cache.error}")
+    return cache.latest()
+
+def sync_alarm_rule(rule_id, field, kind, threshold, active=True):
+    """Pushes a threshold set on this page to the server alarm engine when it changed.
+
+    When the alarm is disabled, the rule this session pushed is deleted on the server.
+    """
+    pushed_rules = st.session_state.setdefault('pushed_alarm_rules', {})
     try:
-        # Utiliser l'URL correcte pour récupérer les données
-        response = requests.get("http://192.168.100.77:8000/get_data/")
-        response.raise_for_status()
-        data = response.json()
-        # Assurez-vous que les données sont au format liste de dictionnaires
-        if isinstance(data, dict):
-            data = [data]
-        
-        return data
+        if not active:
+            if rule_id in pushed_rules:
+                # Une règle déjà absente du serveur (404) est considérée comme supprimée
+                telemetry_client.delete(f"{SERVER_URL}/alarms/rules/{rule_id}")
+                del pushed_rules[rule_id]
+            return
+        if threshold is None or pushed_rules.get(rule_id) == threshold:
+            return
+        telemetry_client.put_json(f"{SERVER_URL}/alarms/rules/{rule_id}",
+                                  {"id": rule_id, "field": field, "kind": kind, "threshold": threshold})
+        pushed_rules[rule_id] = threshold
     except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération des données : {e}")
-        return []
+        st.error(f"Erreur lors de la mise à jour de la règle d'alarme : {e}")
+
+def toggle_alarm(state_key):
+    """Enables or disables one alarm of the page (button callback, run before the page)."""
+    st.session_state[state_key] = not st.session_state[state_key]
+
+def get_active_alarms():
+    """Returns {rule_id: raising event} for the alarms currently active on the server."""
+    try:
+        alarms = telemetry_client.get_json(f"{SERVER_URL}/alarms/active", params={"vehicle_id": VEHICLE_ID})
+        return {alarm['rule_id']: alarm for alarm in alarms}
+    except requests.exceptions.RequestException:
+        return {}
 
 # Function to generate PDF report
 def generate_pdf_report(selected_date, daily_produced_energy, operating_time, data_report_list):
@@ -166,8 +196,8 @@ def setup_alarm_controls():
 
     # Battery alarm controls
     with col1:
-        if st.button("Enable battery alarm", key="battery_alarm_button"):
-            st.session_state.battery_alarm_active = True
+        st.button("Disable battery alarm" if st.session_state.battery_alarm_active else "Enable battery alarm", key="battery_alarm_button",
+                  on_click=toggle_alarm, args=('battery_alarm_active',))
 
     with col2:
         if st.session_state.battery_alarm_active:
@@ -183,8 +213,8 @@ def setup_alarm_controls():
     # Temperature alarm controls
     col1, col2, col4_Temperature = st.columns([1, 2, 2])
     with col1:
-        if st.button("Enable Temperature Alarm", key="temperature_alarm_button"):
-            st.session_state.temperature_alarm_active = True
+        st.button("Disable Temperature Alarm" if st.session_state.temperature_alarm_active else "Enable Temperature Alarm", key="temperature_alarm_button",
+                  on_click=toggle_alarm, args=('temperature_alarm_active',))
 
     with col2:
         if st.session_state.temperature_alarm_active:
@@ -199,8 +229,8 @@ def setup_alarm_controls():
     # Light level alarm controls
     col1, col2, col4_light = st.columns([1, 2, 2])
     with col1:
-        if st.button("Enable light level alarm", key="light_level_alarm_button"):
-            st.session_state.light_level_alarm_active = True
+        st.button("Disable light level alarm" if st.session_state.light_level_alarm_active else "Enable light level alarm", key="light_level_alarm_button",
+                  on_click=toggle_alarm, args=('light_level_alarm_active',))
 
     with col2:
         if st.session_state.light_level_alarm_active:
@@ -215,8 +245,8 @@ def setup_alarm_controls():
     # Humidity alarm controls
     col1, col2, col4_humidity = st.columns([1, 2, 2])
     with col1:
-        if st.button("Enable humidity alarm", key="humidity_alarm_button"):
-            st.session_state.humidity_alarm_active = True
+        st.button("Disable humidity alarm" if st.session_state.humidity_alarm_active else "Enable humidity alarm", key="humidity_alarm_button",
+                  on_click=toggle_alarm, args=('humidity_alarm_active',))
 
     with col2:
         if st.session_state.humidity_alarm_active:
@@ -233,28 +263,27 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
     start_of_day = datetime.combine(selected_date, time.min)
     end_of_day = datetime.combine(selected_date, time.max)
 
-    data = get_sensor_data()
-    if data:
-        new_df = pd.DataFrame(data)
-        if os.path.exists('position_data.csv'):
-            try:
-                existing_df = pd.read_csv('position_data.csv', on_bad_lines='skip')
-                df = pd.concat([existing_df, new_df], ignore_index=True)
-            except pd.errors.EmptyDataError:
-                df = new_df
-        else:
-            df = new_df
-        df.to_csv('position_data.csv', index=False)
-        
-        # Convertir la colonne 'datetime' en objets datetime
-        df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
+    # Transmettre les seuils au serveur, qui les évalue sur chaque échantillon reçu ; une alarme désactivée y est supprimée
+    battery_active = st.session_state.battery_alarm_active
+    sync_alarm_rule('battery_level_min', 'battery_level', 'min', battery_min, battery_active)
+    sync_alarm_rule('battery_level_max', 'battery_level', 'max', battery_max, battery_active)
+    temperature_active = st.session_state.temperature_alarm_active
+    sync_alarm_rule('temperature_min', 'temperature', 'min', temperature_min, temperature_active)
+    sync_alarm_rule('temperature_max', 'temperature', 'max', temperature_max, temperature_active)
+    light_level_active = st.session_state.light_level_alarm_active
+    sync_alarm_rule('current_light_level_min', 'current_light_level', 'min', light_level_min, light_level_active)
+    sync_alarm_rule('current_light_level_max', 'current_light_level', 'max', light_level_max, light_level_active)
+    humidity_active = st.session_state.humidity_alarm_active
+    sync_alarm_rule('humidity_min', 'humidity', 'min', humidity_min, humidity_active)
+    sync_alarm_rule('humidity_max', 'humidity', 'max', humidity_max, humidity_active)
 
-        # Filtrer les données pour n'inclure que celles du jour sélectionné
-        df_filtered = df[(df['datetime'] >= start_of_day) & (df['datetime'] <= end_of_day)]
+    data = get_sensor_data()
+    if data is not None:
+        # Lire uniquement les données du jour sélectionné (en mémoire pour les jours récents)
+        df_filtered = telemetry_data.get_cache().read_range(start_of_day, end_of_day)
      
-        daily_energy_filtered = df_filtered['current_energy']
-        daily_produced_energy = daily_energy_filtered.sum() / 3600
-        daily_produced_energy = round(float(daily_produced_energy), 2)
+        # Énergie du jour intégrée par le cache (trapèzes sur les écarts réels entre échantillons)
+        daily_produced_energy = round(telemetry_data.get_cache().energy.day(selected_date), 2)
         operating_time = df_filtered['operating_time'].dropna().iloc[-1] if not df_filtered['operating_time'].dropna().empty else None
 
         # Sélectionner uniquement les colonnes d'intérêt
@@ -277,7 +306,6 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
                 first_values.append(None)  # Ajouter None si la liste est vide
         data_report_list = first_values
 
-        data = data[-1]
         temperature = data.get('temperature', 'N/A')
         humidity = data.get('humidity', 'N/A')
         light_level = data.get('current_light_level', 'N/A')
@@ -291,10 +319,17 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
         if battery_level != 'N/A':
             battery_level = round(float(battery_level), 2)
                  
+        # Alarmes actives côté serveur : elles couvrent aussi les dépassements survenus entre deux rafraîchissements
+        active_alarms = get_active_alarms()
+
         # Check battery level against thresholds
         with col4_battery:
             if st.session_state.battery_alarm_active:
-                if battery_level != 'N/A':
+                if 'battery_level_min' in active_alarms:
+                    b_p.error(f"🔋⚠️ Alert: Battery level too low. {round(active_alarms['battery_level_min']['value'], 2)} is less than {battery_min}")
+                elif 'battery_level_max' in active_alarms:
+                    b_p.error(f"🔋⚠️ Alert: Battery level too high. {round(active_alarms['battery_level_max']['value'], 2)} exceeds {battery_max}")
+                elif battery_level != 'N/A':
                     if battery_level < battery_min:
                         b_p.error(f"🔋⚠️ Alert: Battery level too low. {battery_level} is less than {battery_min}")
                     elif battery_level >= battery_max:
@@ -305,7 +340,11 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
         # Check temperature against thresholds
         with col4_Temperature :
             if st.session_state.temperature_alarm_active:
-                if temperature != 'N/A':
+                if 'temperature_min' in active_alarms:
+                    t_p.error(f"🌡️⚠️ Alert: Temperature too low. {round(active_alarms['temperature_min']['value'], 2)} is less than {temperature_min}")
+                elif 'temperature_max' in active_alarms:
+                    t_p.error(f"🌡️⚠️ Alert: Temperature too high. {round(active_alarms['temperature_max']['value'], 2)} exceeds {temperature_max}")
+                elif temperature != 'N/A':
                     if temperature < temperature_min:
                         t_p.error(f"🌡️⚠️ Alert: Temperature too low. {temperature} is less than {temperature_min}")
                     elif temperature > temperature_max:
@@ -316,7 +355,11 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
         # Check light level against thresholds
         with col4_light :
             if st.session_state.light_level_alarm_active:
-                if light_level != 'N/A':
+                if 'current_light_level_min' in active_alarms:
+                    l_p.error(f"🔆⚠️ Alert: Light level too low. {round(active_alarms['current_light_level_min']['value'], 2)} is less than {light_level_min}")
+                elif 'current_light_level_max' in active_alarms:
+                    l_p.error(f"🔆⚠️ Alert: Light level too high. {round(active_alarms['current_light_level_max']['value'], 2)} exceeds {light_level_max}")
+                elif light_level != 'N/A':
                     if light_level < light_level_min:
                         l_p.error(f"🔆⚠️ Alert: Light level too low. {light_level} is less than {light_level_min}")
                     elif light_level > light_level_max:
@@ -327,7 +370,11 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
         # Check humidity against thresholds
         with col4_humidity :
             if st.session_state.humidity_alarm_active:
-                if humidity != 'N/A':
+                if 'humidity_min' in active_alarms:
+                    h_p.error(f"💧⚠️ Alert: Humidity too low. {round(active_alarms['humidity_min']['value'], 2)} is less than {humidity_min}")
+                elif 'humidity_max' in active_alarms:
+                    h_p.error(f"💧⚠️ Alert: Humidity too high. {round(active_alarms['humidity_max']['value'], 2)} exceeds {humidity_max}")
+                elif humidity != 'N/A':
                     if humidity < humidity_min:
                         h_p.error(f"💧⚠️ Alert: Humidity too low. {humidity} is less than {humidity_min}")
                     elif humidity > humidity_max:
@@ -348,10 +395,13 @@ def main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_li
 def run_periodically():
     placeholder = st.empty()
     d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_light, col4_humidity, selected_date, battery_min, battery_max, temperature_min, temperature_max, light_level_min, light_level_max, humidity_min, humidity_max = setup_alarm_controls()
+    cache = telemetry_data.get_cache()
     while True:
+        version = cache.version
         with placeholder.container():
             main3(d_p, b_p, t_p, h_p,l_p, coll2, col4_battery, col4_Temperature, col4_light, col4_humidity, selected_date, battery_min, battery_max, temperature_min, temperature_max, light_level_min, light_level_max, humidity_min, humidity_max)
-        ttm.sleep(1)
+        # Attendre les prochaines données reçues par le cache partagé (au plus 1 seconde)
+        cache.wait(version, timeout=1)
 
 if __name__ == "__main__":
     run_periodically()
\ No newline at end of file
@@ -5,23 +5,23 @@ import pandas as pd
 import os
 import plotly.graph_objects as go
 import streamlit as st
-import matplotlib.pyplot as plt
-import requests
+import charts
+import telemetry_data
+import telemetry_store
+
+PAGE_SIZES = (25, 50, 100, 200)
+# Tableau par défaut : les derniers échantillons en tête
+DEFAULT_TABLE = {'sort': 'datetime', 'descending': True, 'filters': [], 'offset': 0, 'limit': PAGE_SIZES[1],
+                 'follow': True}
+# Colonnes proposées pour le filtre du tableau (valeurs numériques)
+FILTER_COLUMNS = [name for name, sql_type in telemetry_store.COLUMNS.items() if sql_type == 'REAL']
 
 def get_sensor_data():
-    try:
-        # Utiliser l'URL correcte pour récupérer les données
-        response = requests.get("http://192.168.174.45:8000/get_data/")
-        response.raise_for_status()
-        data = response.json()
-        # Assurez-vous que les données sont au format liste de dictionnaires
-        if isinstance(data, dict):
-            data = [data]
-        
-        return data
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération des données : {e}")
-        return []
+    """Returns the most recent sample from the shared cache (None before the first one)."""
+    cache = telemetry_data.get_cache()
+    if cache.error:
+        st.error(f"Erreur lors de la récupération des données : {cache.error}")
+    return cache.latest()
 
 def plot_gauge(indicator_number, indicator_color, indicator_suffix, indicator_title, max_bound):
     fig = go.Figure(
@@ -40,49 +40,95 @@ def plot_gauge(indicator_number, indicator_color, indicator_suffix, indicator_ti
     )
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_speed_history(time_stamps_filtered,velocity_total_filtered,start_of_day, end_of_day):
+def position_table_controls():
+    """Sort, filter and paging widgets of the Position History table; returns read_page arguments.
+
+    Like the range controls, call this once per run, before the refresh loop.
+    """
+    with st.expander("Position History table"):
+        col1, col2, col3, col4 = st.columns(4)
+        follow = col1.toggle("Follow latest", value=True, key="positions-follow")
+        page_size = col1.selectbox("Rows per page", PAGE_SIZES, index=1, key="positions-page-size")
+        sort = col2.selectbox("Sort by", list(telemetry_store.COLUMNS), key="positions-sort", disabled=follow)
+        descending = col2.checkbox("Descending", value=True, key="positions-descending", disabled=follow)
+        field = col3.selectbox("Filter on", ["(none)"] + FILTER_COLUMNS, key="positions-filter")
+        low = col3.number_input("Min", value=None, key="positions-min")
+        high = col4.number_input("Max", value=None, key="positions-max")
+        page = col4.number_input("Page", min_value=1, value=1, step=1, key="positions-page", disabled=follow)
+    if follow:
+        # Suivre les derniers échantillons : première page, plus récents en tête
+        sort, descending, page = 'datetime', True, 1
+    filters = [(field, low, high)] if field != "(none)" else []
+    return {'sort': sort, 'descending': descending, 'filters': filters,
+            'offset': (page - 1) * page_size, 'limit': page_size, 'follow': follow}
+
+def show_position_table(start, end, table):
+    """Displays one page of the Position History; only the visible rows are read and sent.
+
+    The row count and the page are read again only when the range or the
+    controls change; in follow mode each refresh reads the newest page (by
+    the datetime index) and counts only the samples newer than the last
+    refresh. The next page starts from the key of the last row of the page
+    before it instead of skipping rows with OFFSET.
+    """
+    key = (start, end, table['sort'], table['descending'], tuple(table['filters']), table['limit'])
+    state = st.session_state.setdefault('position_table', {})
+    if state.get('key') != key:
+        state.clear()
+        state.update(key=key, total=telemetry_store.count_rows(start, end, table['filters']), newest=None,
+                     bounds={}, page=None)
+    limit = table['limit']
+    if table.get('follow'):
+        rows = telemetry_store.read_page(start, end, 'datetime', True, table['filters'], 0, limit)
+        if not rows.empty:
+            newest = rows['datetime'].iloc[0]
+            if state['newest'] is not None and newest > state['newest']:
+                state['total'] += telemetry_store.count_rows(start, end, table['filters'], after=state['newest'])
+            state['newest'] = newest
+        offset = 0
+    else:
+        total = state['total']
+        # Page au-delà de la fin (historique filtré ou raccourci) : afficher la dernière
+        offset = min(table['offset'], max(0, (total - 1) // limit * limit))
+        if state['page'] is None or state['page'][0] != offset:
+            previous = state['bounds'].get(offset - limit)
+            # Clé de la dernière ligne de la page précédente (OFFSET si elle est inconnue ou NULL)
+            after = previous[1] if previous is not None and not pd.isna(previous[1][0]) else None
+            rows = telemetry_store.read_page(start, end, table['sort'], table['descending'], table['filters'],
+                                             offset, limit, after=after)
+            if not rows.empty:
+                state['bounds'][offset] = tuple((row[table['sort']], row['datetime'])
+                                                for row in (rows.iloc[0], rows.iloc[-1]))
+            state['page'] = (offset, rows)
+        rows = state['page'][1]
+    total = state['total']
+    st.caption(f"Rows {offset + 1 if total else 0}-{offset + len(rows)} of {total} "
+               f"(page {offset // limit + 1} of {max(1, -(-total // limit))})")
+    st.dataframe(rows, hide_index=True, use_container_width=True)
 
-    plt.figure(figsize=(20, 15))
-    plt.xlim([start_of_day, end_of_day])
-    plt.plot(time_stamps_filtered, velocity_total_filtered, marker='o', color='dodgerblue', linestyle='-', linewidth=2, markersize=30)
-    plt.xlabel('Hours', fontsize=30)
-    plt.ylabel('Speed Variation (km/h)', fontsize=30)
-    plt.title('Speed History', fontsize=34, loc='center')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    plt.tight_layout()
-    st.pyplot(plt)
+def main1(view=None, table=None):
+    """UGV page; ``view`` is the (start, end) range of the speed chart and table, None for today live.
 
-def main1():
+    ``table`` holds the Position History arguments from position_table_controls.
+    """
     st.markdown("<h1 style='text-align: center; font-size: 22px; color: royalblue;'>UGV Monitoring</h1>", unsafe_allow_html=True)
 
     data = get_sensor_data()
     #st.write("Données récupérées :", data)  # Affiche les données pour vérifier leur contenu
-    if data:
-        new_df = pd.DataFrame(data)
-        if os.path.exists('position_data.csv'):
-            try:
-                existing_df = pd.read_csv('position_data.csv', on_bad_lines='skip')
-                df = pd.concat([existing_df, new_df], ignore_index=True)
-            except pd.errors.EmptyDataError:
-                df = new_df
-        else:
-            df = new_df
-        df.to_csv('position_data.csv', index=False)
-        
+    if data is not None:
         # Filtrer les données pour n'inclure que celles du jour en cours
         start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         end_of_day = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
 
-        # Convertir la colonne 'datetime' en objets datetime
-        df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
-        # Filtrer les données pour inclure uniquement celles du jour en cours
-        df_filtered = df[(df['datetime'] >= start_of_day) & (df['datetime'] <= end_of_day)]
-        
-        # Mettre à jour le tracé en fonction des données filtrées
-        time_stamps_filtered = df_filtered['datetime']
-        velocity_total_filtered = df_filtered['velocity_total']
-        data = data[-1]
+        cache = telemetry_data.get_cache()
+
+        # Ajouter au graphique de vitesse les seuls nouveaux échantillons
+        speed_chart = charts.session_chart('velocity_total', lambda: charts.HistoryChart(
+            'velocity_total', 'Speed History', 'Speed Variation (km/h)', 'dodgerblue'))
+        if view is None:
+            speed_chart.refresh(cache, start_of_day, end_of_day)
+        else:
+            speed_chart.show(cache.pyramid, *view)
 
         # Create containers to update plots dynamically
         col1, col2, col3 = st.columns(3)
@@ -141,11 +187,11 @@ def main1():
         # Update position and speed history
         with col5:
             st.subheader("Position History")
-            st.write(df)
+            show_position_table(*(view or (start_of_day, end_of_day)), table or DEFAULT_TABLE)
 
         with col6:
             st.subheader("Speed History")
-            plot_speed_history(time_stamps_filtered,velocity_total_filtered,start_of_day, end_of_day)
+            speed_chart.render()
 
 if __name__ == "__main__":
     main1()
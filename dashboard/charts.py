@@ -0,0 +1,135 @@
+# Graphiques Plotly construits une fois par session puis complétés à chaque rafraîchissement
+from datetime import date, datetime, time, timedelta
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+import downsampling
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+# Périodes proposées par les pages d'historique (nombre de jours, None = aujourd'hui en direct)
+PERIODS = {'Today (live)': None, 'Last 7 days': 7, 'Last 30 days': 30, 'Last 365 days': 365, 'Custom': 0}
+
+
+def session_chart(name, factory):
+    """Returns the chart ``name`` of the current session, built by ``factory()`` on first use."""
+    charts = st.session_state.setdefault('charts', {})
+    if name not in charts:
+        charts[name] = factory()
+    return charts[name]
+
+
+def range_controls(key):
+    """Period and zoom widgets of a history page; returns (start, end), or None to follow today live.
+
+    Widgets cannot be repeated within one run: call this once, before the
+    refresh loop. Changing them reruns the page with the new range.
+    """
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        period = st.selectbox("Period", list(PERIODS), key=f"{key}-period")
+    days = PERIODS[period]
+    if days is None:
+        return None
+    today = date.today()
+    if days:
+        first, last = today - timedelta(days=days - 1), today
+    else:
+        with col2:
+            picked = st.date_input("Dates", (today - timedelta(days=6), today), max_value=today, key=f"{key}-dates")
+        # Pendant la sélection, une seule date est choisie
+        first, last = picked[0], picked[-1]
+    start, end = datetime.combine(first, time.min), datetime.combine(last, time.max)
+    # Clé liée aux dates : le zoom revient à toute la période quand la période change
+    return st.slider("Zoom", min_value=start, max_value=end, value=(start, end), step=timedelta(minutes=5),
+                     format="YYYY-MM-DD HH:mm", key=f"{key}-zoom-{first}-{last}")
+
+
+class _Chart:
+    """Common rendering: the figure is drawn by Plotly in the browser, nothing is rasterized here."""
+
+    def __init__(self, name, figure):
+        self.name = name
+        self.figure = figure
+        self._renders = 0
+
+    def render(self):
+        # Clé différente à chaque affichage : les pages redessinent dans une boucle au sein d'une même exécution
+        self._renders += 1
+        st.plotly_chart(self.figure, use_container_width=True, key=f"{self.name}-{self._renders}")
+
+
+class HistoryChart(_Chart):
+    """Line chart of one telemetry field, live over the current day or over any past range.
+
+    Each live ``refresh`` reads from the shared cache the samples newer
+    than the last point shown and appends them to the trace. The trace
+    starts from the downsampled day and is downsampled again whenever it
+    exceeds twice ``points``, so it stays small after days of uptime.
+    ``show`` displays a range of any length through the pyramid.
+    ``uirevision`` keeps the user's zoom across refreshes.
+    """
+
+    def __init__(self, field, title, y_label, color, marker_size=4, points=downsampling.DEFAULT_POINTS):
+        figure = go.Figure(go.Scattergl(x=[], y=[], mode='lines+markers', name=title,
+                                        line=dict(color=color, width=2), marker=dict(color=color, size=marker_size)))
+        figure.update_layout(title=dict(text=title, x=0.5), xaxis_title='Hour', yaxis_title=y_label,
+                             height=350, margin=dict(l=50, r=20, t=50, b=40))
+        super().__init__(field, figure)
+        self.field = field
+        self.points = points
+        self._start = None
+        self._view = None
+        self._times = np.empty(0, dtype='datetime64[us]')
+        self._values = np.empty(0)
+
+    def refresh(self, cache, start, end):
+        """Appends the samples of [start, end] that are not on the chart yet."""
+        if start != self._start or len(self._times) > 2 * self.points:
+            # Nouveau jour ou trace trop longue : repartir de la vue sous-échantillonnée
+            self._load(cache.pyramid.query(self.field, start, end, self.points), start, end)
+            self._start = start
+        since = start if not len(self._times) else pd.Timestamp(self._times[-1]) + pd.Timedelta(microseconds=1)
+        new = cache.read_range(since, end, columns=[self.field])
+        if new.empty:
+            return
+        self._times = np.concatenate([self._times, new['datetime'].to_numpy(dtype='datetime64[us]')])
+        self._values = np.concatenate([self._values, new[self.field].to_numpy(dtype=float)])
+        self.figure.data[0].update(x=self._times, y=self._values)
+
+    def show(self, pyramid, start, end):
+        """Displays about ``points`` points of [start, end]; queried again only while the range reaches now."""
+        if self._view == (start, end) and end < datetime.now():
+            return
+        self._load(pyramid.query(self.field, start, end, self.points), start, end)
+        self._view, self._start = (start, end), None
+
+    def _load(self, frame, start, end):
+        self._view = None
+        self._times = frame['datetime'].to_numpy(dtype='datetime64[us]')
+        self._values = frame[self.field].to_numpy(dtype=float)
+        # Nouvelle plage : le zoom fait dans le navigateur sur l'ancienne n'est pas conservé
+        self.figure.update_layout(uirevision=f"{self.field}-{start}-{end}")
+        self.figure.update_xaxes(range=[start, end])
+        self.figure.data[0].update(x=self._times, y=self._values)
+
+
+class EnergyChart(_Chart):
+    """Monthly production and cumulative consumption bars; only the 24 bar heights change."""
+
+    def __init__(self):
+        figure = make_subplots(rows=1, cols=2, subplot_titles=('Energy Production History',
+                                                               'Energy Consumption History'))
+        figure.add_trace(go.Bar(x=MONTH_NAMES, y=[0.0] * 12, marker_color='coral', opacity=0.7,
+                                name='Energy Produced'), row=1, col=1)
+        figure.add_trace(go.Bar(x=MONTH_NAMES, y=[0.0] * 12, marker_color='cornflowerblue', opacity=0.7,
+                                name='Energy Consumed'), row=1, col=2)
+        figure.update_xaxes(title_text='Month', tickangle=45)
+        figure.update_yaxes(title_text='Energy (Wh)')
+        figure.update_layout(height=400, showlegend=False, margin=dict(l=50, r=20, t=50, b=40), uirevision='energy')
+        super().__init__('energy', figure)
+
+    def update(self, monthly_sums, consumption):
+        self.figure.data[0].y = list(monthly_sums)
+        self.figure.data[1].y = list(consumption)
@@ -3,62 +3,33 @@ import numpy as np
 import pandas as pd
 from datetime import datetime
 import os
-import matplotlib.pyplot as plt
 import time as tmmm 
 from streamlit_option_menu import option_menu
 import Enviromental_Data
 import UGV_Monitoring
 import Report_Alarm
-import requests
+import charts
+import telemetry_data
 
 def get_sensor_data():
-    try:
-        # Utiliser l'URL correcte pour récupérer les données
-        response = requests.get("http://192.168.174.45:8000/get_data/")
-        response.raise_for_status()
-        data = response.json()
-        # Assurez-vous que les données sont au format liste de dictionnaires
-        if isinstance(data, dict):
-            data = [data]
-        
-        return data
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération des données : {e}")
-        return []
-
-def plot_energy_histories(monthly_sums, consumption):
-    """Plots energy production and consumption histories and displays them in Streamlit."""
-    
-    # Define month names
-    month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    """Returns the most recent sample from the shared cache (None before the first one)."""
+    cache = telemetry_data.get_cache()
+    if cache.error:
+        st.error(f"Erreur lors de la récupération des données : {cache.error}")
+    return cache.latest()
 
-    # Plotting
-    plt.figure(figsize=(12, 5))  # Smaller figure size for compact view
+def get_energy_sums(day, year):
+    """Returns the daily, lifetime and 12 monthly energies (Wh) of 'current_energy'.
 
-    # Adjust subplot parameters to shift the first plot to the left
-    plt.subplot(1, 2, 1, position=[0.1, 0.15, 0.4, 0.7])
-    plt.bar(month_names, monthly_sums, color='coral', alpha=0.7, label='Energy Produced')
-    plt.xlabel('Month')
-    plt.ylabel('Energy (Watts)')
-    plt.title('Energy Production History', fontsize=15)
-    plt.xticks(rotation=45, fontsize=8)
-    plt.yticks(fontsize=8)
-    plt.grid(True)
+    The shared cache integrates each new sample as it arrives, so these are
+    lookups whatever the length of the history.
+    """
+    energy = telemetry_data.get_cache().energy
+    return energy.day(day), energy.lifetime(), energy.months(year)
 
-    # Plot energy consumption
-    plt.subplot(1, 2, 2)
-    plt.bar(month_names, consumption, color='cornflowerblue', alpha=0.7, label='Energy Consumed')
-    plt.xlabel('Month')
-    plt.ylabel('Energy (Watts)')
-    plt.title('Energy Consumption History', fontsize=15)
-    plt.xticks(rotation=45, fontsize=8)
-    plt.yticks(fontsize=8)
-    plt.grid(True)
-
-    plt.tight_layout()
-    
-    # Display in Streamlit
-    st.pyplot(plt)
+def wait_for_new_data(version, timeout=1):
+    """Waits until the shared cache applied samples newer than 'version', at most 'timeout' seconds."""
+    telemetry_data.get_cache().wait(version, timeout=timeout)
 
 def main_loop():
     """Main loop to simulate periodic updates."""
@@ -95,62 +66,21 @@ def main_loop():
         placeholder = st.empty()
         
         while True:
+            version = telemetry_data.get_cache().version
             data = get_sensor_data()
 
-            if data: 
-                new_df = pd.DataFrame(data)
-                if os.path.exists('position_data.csv'):
-                    try:
-                        existing_df = pd.read_csv('position_data.csv', on_bad_lines='skip')
-                        df = pd.concat([existing_df, new_df], ignore_index=True)
-                    except pd.errors.EmptyDataError:
-                        df = new_df
-                else:
-                    df = new_df
-                df.to_csv('position_data.csv', index=False)
-                # Filtrer les données pour n'inclure que celles du jour en cours
-                start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                end_of_day = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-
-                # Sélectionner uniquement les colonnes d'intérêt
-                columns_to_keep = ['datetime', 'current_energy']
-                df_fil = df[columns_to_keep]
-
-                # Convertir la colonne 'datetime' en objets datetime
-                df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
-                # Filtrer les données pour inclure uniquement celles du jour en cours
-                df_filtered = df[(df['datetime'] >= start_of_day) & (df['datetime'] <= end_of_day)]
-                daily_energy_filtered = df_filtered['current_energy']
-
-                # Filtrer les données pour ne conserver que celles de l'année en cours
-                df_fil['datetime'] = pd.to_datetime(df_fil['datetime'], errors='coerce')
-                current_year = datetime.now().year
-                filtered_data = df_fil[df_fil['datetime'].dt.year == current_year]
-                # Créer une liste pour stocker la somme des énergies pour chaque mois
-                months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                monthly_sums = []
-
-                # Calculer la somme des 'current_energy' pour chaque mois et l'ajouter à la liste
-                for month_index in range(1, 13):
-                    # Sélectionner les données du mois actuel
-                    month_data = filtered_data[filtered_data['datetime'].dt.month == month_index]
-                    # Calculer la somme de 'current_energy' pour ce mois
-                    month_sum = month_data['current_energy'].sum()/3600
-                    # Ajouter la somme à la liste
-                    monthly_sums.append(month_sum)
-                # Initialize the consumption list to store cumulative values
-                consumption = []
-                cumulative_sum = 0
-                for value in monthly_sums:
-                    cumulative_sum += value  # Add the current value to the cumulative sum
-                    consumption.append(cumulative_sum) 
+            if data is not None:
+                # Énergies du jour, totale et mensuelles (Wh), intégrées au fil des échantillons
+                today = datetime.now()
+                daily_energy_sum, lifetime_energy_sum, monthly_sums = get_energy_sums(today, today.year)
+                # Cumulative consumption over the months of the year
+                consumption = list(np.cumsum(monthly_sums))
                 
-                data = data[-1]
                 with placeholder.container():
                     # Define energy and angle values
                     current_energy = data.get('current_energy', 'N/A')
-                    daily_produced_energy = daily_energy_filtered.sum() / 3600
-                    lifetime_total_energy = df['current_energy'].sum() / 3600
+                    daily_produced_energy = daily_energy_sum
+                    lifetime_total_energy = lifetime_energy_sum
                     total_capacity = 100
                     daily_produced_energy = round(float(daily_produced_energy), 2)
                     lifetime_total_energy = round(float(lifetime_total_energy), 2)
@@ -236,23 +166,31 @@ def main_loop():
                             unsafe_allow_html=True)
                     # Plot energy histories
                     st.markdown("<h2 style='text-align: center; margin-bottom: 30px; font-size: 20px;'>Energy Production and Consumption History</h2>", unsafe_allow_html=True)
-                    plot_energy_histories(monthly_sums, consumption)
+                    energy_chart = charts.session_chart('energy', charts.EnergyChart)
+                    energy_chart.update(monthly_sums, consumption)
+                    energy_chart.render()
 
-            tmmm.sleep(1)
+            wait_for_new_data(version)
 
     elif selected == 'Environmental DATA':
+        # Période et zoom choisis une fois par exécution, hors de la boucle de rafraîchissement
+        view = charts.range_controls('environment')
         placeholder = st.empty()
         while True:
+            version = telemetry_data.get_cache().version
             with placeholder.container():
-                Enviromental_Data.main()
-            tmmm.sleep(1)  
+                Enviromental_Data.main(view)
+            wait_for_new_data(version)
 
     elif selected == 'UGV monitoring':
+        view = charts.range_controls('ugv')
+        table = UGV_Monitoring.position_table_controls()
         placeholder = st.empty()
         while True:
+            version = telemetry_data.get_cache().version
             with placeholder.container():
-                UGV_Monitoring.main1()  
-            tmmm.sleep(1)  
+                UGV_Monitoring.main1(view, table)
+            wait_for_new_data(version)
 
     elif selected == 'Report and Alarm Notifications':
         Report_Alarm.run_periodically() 
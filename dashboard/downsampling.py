@@ -0,0 +1,134 @@
+# Sous-échantillonnage des historiques : pyramide min/max multi-résolution + LTTB
+import threading
+import numpy as np
+import pandas as pd
+import telemetry_store
+
+# Champs tracés par les pages d'historique
+PYRAMID_FIELDS = ('temperature', 'humidity', 'current_light_level', 'velocity_total')
+LEVELS = (60, 300, 1800, 10800, 86400)  # Largeur des intervalles de chaque niveau (s)
+DEFAULT_POINTS = 2000
+
+
+def to_seconds(times):
+    """Datetime64 array -> float seconds since the epoch (dates are naive local times)."""
+    return np.asarray(times, dtype='datetime64[us]').astype(np.int64) / 1e6
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points keeping the shape of (x, y)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # Bornes des threshold - 2 intervalles situés entre le premier et le dernier point
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Sommet opposé : moyenne de l'intervalle suivant (le dernier point pour le dernier intervalle)
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        areas = np.abs((x[selected] - next_x) * (y[start:stop] - y[selected])
+                       - (x[selected] - x[start:stop]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+    return indices
+
+
+class DownsamplingPyramid:
+    """Min/max summaries of the telemetry at several resolutions, for views of any length.
+
+    For every level of ``LEVELS`` and every field of ``PYRAMID_FIELDS``,
+    each interval keeps its count, sum, and minimum and maximum with their
+    times, in the local store. New samples are merged into their intervals
+    as they arrive (samples older than the last one merged are ignored).
+    ``query`` picks the coarsest level that still has at least ``points / 2``
+    intervals in the range, so a day, a month or a year costs a few
+    thousand rows; ranges too short for the finest level are read raw.
+    LTTB then reduces the result to about ``points`` points.
+    """
+
+    def __init__(self, read_range=telemetry_store.read_range, fields=PYRAMID_FIELDS, levels=LEVELS):
+        self.read_range = read_range
+        self.fields = fields
+        self.levels = levels
+        self._lock = threading.Lock()
+        last_datetime = telemetry_store.get_pyramid_cursor()
+        self._last_time = np.datetime64(pd.Timestamp(last_datetime), 'us') if last_datetime else None
+
+    def catch_up(self, chunk_days=7):
+        """Merges the samples stored locally since the last run, a few days at a time."""
+        start = pd.Timestamp(self._last_time) if self._last_time is not None else None
+        if start is None:
+            first = telemetry_store.read_range(columns=['datetime']).head(1)
+            if first.empty:
+                return
+            start = first['datetime'].iloc[0]
+        while start <= pd.Timestamp.now():
+            end = start + pd.Timedelta(days=chunk_days)
+            self.update(telemetry_store.read_range(start, end, columns=list(self.fields)))
+            start = end
+
+    def update(self, frame):
+        """Merges new samples into the pyramid; ``frame`` has a parsed 'datetime' column."""
+        if frame.empty:
+            return
+        times = frame['datetime'].to_numpy(dtype='datetime64[us]')
+        with self._lock:
+            keep = ~np.isnat(times)
+            if self._last_time is not None:
+                keep &= times > self._last_time
+            if not keep.any():
+                return
+            seconds = to_seconds(times[keep])
+            rows = []
+            for field in self.fields:
+                if field not in frame:
+                    continue
+                values = pd.to_numeric(frame[field], errors='coerce').to_numpy(dtype=float)[keep]
+                valid = ~np.isnan(values)
+                samples = pd.DataFrame({'at': seconds[valid], 'value': values[valid]})
+                if samples.empty:
+                    continue
+                for level in self.levels:
+                    groups = samples.groupby((samples['at'] // level * level).astype(np.int64))['value']
+                    summary = groups.agg(['count', 'sum', 'min', 'idxmin', 'max', 'idxmax'])
+                    rows.extend(zip([level] * len(summary), [field] * len(summary), summary.index.tolist(),
+                                    summary['count'].tolist(), summary['sum'].tolist(), summary['min'].tolist(),
+                                    samples['at'].to_numpy()[summary['idxmin']].tolist(), summary['max'].tolist(),
+                                    samples['at'].to_numpy()[summary['idxmax']].tolist()))
+            self._last_time = times[keep].max()
+            telemetry_store.merge_pyramid(rows, pd.Timestamp(self._last_time).strftime(telemetry_store.DATETIME_FORMAT))
+
+    def level_for(self, start, end, points=DEFAULT_POINTS):
+        """Coarsest level with at least points / 2 intervals in [start, end], or None for raw samples."""
+        span = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+        usable = [level for level in self.levels if span / level >= points / 2]
+        return usable[-1] if usable else None
+
+    def query(self, field, start, end, points=DEFAULT_POINTS):
+        """Returns about ``points`` representative samples of ``field`` in [start, end] ('datetime', field)."""
+        level = self.level_for(start, end, points)
+        if level is None:
+            raw = self.read_range(start, end, columns=[field])
+            raw = raw[raw[field].notna()]
+            x, y = to_seconds(raw['datetime'].to_numpy()), raw[field].to_numpy(dtype=float)
+        else:
+            first = to_seconds([np.datetime64(pd.Timestamp(start), 'us')])[0] // level * level
+            rows = np.array(telemetry_store.read_pyramid(level, field, first, to_seconds([np.datetime64(
+                pd.Timestamp(end), 'us')])[0]), dtype=float).reshape(-1, 4)
+            # Minimum et maximum de chaque intervalle, dans l'ordre où ils se sont produits
+            low_first = rows[:, 0] <= rows[:, 2]
+            x = np.column_stack([np.where(low_first, rows[:, 0], rows[:, 2]),
+                                 np.where(low_first, rows[:, 2], rows[:, 0])]).ravel()
+            y = np.column_stack([np.where(low_first, rows[:, 1], rows[:, 3]),
+                                 np.where(low_first, rows[:, 3], rows[:, 1])]).ravel()
+            # Intervalles d'un seul échantillon : minimum et maximum confondus
+            distinct = np.concatenate([[True], np.diff(x) > 0])
+            x, y = x[distinct], y[distinct]
+        indices = lttb(x, y, points)
+        times = np.round(x[indices] * 1e6).astype(np.int64).astype('datetime64[us]')
+        return pd.DataFrame({'datetime': times, field: y[indices]})
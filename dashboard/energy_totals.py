@@ -0,0 +1,80 @@
+# Totaux d'énergie (jour, mois, total) tenus à jour au fil des échantillons reçus
+import threading
+import numpy as np
+import pandas as pd
+import telemetry_store
+
+ENERGY_COLUMN = 'current_energy'  # Puissance instantanée du panneau (W)
+MAX_GAP = 300.0  # Intervalle maximal intégré (s) : au-delà, le véhicule était éteint ou injoignable
+
+
+class EnergyAccumulator:
+    """Day, month and lifetime energy totals in Wh, updated in O(new samples).
+
+    Each interval between two consecutive samples adds the trapezoid
+    (p0 + p1) / 2 * dt, with dt the real gap between their timestamps, to
+    the day and month of its end sample and to the lifetime total, so
+    dropped samples do not skew the totals. Gaps longer than ``max_gap``
+    are not integrated, and samples not newer than the last one integrated
+    are ignored. Totals and the last sample are persisted in the local
+    store, so a restart resumes where it stopped.
+    """
+
+    def __init__(self, column=ENERGY_COLUMN, max_gap=MAX_GAP):
+        self.column = column
+        self.max_gap = max_gap
+        self._lock = threading.Lock()
+        self._totals, last_datetime, self._last_value = telemetry_store.load_energy_totals()
+        self._last_time = np.datetime64(pd.Timestamp(last_datetime), 'us') if last_datetime else None
+
+    def catch_up(self):
+        """Integrates the samples stored locally since the last run (the whole history the first time)."""
+        start = pd.Timestamp(self._last_time) if self._last_time is not None else None
+        self.update(telemetry_store.read_range(start, columns=[self.column]))
+
+    def update(self, frame):
+        """Adds the energy of new samples; ``frame`` has a parsed 'datetime' column."""
+        if frame.empty or self.column not in frame:
+            return
+        times = frame['datetime'].to_numpy(dtype='datetime64[us]')
+        values = pd.to_numeric(frame[self.column], errors='coerce').to_numpy(dtype=float)
+        keep = ~np.isnat(times) & ~np.isnan(values)
+        with self._lock:
+            if self._last_time is not None:
+                keep &= times > self._last_time
+            if not keep.any():
+                return
+            order = np.argsort(times[keep], kind='stable')
+            times, values = times[keep][order], values[keep][order]
+            if self._last_time is not None:
+                # Premier intervalle : depuis le dernier échantillon déjà intégré
+                times = np.concatenate([[self._last_time], times])
+                values = np.concatenate([[self._last_value], values])
+            dt = np.diff(times).astype(np.float64) / 1e6
+            energy = np.where(dt <= self.max_gap, (values[:-1] + values[1:]) / 2 * dt / 3600, 0.0)
+
+            changed = {}
+            for unit in ('D', 'M'):
+                periods, index = np.unique(times[1:].astype(f'datetime64[{unit}]'), return_inverse=True)
+                for period, wh in zip(periods, np.bincount(index, weights=energy, minlength=len(periods))):
+                    changed[str(period)] = self._totals.get(str(period), 0.0) + float(wh)
+            changed['total'] = self._totals.get('total', 0.0) + float(energy.sum())
+            self._totals.update(changed)
+            self._last_time, self._last_value = times[-1], float(values[-1])
+            telemetry_store.save_energy_totals(
+                changed, pd.Timestamp(self._last_time).strftime(telemetry_store.DATETIME_FORMAT), self._last_value)
+
+    def day(self, day):
+        """Energy produced on the given date (Wh)."""
+        with self._lock:
+            return self._totals.get(day.strftime("%Y-%m-%d"), 0.0)
+
+    def months(self, year):
+        """The 12 monthly energies of the given year (Wh)."""
+        with self._lock:
+            return [self._totals.get(f"{year:04d}-{month:02d}", 0.0) for month in range(1, 13)]
+
+    def lifetime(self):
+        """Energy produced since the first sample (Wh)."""
+        with self._lock:
+            return self._totals.get('total', 0.0)
@@ -0,0 +1,112 @@
+# Réception en direct des données poussées par le serveur (Server-Sent Events)
+import json
+import threading
+import time
+from collections import deque
+import requests
+import streamlit as st
+
+class LiveFeed:
+    """Background subscriber to the api_server ``/stream`` endpoint.
+
+    The most recent pushed samples are kept in a bounded deque so that every
+    page can read what is newer than its own cursor, and pages waiting in
+    ``wait`` are woken as soon as a micro-batch arrives.
+    """
+
+    def __init__(self, server_url, max_samples=3600, reconnect_delay=1.0):
+        self.server_url = server_url
+        self.connected = False
+        self._samples = deque(maxlen=max_samples)
+        self._covered_from = 0  # Tous les échantillons après ce numéro sont dans le tampon
+        self._head_seq = 0
+        self._condition = threading.Condition()
+        self._reconnect_delay = reconnect_delay
+        self._session = requests.Session()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        delay = self._reconnect_delay
+        while True:
+            try:
+                with self._session.get(f"{self.server_url}/stream", params={"consumer": "dashboard-live"},
+                                       headers={"Accept": "text/event-stream"}, stream=True, timeout=(5, 60)) as response:
+                    response.raise_for_status()
+                    delay = self._reconnect_delay
+                    self._consume(response)
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+            with self._condition:
+                self.connected = False
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def _consume(self, response):
+        event, event_id, data_lines = "message", None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith(":"):
+                continue
+            if line:
+                field, _, value = line.partition(":")
+                value = value.lstrip(" ")
+                if field == "event":
+                    event = value
+                elif field == "id":
+                    event_id = int(value)
+                elif field == "data":
+                    data_lines.append(value)
+                continue
+            # Ligne vide : fin de l'événement
+            if event == "ready":
+                self._on_ready(event_id)
+            elif data_lines:
+                self._on_samples(json.loads("\n".join(data_lines)))
+            event, event_id, data_lines = "message", None, []
+
+    def _on_ready(self, covered_from):
+        with self._condition:
+            self._samples.clear()
+            self._covered_from = covered_from
+            self._head_seq = covered_from
+            self.connected = True
+            self._condition.notify_all()
+
+    def _on_samples(self, records):
+        if not records:
+            return
+        with self._condition:
+            seqs = [self._head_seq] + [record['seq'] for record in records]
+            gaps = [i for i in range(1, len(seqs)) if seqs[i] != seqs[i - 1] + 1]
+            if gaps:
+                # Échantillons manquants : le flux ne couvre plus que la suite du dernier trou,
+                # un curseur antérieur est servi par /get_data/
+                self._samples.clear()
+                records = records[gaps[-1] - 1:]
+                self._covered_from = records[0]['seq'] - 1
+            self._samples.extend(records)
+            self._head_seq = records[-1]['seq']
+            # Les plus anciens échantillons ont pu être évincés du tampon
+            self._covered_from = max(self._covered_from, self._samples[0]['seq'] - 1)
+            self._condition.notify_all()
+
+    def read_since(self, cursor):
+        """Returns pushed samples newer than ``cursor``, or None if the feed cannot cover it."""
+        with self._condition:
+            if not self.connected or cursor < self._covered_from or cursor > self._head_seq:
+                return None
+            return [sample for sample in self._samples if sample['seq'] > cursor]
+
+    def wait(self, cursor, timeout=1.0):
+        """Blocks until a sample newer than ``cursor`` arrives, or until ``timeout`` expires."""
+        with self._condition:
+            if not self.connected:
+                self._condition.wait(timeout)
+                return False
+            return self._condition.wait_for(lambda: self._head_seq != cursor, timeout)
+
+
+@st.cache_resource
+def get_feed(server_url):
+    """Returns the process-wide live feed for a server, shared by all pages and sessions."""
+    return LiveFeed(server_url)
@@ -0,0 +1,60 @@
+# Lecture des données du serveur dans un format compact (Arrow IPC ou JSON en colonnes)
+import pandas as pd
+import requests
+
+# pyarrow est facultatif : sans lui, le JSON en colonnes est demandé
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNS_MEDIA_TYPE = "application/vnd.telemetry.columns+json"
+
+# Connexions HTTP réutilisées d'un rafraîchissement à l'autre ; la décompression gzip/zstd est faite par requests
+_session = requests.Session()
+
+
+def get_json(url, params=None, timeout=10):
+    """GETs a JSON endpoint over the shared session."""
+    response = _session.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def put_json(url, payload, timeout=10):
+    """PUTs a JSON body over the shared session and returns the JSON answer."""
+    response = _session.put(url, json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def delete(url, timeout=10):
+    """DELETEs a resource over the shared session; False when the server does not know it."""
+    response = _session.delete(url, timeout=timeout)
+    if response.status_code == 404:
+        return False
+    response.raise_for_status()
+    return True
+
+
+def fetch_frame(url, params=None, timeout=10):
+    """GETs a data endpoint and returns the samples as a DataFrame.
+
+    Arrow IPC is negotiated when pyarrow is installed (loaded straight into
+    pandas), columnar JSON otherwise; a server answering with the original
+    list of dicts is still understood.
+    """
+    accept = f"{ARROW_MEDIA_TYPE}, {COLUMNS_MEDIA_TYPE};q=0.9" if pa is not None else COLUMNS_MEDIA_TYPE
+    response = _session.get(url, params=params, headers={"Accept": accept}, timeout=timeout)
+    response.raise_for_status()
+    media_type = response.headers.get("content-type", "").split(";")[0].strip()
+    if media_type == ARROW_MEDIA_TYPE:
+        return pa.ipc.open_stream(response.content).read_pandas()
+    payload = response.json()
+    if media_type == COLUMNS_MEDIA_TYPE:
+        return pd.DataFrame(payload["columns"])
+    # Liste de dictionnaires, ou {"error": ...} quand il n'y a aucune donnée
+    if isinstance(payload, dict):
+        payload = [] if 'error' in payload else [payload]
+    return pd.DataFrame(payload)
@@ -0,0 +1,181 @@
+# Accès aux données partagé par toutes les pages et toutes les sessions du tableau de bord
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import requests
+import streamlit as st
+import downsampling
+import energy_totals
+import live_feed
+import telemetry_client
+import telemetry_store
+
+SERVER_URL = os.environ.get("DASHBOARD_SERVER_URL", "http://192.168.174.45:8000")
+MEMORY_DAYS = 1  # Jours complets gardés en mémoire en plus du jour en cours
+# Colonnes texte (les autres sont numériques) ; 'datetime' est gardée en datetime64
+TEXT_COLUMNS = ('timestamp',)
+
+
+class TelemetryCache:
+    """Process-wide copy of the recent telemetry, kept up to date by one background thread.
+
+    The thread takes new samples from the live feed (or from /get_data/
+    when the feed cannot cover the cursor), stores them once in the local
+    SQLite store, adds their energy to ``energy`` (day, month and lifetime
+    totals), merges them into ``pyramid`` (downsampled views of any range)
+    and appends them to in-memory columns holding today and the previous
+    ``memory_days`` days. Pages only read: ranges inside that
+    window are NumPy slices, older ones come from the SQLite store, and
+    ``wait`` wakes them when a new batch has been applied.
+    """
+
+    def __init__(self, server_url, feed, memory_days=MEMORY_DAYS, poll_interval=1.0):
+        self.server_url = server_url
+        self.feed = feed
+        self.memory_days = memory_days
+        self.poll_interval = poll_interval
+        self.error = None
+        self.version = 0
+        self._condition = threading.Condition()
+        self._columns = {}
+        self._size = 0
+        self._latest = None
+        self._cursor = telemetry_store.get_cursor()
+        self._memory_start = self._window_start()
+        # Recharger la fenêtre depuis la base locale : les pages ont un historique dès le démarrage
+        self._append(telemetry_store.read_range(self._memory_start))
+        self.energy = energy_totals.EnergyAccumulator()
+        self.energy.catch_up()
+        self.pyramid = downsampling.DownsamplingPyramid(self.read_range)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _window_start(self):
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=self.memory_days)
+
+    def _run(self):
+        try:
+            # Première exécution : construire la pyramide sur tout l'historique local, hors du démarrage des pages
+            self.pyramid.catch_up()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        while True:
+            # Toute erreur est affichée par les pages ; le fil continue, sinon les données resteraient figées
+            try:
+                self._poll()
+                self.error = None
+                # Attendre la prochaine poussée du serveur, au plus poll_interval secondes
+                self.feed.wait(self._cursor, timeout=self.poll_interval)
+            except requests.exceptions.RequestException as e:
+                self.error = str(e)
+                time.sleep(self.poll_interval)
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                time.sleep(self.poll_interval)
+
+    def _poll(self):
+        frame = self._fetch()
+        if frame.empty:
+            return
+        telemetry_store.append_rows(frame)
+        frame = frame.copy()
+        frame['datetime'] = pd.to_datetime(frame['datetime'], format=telemetry_store.DATETIME_FORMAT,
+                                           errors='coerce')
+        self.energy.update(frame)
+        self.pyramid.update(frame)
+        self._append(frame)
+        # Curseur avancé en dernier : un lot dont le traitement échoue est relu au tour suivant
+        if 'seq' in frame and frame['seq'].notna().any():
+            self._cursor = int(frame['seq'].max())
+
+    def _fetch(self):
+        # Utiliser les données poussées par le serveur lorsque le flux en direct les couvre
+        data = self.feed.read_since(self._cursor)
+        if data is not None:
+            return pd.DataFrame(data)
+        # Sinon, seulement les échantillons postérieurs au curseur, en Arrow ou en colonnes
+        return telemetry_client.fetch_frame(f"{self.server_url}/get_data/",
+                                            params={"since": self._cursor, "consumer": "dashboard"})
+
+    def _append(self, frame):
+        if frame.empty:
+            return
+        count = len(frame)
+        with self._condition:
+            if self._window_start() > self._memory_start:
+                self._trim()
+            if self._size + count > self._capacity():
+                self._grow(self._size + count)
+            for name, column in self._columns.items():
+                if name in frame:
+                    values = frame[name].to_numpy()
+                    if name == 'datetime':
+                        values = values.astype('datetime64[us]')
+                    column[self._size:self._size + count] = values
+                else:
+                    column[self._size:self._size + count] = np.datetime64('NaT') if name == 'datetime' else (
+                        None if name in TEXT_COLUMNS else np.nan)
+            self._size += count
+            self._latest = frame.iloc[-1]
+            self.version += 1
+            self._condition.notify_all()
+
+    def _capacity(self):
+        return len(self._columns['datetime']) if self._columns else 0
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * self._capacity(), 4096)
+        columns = {}
+        for name in telemetry_store.COLUMNS:
+            if name == 'datetime':
+                column = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[us]')
+            elif name in TEXT_COLUMNS:
+                column = np.full(capacity, None, dtype=object)
+            else:
+                column = np.full(capacity, np.nan)
+            if name in self._columns:
+                column[:self._size] = self._columns[name][:self._size]
+            columns[name] = column
+        self._columns = columns
+
+    def _trim(self):
+        """Drops the samples that left the in-memory window (called at midnight)."""
+        self._memory_start = self._window_start()
+        start = int(np.searchsorted(self._columns['datetime'][:self._size], np.datetime64(self._memory_start, 'us')))
+        for column in self._columns.values():
+            column[:self._size - start] = column[start:self._size]
+        self._size -= start
+
+    def latest(self):
+        """Returns the most recent sample as a Series, or None before the first one."""
+        with self._condition:
+            return self._latest
+
+    def read_range(self, start=None, end=None, columns=None):
+        """Same result as ``telemetry_store.read_range``, served from memory when the range is recent."""
+        if start is None or start < self._memory_start:
+            return telemetry_store.read_range(start, end, columns)
+        names = ['datetime'] + [name for name in (columns or telemetry_store.COLUMNS) if name != 'datetime']
+        with self._condition:
+            if not self._columns:
+                return pd.DataFrame({name: [] for name in names})
+            times = self._columns['datetime'][:self._size]
+            first = int(np.searchsorted(times, np.datetime64(start, 'us')))
+            last = self._size if end is None else int(np.searchsorted(times, np.datetime64(end, 'us'), side='right'))
+            # Copie de la tranche : l'écriture suivante ne modifie pas ce que la page affiche
+            return pd.DataFrame({name: self._columns[name][first:last].copy() for name in names})
+
+    def wait(self, version, timeout=1.0):
+        """Blocks until data newer than ``version`` was applied, or until ``timeout`` expires."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.version != version, timeout)
+
+
+@st.cache_resource
+def get_cache():
+    """Returns the process-wide telemetry cache, shared by all pages and sessions."""
+    return TelemetryCache(SERVER_URL, live_feed.get_feed(SERVER_URL))
@@ -0,0 +1,303 @@
+# Stockage local des données de télémétrie (SQLite en mode WAL)
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+
+DB_PATH = 'telemetry.db'
+LEGACY_CSV_PATH = 'position_data.csv'
+
+# Colonnes stockées, dans l'ordre du modèle SensorData du serveur
+COLUMNS = {
+    'datetime': 'TEXT',
+    'timestamp': 'TEXT',
+    'latitude': 'REAL',
+    'longitude': 'REAL',
+    'sun_elevation': 'REAL',
+    'sun_azimuth': 'REAL',
+    'panel_elevation': 'REAL',
+    'panel_azimuth': 'REAL',
+    'processed_elevation': 'REAL',
+    'processed_azimuth': 'REAL',
+    'orientation_north': 'REAL',
+    'pitch': 'REAL',
+    'current_light_level': 'REAL',
+    'temperature': 'REAL',
+    'humidity': 'REAL',
+    'velocity_total': 'REAL',
+    'current_energy': 'REAL',
+    'battery_level': 'REAL',
+    'operating_time': 'REAL',
+}
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+_connection = None
+_lock = threading.Lock()
+
+
+def _format_bound(value):
+    """Converts a datetime bound to the string format used in the 'datetime' column."""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime(DATETIME_FORMAT)
+
+
+def _range_clause(start, end, filters=()):
+    """WHERE clause for [start, end] and (column, min, max) filters (None bounds are open)."""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("datetime >= ?")
+        params.append(_format_bound(start))
+    if end is not None:
+        conditions.append("datetime <= ?")
+        params.append(_format_bound(end))
+    for column, low, high in filters:
+        _check_columns([column])
+        if low is not None:
+            conditions.append(f"{column} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{column} <= ?")
+            params.append(high)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def _ensure_schema(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    # Totaux d'énergie par période ('2024-06-01', '2024-06', 'total'), en Wh
+    conn.execute("CREATE TABLE IF NOT EXISTS energy_totals (period TEXT PRIMARY KEY, wh REAL)")
+    # Pyramide de sous-échantillonnage : min/max par champ et par intervalle de 'level' secondes
+    conn.execute("CREATE TABLE IF NOT EXISTS pyramid (level INTEGER, field TEXT, bucket INTEGER, n INTEGER, "
+                 "total REAL, low REAL, low_at REAL, high REAL, high_at REAL, PRIMARY KEY (level, field, bucket))")
+    columns_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in COLUMNS.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS telemetry ({columns_sql})")
+    # Ajouter les colonnes manquantes si la base a été créée par une version antérieure
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(telemetry)")}
+    for name, sql_type in COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE telemetry ADD COLUMN {name} {sql_type}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telemetry_datetime ON telemetry (datetime)")
+    # Un même échantillon peut être lu par plusieurs pages : l'horodatage sert de clé
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_telemetry_datetime_unique'").fetchone():
+        conn.execute("DELETE FROM telemetry WHERE rowid NOT IN (SELECT MIN(rowid) FROM telemetry GROUP BY datetime)")
+        conn.execute("CREATE UNIQUE INDEX idx_telemetry_datetime_unique ON telemetry (datetime)")
+    conn.commit()
+
+
+def _import_legacy_csv(conn):
+    """Imports position_data.csv once so existing history is not lost."""
+    done = conn.execute("SELECT value FROM meta WHERE key = 'legacy_csv_imported'").fetchone()
+    if done or not os.path.exists(LEGACY_CSV_PATH):
+        return
+    try:
+        for chunk in pd.read_csv(LEGACY_CSV_PATH, on_bad_lines='skip', chunksize=50000):
+            _insert(conn, chunk)
+    except pd.errors.EmptyDataError:
+        pass
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_csv_imported', ?)",
+                 (datetime.now().strftime(DATETIME_FORMAT),))
+    conn.commit()
+
+
+def get_connection():
+    """Returns the process-wide SQLite connection, creating the database on first use."""
+    global _connection
+    if _connection is None:
+        with _lock:
+            if _connection is None:
+                conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                _ensure_schema(conn)
+                _import_legacy_csv(conn)
+                _connection = conn
+    return _connection
+
+
+def _insert(conn, df):
+    if 'seq' in df.columns and df['seq'].notna().any():
+        # Mémoriser le curseur du serveur dans la même transaction que les lignes
+        _set_cursor(conn, int(df['seq'].max()))
+    df = df.reindex(columns=list(COLUMNS))
+    df = df.astype(object).where(pd.notna(df), None)
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    conn.executemany(
+        f"INSERT OR IGNORE INTO telemetry ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+        df.itertuples(index=False, name=None),
+    )
+    return len(df)
+
+
+def _set_cursor(conn, seq):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('server_seq', ?)", (str(seq),))
+
+
+def get_cursor():
+    """Returns the sequence number of the last sample fetched from the server."""
+    conn = get_connection()
+    with _lock:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'server_seq'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def append_rows(rows):
+    """Appends new samples (list of dicts or DataFrame) without rewriting the history."""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+    if df.empty:
+        return 0
+    conn = get_connection()
+    with _lock:
+        count = _insert(conn, df)
+        conn.commit()
+    return count
+
+
+def _check_columns(columns):
+    unknown = [c for c in columns if c not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Colonnes inconnues : {unknown}")
+
+
+def read_range(start=None, end=None, columns=None):
+    """Reads only the samples whose 'datetime' lies in [start, end]."""
+    columns = list(columns) if columns else list(COLUMNS)
+    _check_columns(columns)
+    if 'datetime' not in columns:
+        columns = ['datetime'] + columns
+    clause, params = _range_clause(start, end)
+    query = f"SELECT {', '.join(columns)} FROM telemetry{clause} ORDER BY datetime"
+    conn = get_connection()
+    with _lock:
+        df = pd.read_sql_query(query, conn, params=params)
+    df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
+    return df
+
+
+def read_page(start=None, end=None, sort='datetime', descending=False, filters=(), offset=0, limit=50,
+              columns=None, after=None):
+    """Reads one page of the samples in [start, end] matching ``filters``, sorted and sliced by SQLite.
+
+    ``after`` is the (sort value, datetime) of the last row of the previous
+    page: the page then starts right after it (keyset pagination, no rows
+    skipped by OFFSET) and ``offset`` is ignored.
+    """
+    columns = list(columns) if columns else list(COLUMNS)
+    _check_columns(columns + [sort])
+    clause, params = _range_clause(start, end, filters)
+    direction, compare = ('DESC', '<') if descending else ('ASC', '>')
+    if after is not None:
+        value, after_datetime = after
+        if sort == 'datetime':
+            condition, after_params = f"datetime {compare} ?", [after_datetime]
+        else:
+            condition = f"({sort} {compare} ? OR ({sort} = ? AND datetime {compare} ?))"
+            after_params = [value, value, after_datetime]
+            if descending:
+                # Les valeurs NULL sont classées en dernier dans l'ordre décroissant
+                condition = f"({condition[1:-1]} OR {sort} IS NULL)"
+        clause = (f"{clause} AND " if clause else " WHERE ") + condition
+        params, offset = params + after_params, 0
+    # 'datetime' départage les valeurs égales dans le même sens : l'ordre des lignes reste stable d'une page à l'autre
+    order = f"{sort} {direction}" + (f", datetime {direction}" if sort != 'datetime' else "")
+    query = f"SELECT {', '.join(columns)} FROM telemetry{clause} ORDER BY {order} LIMIT ? OFFSET ?"
+    conn = get_connection()
+    with _lock:
+        return pd.read_sql_query(query, conn, params=params + [limit, offset])
+
+
+def count_rows(start=None, end=None, filters=(), after=None):
+    """Number of samples in [start, end] matching ``filters``, only those strictly after ``after`` if given."""
+    clause, params = _range_clause(start, end, filters)
+    if after is not None:
+        clause = (f"{clause} AND " if clause else " WHERE ") + "datetime > ?"
+        params.append(_format_bound(after))
+    conn = get_connection()
+    with _lock:
+        return conn.execute(f"SELECT COUNT(*) FROM telemetry{clause}", params).fetchone()[0]
+
+
+def sum_column(column, start=None, end=None):
+    """Sums a column over [start, end] inside SQLite instead of loading the rows."""
+    _check_columns([column])
+    clause, params = _range_clause(start, end)
+    query = f"SELECT COALESCE(SUM({column}), 0) FROM telemetry{clause}"
+    conn = get_connection()
+    with _lock:
+        return float(conn.execute(query, params).fetchone()[0])
+
+
+def monthly_sums(column, year):
+    """Returns the 12 monthly sums of a column for the given year."""
+    _check_columns([column])
+    conn = get_connection()
+    with _lock:
+        rows = conn.execute(
+            f"SELECT CAST(substr(datetime, 6, 2) AS INTEGER), SUM({column}) FROM telemetry "
+            "WHERE datetime >= ? AND datetime < ? GROUP BY 1",
+            (f"{year:04d}-01-01", f"{year + 1:04d}-01-01"),
+        ).fetchall()
+    sums = [0.0] * 12
+    for month, total in rows:
+        if month and 1 <= month <= 12:
+            sums[month - 1] = float(total or 0)
+    return sums
+
+
+def load_energy_totals():
+    """Returns ({period: Wh}, last integrated datetime string or None, its value or None)."""
+    conn = get_connection()
+    with _lock:
+        totals = dict(conn.execute("SELECT period, wh FROM energy_totals").fetchall())
+        meta = dict(conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('energy_last_datetime', 'energy_last_value')").fetchall())
+    last_value = meta.get('energy_last_value')
+    return totals, meta.get('energy_last_datetime'), float(last_value) if last_value is not None else None
+
+
+def save_energy_totals(totals, last_datetime, last_value):
+    """Writes the updated period totals and the last integrated sample in one transaction."""
+    conn = get_connection()
+    with _lock:
+        conn.executemany("INSERT OR REPLACE INTO energy_totals (period, wh) VALUES (?, ?)", totals.items())
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         [('energy_last_datetime', last_datetime), ('energy_last_value', str(last_value))])
+        conn.commit()
+
+
+def get_pyramid_cursor():
+    """Returns the 'datetime' string of the last sample added to the pyramid, or None."""
+    conn = get_connection()
+    with _lock:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'pyramid_last_datetime'").fetchone()
+    return row[0] if row else None
+
+
+def merge_pyramid(rows, last_datetime):
+    """Merges (level, field, bucket, n, total, low, low_at, high, high_at) rows into the pyramid."""
+    conn = get_connection()
+    with _lock:
+        # Les expressions de SET lisent toutes l'ancienne ligne : low_at est choisi avant la mise à jour de low
+        conn.executemany(
+            "INSERT INTO pyramid (level, field, bucket, n, total, low, low_at, high, high_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (level, field, bucket) DO UPDATE SET "
+            "n = n + excluded.n, total = total + excluded.total, "
+            "low = MIN(low, excluded.low), low_at = CASE WHEN excluded.low < low THEN excluded.low_at ELSE low_at END, "
+            "high = MAX(high, excluded.high), "
+            "high_at = CASE WHEN excluded.high > high THEN excluded.high_at ELSE high_at END",
+            rows,
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('pyramid_last_datetime', ?)", (last_datetime,))
+        conn.commit()
+
+
+def read_pyramid(level, field, start, end):
+    """Returns the (low_at, low, high_at, high) rows of one level for buckets starting in [start, end] (epoch s)."""
+    conn = get_connection()
+    with _lock:
+        return conn.execute(
+            "SELECT low_at, low, high_at, high FROM pyramid WHERE level = ? AND field = ? AND bucket >= ? "
+            "AND bucket <= ? ORDER BY bucket", (level, field, start, end)).fetchall()
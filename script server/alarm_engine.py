@@ -0,0 +1,172 @@
+import json
+import os
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+# Types de règles : seuil bas, seuil haut, taux de variation (unités par seconde)
+RULE_KINDS = ("min", "max", "rate")
+MIN, MAX, RATE = range(3)
+
+
+class AlarmEngine:
+    """Evaluates every alarm rule against every ingested sample.
+
+    Rules are compiled into NumPy arrays (field index, kind, threshold,
+    hysteresis) so that one sample is checked against all rules with a few
+    vectorized operations. For each rule the "excess" is
+
+        min:  threshold - value
+        max:  value - threshold
+        rate: |d value / dt| - threshold
+
+    An alarm is raised when the excess becomes positive and cleared only once
+    it drops below -hysteresis. Alarm state is kept per vehicle and every
+    transition is recorded as an event.
+    """
+
+    def __init__(self, fields, rules_path=None, max_events=10000):
+        self.fields = list(fields)
+        self._field_index = {name: i for i, name in enumerate(self.fields)}
+        self.rules_path = rules_path
+        self.rules = []
+        self._states = {}
+        self._events = deque(maxlen=max_events)
+        self._event_seq = 0
+        self._rules_mtime = None
+        if rules_path and os.path.exists(rules_path):
+            self.reload_if_changed()
+        else:
+            self.set_rules([], save=False)
+
+    def set_rules(self, rules, save=True):
+        """Replaces the rule set.
+
+        The alarm state of each vehicle is kept for the rules that still
+        exist unchanged and dropped for removed or modified ones.
+        """
+        for rule in rules:
+            if rule["field"] not in self._field_index:
+                raise ValueError(f"Unknown field: {rule['field']}")
+            if rule["kind"] not in RULE_KINDS:
+                raise ValueError(f"Unknown rule kind: {rule['kind']}")
+        old_index = {rule["id"]: i for i, rule in enumerate(self.rules)}
+        old_rules = self.rules
+        self.rules = [dict(rule) for rule in rules]
+        self._rule_fields = np.array([self._field_index[rule["field"]] for rule in self.rules], dtype=np.intp)
+        self._rule_kinds = np.array([RULE_KINDS.index(rule["kind"]) for rule in self.rules], dtype=np.int8)
+        self._thresholds = np.array([rule["threshold"] for rule in self.rules], dtype=np.float64)
+        self._hysteresis = np.array([rule.get("hysteresis", 0.0) for rule in self.rules], dtype=np.float64)
+        self._is_min = self._rule_kinds == MIN
+        self._is_rate = self._rule_kinds == RATE
+        self._has_rate = bool(self._is_rate.any())
+        # Indice de chaque règle conservée dans l'ancien jeu (None : règle nouvelle ou modifiée)
+        kept = [old_index.get(rule["id"]) for rule in self.rules]
+        kept = [i if i is not None and self._same_rule(old_rules[i], rule) else None
+                for i, rule in zip(kept, self.rules)]
+        for state in self._states.values():
+            state["active"] = np.array([i is not None and bool(state["active"][i]) for i in kept], dtype=bool)
+            state["since"] = [None if i is None else state["since"][i] for i in kept]
+        if save and self.rules_path:
+            # Écrire à côté puis remplacer : les autres workers ne lisent jamais un fichier à moitié écrit
+            temp_path = f"{self.rules_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.rules, f, indent=2)
+            os.replace(temp_path, self.rules_path)
+            self._rules_mtime = os.stat(self.rules_path).st_mtime_ns
+
+    @staticmethod
+    def _same_rule(old, new):
+        return all(old.get(key, 0.0) == new.get(key, 0.0) for key in ("field", "kind", "threshold", "hysteresis"))
+
+    def reload_if_changed(self):
+        """Reloads the rules file if another process rewrote it; returns True if reloaded."""
+        try:
+            mtime = os.stat(self.rules_path).st_mtime_ns
+        except (OSError, TypeError):
+            return False
+        if mtime == self._rules_mtime:
+            return False
+        with open(self.rules_path) as f:
+            self.set_rules(json.load(f), save=False)
+        self._rules_mtime = mtime
+        return True
+
+    def upsert_rule(self, rule):
+        rules = [existing for existing in self.rules if existing["id"] != rule["id"]]
+        self.set_rules(rules + [rule])
+
+    def delete_rule(self, rule_id):
+        rules = [existing for existing in self.rules if existing["id"] != rule_id]
+        if len(rules) == len(self.rules):
+            return False
+        self.set_rules(rules)
+        return True
+
+    def _state(self, vehicle_id):
+        state = self._states.get(vehicle_id)
+        if state is None:
+            state = {
+                "active": np.zeros(len(self.rules), dtype=bool),
+                "since": [None] * len(self.rules),
+                "previous_values": None,
+                "previous_time": None,
+            }
+            self._states[vehicle_id] = state
+        return state
+
+    def evaluate(self, vehicle_id, records):
+        """Checks records (in order) against all rules and returns the new events."""
+        if not self.rules:
+            return []
+        state = self._state(vehicle_id)
+        new_events = []
+        for record in records:
+            values = np.array([record[name] for name in self.fields], dtype=np.float64)
+            measured = values[self._rule_fields]
+            if self._has_rate:
+                sample_time = datetime.fromisoformat(record["datetime"]).timestamp()
+                rates = np.zeros(len(self.rules))
+                if state["previous_values"] is not None and sample_time > state["previous_time"]:
+                    previous = state["previous_values"][self._rule_fields]
+                    rates = np.abs(measured - previous) / (sample_time - state["previous_time"])
+                state["previous_values"], state["previous_time"] = values, sample_time
+                measured = np.where(self._is_rate, rates, measured)
+            excess = np.where(self._is_min, self._thresholds - measured, measured - self._thresholds)
+            active = state["active"]
+            new_active = np.where(active, excess >= -self._hysteresis, excess > 0)
+            for i in np.flatnonzero(new_active != active):
+                event = self._record_event(vehicle_id, self.rules[i], "raised" if new_active[i] else "cleared",
+                                           float(measured[i]), record)
+                state["since"][i] = event if new_active[i] else None
+                new_events.append(event)
+            state["active"] = new_active
+        return new_events
+
+    def _record_event(self, vehicle_id, rule, status, value, record):
+        self._event_seq += 1
+        event = {
+            "event_seq": self._event_seq,
+            "vehicle_id": vehicle_id,
+            "rule_id": rule["id"],
+            "field": rule["field"],
+            "kind": rule["kind"],
+            "threshold": rule["threshold"],
+            "status": status,
+            "value": value,
+            "datetime": record["datetime"],
+            "seq": record.get("seq"),
+        }
+        self._events.append(event)
+        return event
+
+    def active_alarms(self, vehicle_id=None):
+        """Returns the raising event of every alarm currently active."""
+        states = self._states.items() if vehicle_id is None else [(vehicle_id, self._states.get(vehicle_id))]
+        return [event for _, state in states if state is not None
+                for event, active in zip(state["since"], state["active"]) if active]
+
+    def events_since(self, since=0, vehicle_id=None, limit=1000):
+        events = [event for event in self._events
+                  if event["event_seq"] > since and (vehicle_id is None or event["vehicle_id"] == vehicle_id)]
+        return events[:limit]
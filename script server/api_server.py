@@ -1,8 +1,45 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import os
+import re
+import json
+import asyncio
+import logging
+import argparse
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model, field_validator
+from fleet import DEFAULT_VEHICLE_ID, VEHICLE_ID_PATTERN, Fleet
+from rollups import RESOLUTIONS
+from shared_ring_buffer import SHARED_MEMORY_DIR, STRING_WIDTH, remove_segments
+from alarm_engine import AlarmEngine
+from response_formats import (ARROW, COLUMNS, MEDIA_TYPES, NDJSON, RECORDS, compress, encode_records, iter_compressed,
+                              iter_encoded, negotiate_encoding, negotiate_format)
+from metrics import Counter, Histogram, MetricsMiddleware, format_metric, resident_memory_bytes
+
+logger = logging.getLogger("uvicorn.error")
+
+# Format des dates envoyées par les véhicules : trié chronologiquement dans l'historique SQLite
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def check_datetime_format(cls, value):
+    """Rejects (422) a 'datetime' the alarms, /metrics and history queries could not parse later."""
+    try:
+        datetime.strptime(value, DATETIME_FORMAT)
+    except ValueError:
+        raise ValueError(f"datetime must use the format {DATETIME_FORMAT}")
+    return value
+
+def check_text_field(cls, value):
+    """Rejects (422) text the shared-memory buffer could not store: non-ASCII or over STRING_WIDTH characters."""
+    if value is not None and (not value.isascii() or len(value) > STRING_WIDTH):
+        raise ValueError(f"must be ASCII text of at most {STRING_WIDTH} characters")
+    return value
 
 # Définir un modèle de données pour les données des capteurs
 class SensorData(BaseModel):
+    vehicle_id: str = Field(DEFAULT_VEHICLE_ID, pattern=VEHICLE_ID_PATTERN)
     datetime: str
     timestamp: str
     latitude: float
@@ -23,10 +60,151 @@ class SensorData(BaseModel):
     battery_level: float
     operating_time: float
 
-app = FastAPI()
+    check_datetime = field_validator("datetime")(check_datetime_format)
+    check_text = field_validator("datetime", "timestamp")(check_text_field)
+
+# Règle d'alarme évaluée par le serveur sur chaque échantillon reçu
+class AlarmRule(BaseModel):
+    id: str
+    field: str
+    kind: Literal["min", "max", "rate"]
+    threshold: float
+    hysteresis: float = 0.0
+
+# Échantillon partiel envoyé avec une bande morte : seuls l'identifiant et la date sont obligatoires
+SensorDelta = create_model("SensorDelta", __validators__={
+    "check_datetime": field_validator("datetime")(check_datetime_format),
+    "check_text": field_validator("datetime", "timestamp")(check_text_field),
+}, **{
+    name: (field.annotation, field) if name in ("vehicle_id", "datetime") else (Optional[field.annotation], None)
+    for name, field in SensorData.model_fields.items()
+})
+
+# Validation d'un lot complet d'échantillons en un seul passage
+sensor_batch_adapter = TypeAdapter(list[SensorData])
+sensor_delta_adapter = TypeAdapter(list[SensorDelta])
+
+@asynccontextmanager
+async def lifespan(app):
+    # Avec plusieurs workers, chacun suit en continu les écritures des autres
+    task = asyncio.create_task(follow_shared_fleet()) if SHARED_MEMORY else None
+    yield
+    if task is not None:
+        task.cancel()
+
+app = FastAPI(lifespan=lifespan)
+
+# Instrumentation : compteurs et histogrammes exposés par /metrics
+requests_total = Counter("api_requests_total", "HTTP requests by method, route and status.", ("method", "path", "status"))
+request_duration = Histogram("api_request_duration_seconds", "HTTP request latency by route.", ("path",))
+ingested_samples = Counter("api_ingested_samples_total", "Samples accepted by ingest endpoint.", ("endpoint",))
+app.add_middleware(MetricsMiddleware, requests_total=requests_total, request_duration=request_duration)
+
+# Un fragment (tampon, historique, agrégats, flux, limite de débit) par véhicule
+HISTORY_DIR = os.environ.get("TELEMETRY_HISTORY_DIR", "telemetry_history")
+LEGACY_HISTORY_DB = "telemetry_history.db"
+BUFFER_CAPACITY = int(os.environ.get("TELEMETRY_BUFFER_CAPACITY", 3600))
+VEHICLE_RATE_LIMIT = float(os.environ.get("VEHICLE_RATE_LIMIT", 50))
+VEHICLE_RATE_BURST = int(os.environ.get("VEHICLE_RATE_BURST", 1000))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 256))
+STREAM_KEEPALIVE = 15.0
+ALARM_RULES_PATH = os.environ.get("ALARM_RULES_PATH", "alarm_rules.json")
+# Tampons en mémoire partagée, communs à tous les workers uvicorn (--workers N)
+SHARED_MEMORY = os.environ.get("TELEMETRY_SHARED_MEMORY", "0") == "1"
+SHARED_MEMORY_PREFIX = os.environ.get("TELEMETRY_SHM_PREFIX", "telemetry")
+SHARED_SYNC_INTERVAL = float(os.environ.get("TELEMETRY_SHARED_SYNC_INTERVAL", 0.05))
+NUMERIC_FIELDS = [name for name, field in SensorData.model_fields.items() if field.annotation is not str]
+# Colonnes des réponses en colonnes / Arrow, dans l'ordre du modèle
+RECORD_TYPES = {"seq": int, **{name: field.annotation for name, field in SensorData.model_fields.items()}}
+
+# Les règles d'alarme sont communes à la flotte, leur état est suivi par véhicule
+alarm_engine = AlarmEngine(NUMERIC_FIELDS, rules_path=ALARM_RULES_PATH)
+
+# L'historique mono-véhicule des versions précédentes devient celui du véhicule par défaut
+default_history_path = os.path.join(HISTORY_DIR, f"{DEFAULT_VEHICLE_ID}.db")
+if os.path.exists(LEGACY_HISTORY_DB) and not os.path.exists(default_history_path):
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.replace(LEGACY_HISTORY_DB + suffix, default_history_path + suffix)
+        except FileNotFoundError:
+            pass  # Fichier absent, ou déjà déplacé par un autre worker
+
+fleet = Fleet(
+    {name: field.annotation for name, field in SensorData.model_fields.items()},
+    HISTORY_DIR,
+    buffer_capacity=BUFFER_CAPACITY,
+    rate_limit=VEHICLE_RATE_LIMIT,
+    rate_burst=VEHICLE_RATE_BURST,
+    queue_size=STREAM_QUEUE_SIZE,
+    alarm_engine=alarm_engine,
+    shared_memory_prefix=SHARED_MEMORY_PREFIX if SHARED_MEMORY else None,
+)
+
+def sync_fleet():
+    """Catches up with the vehicles, samples and alarm rules written by the other workers."""
+    if not SHARED_MEMORY:
+        return
+    fleet.discover()
+    alarm_engine.reload_if_changed()
+    for shard in fleet:
+        shard.sync()
+
+async def follow_shared_fleet():
+    while True:
+        # Une erreur (base verrouillée, ...) est journalisée : la tâche continue, sinon ce worker ne suivrait plus les autres
+        try:
+            sync_fleet()
+        except Exception:
+            logger.exception("Shared fleet sync failed")
+        await asyncio.sleep(SHARED_SYNC_INTERVAL)
+
+def get_shard(vehicle_id):
+    shard = fleet.get(vehicle_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail=f"Unknown vehicle: {vehicle_id}")
+    return shard
+
+
+def parse_history_bound(value, end_of_day=False):
+    """Normalizes an ISO date/datetime query parameter to the stored 'datetime' format."""
+    if value is None:
+        return None
+    try:
+        bound = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    # Une date seule comme borne de fin inclut toute la journée
+    if end_of_day and len(value) == 10:
+        bound = bound.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return bound.strftime(DATETIME_FORMAT)
+
+def parse_fields(fields, allowed):
+    """Splits a comma-separated 'fields' query parameter and rejects unknown names."""
+    if not fields:
+        return None
+    selected_fields = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected_fields if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}")
+    return selected_fields
+
+def response_options(request, format, allowed, default):
+    """Negotiates (format, content encoding) for a data endpoint; 406 if the format is unavailable."""
+    try:
+        fmt = negotiate_format(format, request.headers.get("accept"), allowed, default)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    return fmt, negotiate_encoding(request.headers.get("accept-encoding"))
+
+def response_headers(encoding):
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return headers
 
-# Liste pour stocker toutes les données reçues
-sensor_data_list = []
+def format_event(records):
+    return f"id: {records[-1]['seq']}\ndata: {json.dumps(records)}\n\n"
 
 @app.get("/")
 async def read_root():
@@ -35,19 +213,299 @@ async def read_root():
 # Endpoint pour recevoir les données du véhicule
 @app.post("/send_data/")
 async def receive_data(new_data: SensorData):
-    sensor_data_list.append(new_data)
-    return {"status": "Data received successfully"}
+    shard = fleet.shard(new_data.vehicle_id)
+    if not shard.rate_limiter.consume(1):
+        raise HTTPException(status_code=429, detail=f"Rate limit exceeded for vehicle {new_data.vehicle_id}",
+                            headers={"Retry-After": str(shard.rate_limiter.retry_after())})
+    seq, _ = shard.ingest([new_data.model_dump()])
+    ingested_samples.inc(("send_data",))
+    return {"status": "Data received successfully", "seq": seq}
 
-# Endpoint pour envoyer toutes les données du capteur enregistrées
+async def read_batch(request, adapter):
+    """Validates a JSON array or NDJSON request body in one pass."""
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        # Convertir le flux NDJSON en tableau JSON pour le valider d'un seul coup
+        lines = [line for line in body.splitlines() if line.strip()]
+        body = b"[" + b",".join(lines) + b"]"
+    try:
+        return adapter.validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+def group_by_vehicle(batch):
+    records_by_vehicle = {}
+    for sample in batch:
+        records_by_vehicle.setdefault(sample.vehicle_id, []).append(sample.model_dump())
+    return records_by_vehicle
+
+def rate_limit(records_by_vehicle):
+    # Chaque véhicule est limité séparément ; un véhicule inconnu a un seau plein, son premier lot passe toujours
+    shards = {vehicle_id: fleet.get(vehicle_id) for vehicle_id in records_by_vehicle}
+    limited = [vehicle_id for vehicle_id, records in records_by_vehicle.items()
+               if shards[vehicle_id] is not None and not shards[vehicle_id].rate_limiter.consume(len(records))]
+    if limited:
+        retry_after = max(shards[vehicle_id].rate_limiter.retry_after() for vehicle_id in limited)
+        raise HTTPException(status_code=429, detail=f"Rate limit exceeded for vehicles {limited}",
+                            headers={"Retry-After": str(retry_after)})
+
+def ingest_by_vehicle(records_by_vehicle):
+    acks = {}
+    for vehicle_id, records in records_by_vehicle.items():
+        shard = fleet.get(vehicle_id)
+        if shard is None:
+            # Le fragment et son fichier ne sont créés qu'une fois le premier lot accepté
+            shard = fleet.shard(vehicle_id)
+            shard.rate_limiter.consume(len(records))
+        first_seq, last_seq = shard.ingest(records)
+        acks[vehicle_id] = {"received": len(records), "first_seq": first_seq, "last_seq": last_seq}
+    return acks
+
+# Endpoint pour recevoir un lot d'échantillons (tableau JSON ou NDJSON)
+@app.post("/send_batch/")
+async def receive_batch(request: Request):
+    batch = await read_batch(request, sensor_batch_adapter)
+    if not batch:
+        return {"status": "Empty batch", "received": 0}
+    records_by_vehicle = group_by_vehicle(batch)
+    rate_limit(records_by_vehicle)
+    acks = ingest_by_vehicle(records_by_vehicle)
+    ingested_samples.inc(("send_batch",), len(batch))
+    return {"status": "Batch received successfully", "received": len(batch), "vehicles": acks}
+
+# Endpoint pour recevoir des échantillons partiels (champs modifiés seulement) : chacun est
+# complété avec le dernier état connu du véhicule, l'historique ne contient que des échantillons complets
+@app.post("/send_delta/")
+async def receive_delta(request: Request):
+    batch = await read_batch(request, sensor_delta_adapter)
+    if not batch:
+        return {"status": "Empty batch", "received": 0}
+    records_by_vehicle = group_by_vehicle(batch)
+    # Reconstruire tous les lots avant d'en ingérer un : un lot refusé ne laisse rien derrière lui, pas même un fragment
+    for vehicle_id, deltas in records_by_vehicle.items():
+        shard = fleet.get(vehicle_id)
+        state = (shard.latest() if shard is not None else None) or {}
+        state.pop("seq", None)
+        records = []
+        for delta in deltas:
+            state = {**state, **{name: value for name, value in delta.items() if value is not None}}
+            missing = [name for name in SensorData.model_fields if name not in state]
+            if missing:
+                raise HTTPException(status_code=409, detail=f"No full sample yet for vehicle {vehicle_id}, missing {missing}")
+            records.append(state)
+        records_by_vehicle[vehicle_id] = records
+    rate_limit(records_by_vehicle)
+    acks = ingest_by_vehicle(records_by_vehicle)
+    ingested_samples.inc(("send_delta",), len(batch))
+    return {"status": "Batch received successfully", "received": len(batch), "vehicles": acks}
+
+# Endpoint pour envoyer les données reçues après le numéro de séquence 'since'
+# Formats : liste JSON (par défaut), JSON en colonnes, Arrow IPC ; compression gzip / zstd
 @app.get("/get_data/")
-async def get_data():
-    if sensor_data_list:
-        # Envoyer toutes les données et vider la liste après l'envoi
-        data_to_send = sensor_data_list.copy()
-        sensor_data_list.clear()
-        return data_to_send
-    return {"error": "No data available"}
+async def get_data(request: Request, vehicle_id: str = DEFAULT_VEHICLE_ID, since: int = 0, limit: int = 5000,
+                   consumer: Optional[str] = None, format: Optional[str] = None):
+    fmt, encoding = response_options(request, format, (RECORDS, COLUMNS, ARROW), RECORDS)
+    shard = fleet.get(vehicle_id)
+    # La lecture ne vide pas le tampon : chaque client garde son propre curseur
+    data_to_send = shard.read_since(since, limit) if shard is not None else []
+    if consumer and shard is not None:
+        shard.record_consumer(consumer, data_to_send[-1]["seq"] if data_to_send else since)
+    if not data_to_send and fmt == RECORDS:
+        return {"error": "No data available"}
+    # Sérialisation directe : évite la conversion générique de FastAPI, coûteuse sur de gros lots
+    body, encoding = compress(encode_records(data_to_send, fmt, RECORD_TYPES), encoding)
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers=response_headers(encoding))
+
+# Endpoint de diffusion en direct : un événement SSE par micro-lot d'échantillons
+@app.get("/stream")
+async def stream(request: Request, vehicle_id: str = DEFAULT_VEHICLE_ID, since: int = -1,
+                 consumer: Optional[str] = None):
+    if not re.match(VEHICLE_ID_PATTERN, vehicle_id):
+        raise HTTPException(status_code=400, detail=f"Invalid vehicle id: {vehicle_id}")
+    # Pas de fragment créé pour un véhicule inconnu : le client réessaie une fois le premier échantillon reçu
+    shard = get_shard(vehicle_id)
+    # Un client qui se reconnecte reprend à partir du dernier événement reçu
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    # S'abonner avant de lire l'historique pour ne perdre aucun échantillon
+    queue = shard.broadcaster.subscribe()
+    backlog = shard.buffer.read_since(since) if since >= 0 else []
+
+    async def events():
+        try:
+            if backlog:
+                last_seq = backlog[-1]["seq"]
+                covered_from = backlog[0]["seq"] - 1
+            else:
+                last_seq = shard.buffer.head_seq if since < 0 else min(since, shard.buffer.head_seq)
+                covered_from = last_seq
+            # Premier événement : le flux contient tous les échantillons après 'covered_from'
+            yield f"id: {covered_from}\nevent: ready\ndata: []\n\n"
+            if backlog:
+                yield format_event(backlog)
+            while True:
+                try:
+                    records = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Regrouper les lots déjà en attente dans un seul événement
+                while not queue.empty():
+                    records = records + queue.get_nowait()
+                records = [record for record in records if record["seq"] > last_seq]
+                if records and records[0]["seq"] > last_seq + 1:
+                    # Micro-lots perdus (file pleine, client lent) : relire la suite depuis le tampon ou l'historique
+                    records = shard.read_since(last_seq)
+                if records:
+                    last_seq = records[-1]["seq"]
+                    yield format_event(records)
+                    if consumer:
+                        shard.record_consumer(consumer, last_seq)
+        finally:
+            shard.broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Endpoint de l'historique persistant, filtré par plage de dates et par champs
+@app.get("/history")
+async def history(request: Request, vehicle_id: str = DEFAULT_VEHICLE_ID, start: Optional[str] = None, end: Optional[str] = None, fields: Optional[str] = None, chunk_size: int = 1000,
+                  format: Optional[str] = None):
+    fmt, encoding = response_options(request, format, (NDJSON, COLUMNS, ARROW), NDJSON)
+    shard = get_shard(vehicle_id)
+    selected_fields = parse_fields(fields, SensorData.model_fields)
+    start_bound = parse_history_bound(start)
+    end_bound = parse_history_bound(end, end_of_day=True)
+    column_types = {name: annotation for name, annotation in RECORD_TYPES.items()
+                    if selected_fields is None or name in ("seq", "datetime") or name in selected_fields}
+
+    # Résultat envoyé un bloc de 'chunk_size' lignes à la fois (NDJSON ou lots Arrow)
+    chunks = shard.history.iter_range(start_bound, end_bound, selected_fields, max(1, chunk_size))
+    return StreamingResponse(iter_compressed(iter_encoded(chunks, fmt, column_types), encoding),
+                             media_type=MEDIA_TYPES[fmt], headers=response_headers(encoding))
+
+# Endpoint des agrégats : une période précise ('bucket') ou une plage de périodes
+@app.get("/rollups")
+async def get_rollups(vehicle_id: str = DEFAULT_VEHICLE_ID, resolution: str = "day", bucket: Optional[str] = None, start: Optional[str] = None,
+                      end: Optional[str] = None, fields: Optional[str] = None):
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution: {resolution}")
+    shard = get_shard(vehicle_id)
+    selected_fields = parse_fields(fields, NUMERIC_FIELDS)
+    shard.sync()
+    if bucket is not None:
+        result = shard.rollups.get(resolution, bucket, selected_fields)
+        return [result] if result else []
+    return shard.rollups.query(resolution, start, end, selected_fields)
+
+# Endpoint de la flotte : liste des véhicules connus
+@app.get("/fleet")
+async def get_fleet():
+    sync_fleet()
+    return [
+        {"vehicle_id": shard.vehicle_id, "head_seq": shard.buffer.head_seq, "buffered": len(shard.buffer)}
+        for shard in fleet
+    ]
+
+# Endpoint de la flotte : dernier état de chaque véhicule en un seul appel
+@app.get("/fleet/latest")
+async def get_fleet_latest():
+    sync_fleet()
+    return {shard.vehicle_id: shard.latest() for shard in fleet}
+
+# Endpoints des règles d'alarme
+@app.get("/alarms/rules")
+async def get_alarm_rules():
+    sync_fleet()
+    return alarm_engine.rules
+
+@app.put("/alarms/rules")
+async def replace_alarm_rules(rules: list[AlarmRule]):
+    try:
+        alarm_engine.set_rules([rule.model_dump() for rule in rules])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return alarm_engine.rules
+
+@app.put("/alarms/rules/{rule_id}")
+async def upsert_alarm_rule(rule_id: str, rule: AlarmRule):
+    if rule.id != rule_id:
+        raise HTTPException(status_code=400, detail="Rule id does not match the URL")
+    try:
+        alarm_engine.upsert_rule(rule.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return rule
+
+@app.delete("/alarms/rules/{rule_id}")
+async def delete_alarm_rule(rule_id: str):
+    if not alarm_engine.delete_rule(rule_id):
+        raise HTTPException(status_code=404, detail=f"Unknown rule: {rule_id}")
+    return {"status": "Rule deleted"}
+
+# Endpoint des alarmes actives (toute la flotte ou un véhicule)
+@app.get("/alarms/active")
+async def get_active_alarms(vehicle_id: Optional[str] = None):
+    sync_fleet()
+    return alarm_engine.active_alarms(vehicle_id)
+
+# Endpoint des événements d'alarme (déclenchement / retour à la normale)
+@app.get("/alarms/events")
+async def get_alarm_events(since: int = 0, vehicle_id: Optional[str] = None, limit: int = 1000):
+    sync_fleet()
+    return alarm_engine.events_since(since, vehicle_id, limit)
+
+# Endpoint Prometheus : compteurs, latences, état des tampons et retard des consommateurs
+@app.get("/metrics")
+async def get_metrics():
+    sync_fleet()
+    # Compteurs propres à chaque processus : avec plusieurs workers, une série par worker reste monotone
+    worker = (("worker", str(os.getpid())),)
+    now = datetime.now().timestamp()
+    depth, capacity, memory, oldest_age, lag, subscribers, dropped = [], [], [], [], [], [], []
+    for shard in fleet:
+        labels = (shard.vehicle_id,)
+        depth.append((labels, len(shard.buffer)))
+        capacity.append((labels, shard.buffer.capacity))
+        memory.append((labels, shard.buffer.nbytes))
+        oldest = shard.oldest_unconsumed()
+        oldest_age.append((labels, max(0.0, now - datetime.fromisoformat(oldest["datetime"]).timestamp()) if oldest else 0.0))
+        for consumer, cursor in shard.consumer_cursors.items():
+            lag.append(((shard.vehicle_id, consumer), shard.buffer.head_seq - cursor))
+        subscribers.append((labels, len(shard.broadcaster)))
+        dropped.append((labels, shard.broadcaster.dropped))
+    lines = requests_total.render(worker) + request_duration.render(worker) + ingested_samples.render(worker)
+    lines += format_metric("api_buffer_depth", "Samples held in the ring buffer.", "gauge", depth, ("vehicle_id",))
+    lines += format_metric("api_buffer_capacity", "Ring buffer capacity in samples.", "gauge", capacity, ("vehicle_id",))
+    lines += format_metric("api_buffer_memory_bytes", "Memory held by the ring buffer columns.", "gauge", memory, ("vehicle_id",))
+    lines += format_metric("api_oldest_unconsumed_sample_age_seconds",
+                           "Age of the oldest sample not yet read by the slowest named consumer.", "gauge",
+                           oldest_age, ("vehicle_id",))
+    lines += format_metric("api_consumer_lag_samples", "Samples between the head and each consumer cursor.", "gauge",
+                           lag, ("vehicle_id", "consumer"), worker)
+    lines += format_metric("api_stream_subscribers", "Connected live stream clients.", "gauge", subscribers, ("vehicle_id",),
+                           worker)
+    lines += format_metric("api_stream_dropped_batches_total", "Micro-batches dropped for slow stream clients.", "counter",
+                           dropped, ("vehicle_id",), worker)
+    lines += format_metric("api_active_alarms", "Alarms currently active.", "gauge", [((), len(alarm_engine.active_alarms()))])
+    lines += format_metric("process_resident_memory_bytes", "Resident memory of the server process.", "gauge",
+                           [((), resident_memory_bytes())], const_labels=worker)
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    parser = argparse.ArgumentParser(description="SolarEnviroMonitor telemetry server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes sharing the telemetry buffers")
+    args = parser.parse_args()
+    if args.workers > 1:
+        # Les workers héritent de l'environnement : tampons en mémoire partagée
+        os.environ["TELEMETRY_SHARED_MEMORY"] = "1"
+        try:
+            uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+        finally:
+            # Tous les workers sont arrêtés : libérer les tampons partagés (mémoire de /dev/shm)
+            remove_segments(SHARED_MEMORY_DIR or HISTORY_DIR, SHARED_MEMORY_PREFIX)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
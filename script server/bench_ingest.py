@@ -0,0 +1,254 @@
+# Banc d'essai de l'ingestion d'api_server (hors ligne, reproductible)
+#
+#   python bench_ingest.py                      # in-process + uvicorn local
+#   python bench_ingest.py --mode inprocess --samples 5000 --json results.json
+#
+# Les échantillons sont produits par les simulateurs de ugv_data_sender.py.
+# Le serveur tourne dans un répertoire temporaire : aucun historique existant
+# n'est modifié.
+import argparse
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pvlib
+import requests
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+VEHICLE_DIR = os.path.join(os.path.dirname(SERVER_DIR), "script vehicle")
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, VEHICLE_DIR)
+import ugv_data_sender as sender
+
+BATCH_SIZES = [10, 100, 1000]
+DRAIN_SIZES = [100, 1000, 10000]
+DRAIN_FORMATS = ["records", "columns", "arrow"]
+
+
+def make_payloads(count, seed=0, start=None):
+    """Builds ``count`` realistic samples, one second apart, with the vehicle simulators."""
+    np.random.seed(seed)
+    start = start or datetime.now().replace(microsecond=0)
+    times = pd.DatetimeIndex([start + timedelta(seconds=i) for i in range(count)])
+    latitude, longitude = sender.simulate_gps_data()
+    # Position du soleil calculée en un seul appel pour tous les échantillons
+    solar = pvlib.solarposition.get_solarposition(times, latitude, longitude)
+    payloads = []
+    velocity = np.zeros(3)
+    for i, current_time in enumerate(times):
+        latitude, longitude = sender.simulate_gps_data()
+        light_level = sender.simulate_light_level()
+        accel_data, gyro_data, mag_data = sender.simulate_imu_data()
+        roll, pitch, yaw = sender.calculate_orientation(accel_data, mag_data)
+        velocity = sender.calculate_velocity(accel_data, velocity, 1)
+        elevation, azimuth = float(solar['elevation'].iloc[i]), float(solar['azimuth'].iloc[i])
+        panel_elevation, panel_azimuth = (0, 0) if elevation < 0 or light_level < 200 else (elevation, azimuth)
+        processed_elevation, processed_azimuth = sender.process_angles(panel_elevation, panel_azimuth, yaw, pitch)
+        payloads.append({
+            'vehicle_id': sender.VEHICLE_ID,
+            'datetime': current_time.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            'timestamp': current_time.replace(minute=0, second=0).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'sun_elevation': elevation,
+            'sun_azimuth': azimuth,
+            'panel_elevation': float(panel_elevation),
+            'panel_azimuth': float(panel_azimuth),
+            'processed_elevation': float(processed_elevation),
+            'processed_azimuth': float(processed_azimuth),
+            'orientation_north': float(yaw),
+            'pitch': float(pitch),
+            'roll': float(roll),
+            'current_light_level': float(light_level),
+            'temperature': float(sender.simulate_temperature()),
+            'humidity': float(sender.simulate_humidity()),
+            'velocity_total': float(sender.estimate_vehicle_speed(velocity)),
+            'current_energy': float(sender.currently_produced_energy()),
+            'battery_level': int(sender.estimate_battery_level()),
+            'operating_time': int(sender.estimate_operating_time()),
+        })
+    return payloads
+
+
+def summarize(name, latencies, samples):
+    latencies = np.asarray(latencies)
+    total = latencies.sum()
+    return {
+        "scenario": name,
+        "requests": int(len(latencies)),
+        "samples": int(samples),
+        "samples_per_s": samples / total if total else float("inf"),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def timed(call, repeat):
+    latencies = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def run_scenarios(post, get, payloads, prefix):
+    """Runs the single, batch and drain scenarios through ``post(path, body)`` / ``get(path, params)``."""
+    results = []
+    results.append(summarize(f"{prefix} send_data", timed(lambda i: post("/send_data/", payloads[i]), len(payloads)), len(payloads)))
+    for batch_size in BATCH_SIZES:
+        batches = [payloads[i:i + batch_size] for i in range(0, len(payloads), batch_size)]
+        batches = [batch for batch in batches if len(batch) == batch_size] or [payloads[:batch_size]]
+        results.append(summarize(f"{prefix} send_batch x{batch_size}",
+                                 timed(lambda i: post("/send_batch/", batches[i]), len(batches)),
+                                 batch_size * len(batches)))
+    for drain_size in DRAIN_SIZES:
+        # Remplir le tampon jusqu'à la taille voulue puis mesurer une lecture complète
+        while len(payloads) < drain_size:
+            payloads = payloads + payloads
+        for i in range(0, drain_size, 1000):
+            post("/send_batch/", payloads[i:min(i + 1000, drain_size)])
+        repeat = 20 if drain_size <= 1000 else 5
+        for fmt in DRAIN_FORMATS:
+            results.append(summarize(f"{prefix} get_data {drain_size} {fmt}",
+                                     timed(lambda i: get("/get_data/", {"since": 0, "limit": drain_size, "format": fmt}), repeat),
+                                     drain_size * repeat))
+    return results
+
+
+def configure_environment(workdir):
+    os.environ["TELEMETRY_HISTORY_DIR"] = os.path.join(workdir, "history")
+    os.environ["ALARM_RULES_PATH"] = os.path.join(workdir, "alarm_rules.json")
+    os.environ["TELEMETRY_BUFFER_CAPACITY"] = str(max(DRAIN_SIZES))
+    os.environ["VEHICLE_RATE_LIMIT"] = "1e9"
+    os.environ["VEHICLE_RATE_BURST"] = "1000000000"
+
+
+def bench_inprocess(payloads, workdir):
+    """Drives the FastAPI app in the current process (no network, no uvicorn)."""
+    from fastapi.testclient import TestClient
+    configure_environment(workdir)
+    os.chdir(workdir)
+    api_server = importlib.import_module("api_server")
+    client = TestClient(api_server.app)
+
+    def post(path, body):
+        client.post(path, json=body).raise_for_status()
+
+    def get(path, params):
+        client.get(path, params=params).raise_for_status()
+
+    return run_scenarios(post, get, payloads, "inprocess") + bench_components(api_server, payloads)
+
+
+def bench_components(api_server, payloads):
+    """Times each stage of the ingest path separately to show where the latency goes."""
+    raw = [json.dumps(payload).encode() for payload in payloads]
+    raw_batch = json.dumps(payloads).encode()
+    results = [
+        summarize("component json.loads", timed(lambda i: json.loads(raw[i]), len(raw)), len(raw)),
+        summarize("component SensorData.model_validate",
+                  timed(lambda i: api_server.SensorData.model_validate(payloads[i]), len(payloads)), len(payloads)),
+        summarize("component SensorData.model_validate_json",
+                  timed(lambda i: api_server.SensorData.model_validate_json(raw[i]), len(raw)), len(raw)),
+        summarize("component batch validate_json",
+                  timed(lambda i: api_server.sensor_batch_adapter.validate_json(raw_batch), 5), 5 * len(payloads)),
+    ]
+    records = [api_server.SensorData.model_validate(payload).model_dump() for payload in payloads]
+    # Un fragment neuf par composant : les écritures directes d'une mesure ne sont pas rejouées
+    # (sync) par la suivante
+    ring = api_server.fleet.shard("bench-ring").buffer
+    results.append(summarize("component ring buffer append",
+                             timed(lambda i: ring.append(records[i]), len(records)), len(records)))
+    history = api_server.fleet.shard("bench-history").history
+    results.append(summarize("component history append",
+                             timed(lambda i: history.append([dict(records[i], seq=i + 1)]), len(records)), len(records)))
+    rollups = api_server.fleet.shard("bench-rollups").rollups
+    results.append(summarize("component rollups update",
+                             timed(lambda i: rollups.update(records[i]), len(records)), len(records)))
+    shard = api_server.fleet.shard("bench-ingest")
+    results.append(summarize("component shard ingest",
+                             timed(lambda i: shard.ingest([dict(records[i])]), len(records)), len(records)))
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_uvicorn(payloads, workdir):
+    """Drives a local uvicorn process over HTTP with a keep-alive session."""
+    configure_environment(workdir)
+    port = free_port()
+    # Lancé depuis le répertoire temporaire : les chemins relatifs (dont l'ancien telemetry_history.db,
+    # migré au démarrage) ne désignent jamais les données du serveur
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": SERVER_DIR},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    session = requests.Session()
+    try:
+        for _ in range(100):
+            try:
+                session.get(base_url, timeout=1)
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+
+        def post(path, body):
+            session.post(base_url + path, json=body).raise_for_status()
+
+        def get(path, params):
+            session.get(base_url + path, params=params).raise_for_status()
+
+        return run_scenarios(post, get, payloads, "uvicorn")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_results(results):
+    print(f"{'scenario':45s} {'requests':>8s} {'samples/s':>12s} {'p50 ms':>9s} {'p99 ms':>9s}")
+    for result in results:
+        print(f"{result['scenario']:45s} {result['requests']:8d} {result['samples_per_s']:12.0f} "
+              f"{result['p50_ms']:9.3f} {result['p99_ms']:9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="api_server ingest benchmark")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "all"], default="all")
+    parser.add_argument("--samples", type=int, default=2000, help="number of simulated samples per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.samples, seed=args.seed)
+    results = []
+    if args.mode in ("uvicorn", "all"):
+        with tempfile.TemporaryDirectory() as workdir:
+            results += bench_uvicorn(payloads, workdir)
+    if args.mode in ("inprocess", "all"):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                results += bench_inprocess(payloads, workdir)
+            finally:
+                os.chdir(cwd)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"samples": args.samples, "seed": args.seed, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import asyncio
+
+class Broadcaster:
+    """Fans out ingested samples to every subscriber through a bounded queue.
+
+    A slow subscriber never blocks ingest: when its queue is full the oldest
+    pending micro-batch is dropped and counted in ``dropped``. Subscribers
+    detect the gap in sequence numbers and read the missing records back.
+    """
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._subscribers = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, records):
+        """Queues a micro-batch (list of records) for every subscriber."""
+        if not records:
+            return
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(records)
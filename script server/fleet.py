@@ -0,0 +1,202 @@
+import math
+import os
+import re
+import time
+import numpy as np
+from broadcaster import Broadcaster
+from history_store import HistoryStore
+from ring_buffer import TelemetryRingBuffer
+from shared_ring_buffer import SHARED_MEMORY_DIR, SharedTelemetryRingBuffer
+from rollups import RollupAggregator
+
+# Identifiant de véhicule : sert aussi de nom de fichier pour son historique
+VEHICLE_ID_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$"
+DEFAULT_VEHICLE_ID = "ugv-1"
+
+
+class TokenBucket:
+    """Per-vehicle rate limiter allowing ``rate`` samples per second on average.
+
+    A batch is accepted whenever the bucket is not empty, even if it is larger
+    than the remaining tokens; the bucket then goes into debt, so a vehicle
+    draining a backlog is slowed down rather than rejected forever.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self, count=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens <= 0:
+            return False
+        self.tokens -= count
+        return True
+
+    def retry_after(self):
+        """Whole seconds until the bucket is no longer empty (for the Retry-After header)."""
+        return max(1, math.ceil(-self.tokens / self.rate)) if self.rate > 0 else 60
+
+
+class VehicleShard:
+    """Everything the server keeps for one vehicle.
+
+    Each shard owns its ring buffer, SQLite history file, rollups, live
+    stream subscribers and rate limiter, so vehicles never share a lock or a
+    database.
+
+    With ``shared_memory_prefix`` the ring buffer lives in shared memory and
+    is common to every worker process. Rollups, alarms and live streams stay
+    local to each process: ``sync`` applies the records written by the other
+    workers so every process derives the same state from the same stream.
+    """
+
+    def __init__(self, vehicle_id, fields, history_path, buffer_capacity=3600,
+                 rate_limit=50.0, rate_burst=1000, queue_size=256, alarm_engine=None,
+                 shared_memory_prefix=None):
+        self.vehicle_id = vehicle_id
+        self.alarm_engine = alarm_engine
+        self.history = HistoryStore(
+            history_path, {name: "TEXT" if annotation is str else "REAL" for name, annotation in fields.items()})
+
+        # Recharger les derniers échantillons persistés dans le tampon circulaire
+        column_types = {name: object if annotation is str else np.float64 for name, annotation in fields.items()}
+        if shared_memory_prefix:
+            def restore():
+                last_records = self.history.tail(buffer_capacity)
+                return self.history.last_seq() - len(last_records), last_records
+
+            # Seul le premier worker à ouvrir le segment le remplit
+            segment_dir = SHARED_MEMORY_DIR or os.path.dirname(history_path)
+            self.buffer = SharedTelemetryRingBuffer(
+                os.path.join(segment_dir, f"{shared_memory_prefix}_{vehicle_id}.ring"),
+                column_types, buffer_capacity, restore=restore,
+            )
+        else:
+            last_records = self.history.tail(buffer_capacity)
+            self.buffer = TelemetryRingBuffer(
+                column_types,
+                capacity=buffer_capacity,
+                head_seq=self.history.last_seq() - len(last_records),
+            )
+            self.buffer.extend(last_records)
+
+        self.numeric_fields = [name for name, annotation in fields.items() if annotation is not str]
+        self.rollups = RollupAggregator(self.numeric_fields)
+        # Agrégats recalculés par SQLite (GROUP BY), sans rejouer l'historique enregistrement par enregistrement ;
+        # avec plusieurs workers, seul celui qui a initialisé le segment met à jour le cache des agrégats
+        update_cache = not shared_memory_prefix or self.buffer.created
+        # Dernier numéro de séquence appliqué aux agrégats, alarmes et flux de ce processus : celui de l'instantané
+        # lu par rebuild, les échantillons écrits depuis par les autres workers sont appliqués par sync
+        self._applied_seq = self.rollups.rebuild(self.history, update_cache)
+
+        self.broadcaster = Broadcaster(queue_size=queue_size)
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+        # Curseur de chaque consommateur nommé, pour mesurer son retard
+        self.consumer_cursors = {}
+
+    def ingest(self, records):
+        """Buffers, persists, aggregates, checks alarms and broadcasts records.
+
+        Returns (first_seq, last_seq).
+        """
+        first_seq, last_seq = self.buffer.extend(records)
+        for seq, record in enumerate(records, start=first_seq):
+            record["seq"] = seq
+        self.history.append(records)
+        if first_seq == self._applied_seq + 1:
+            self._apply(records)
+        else:
+            # D'autres workers ont écrit entre-temps : tout reprendre dans l'ordre
+            self.sync()
+        return first_seq, last_seq
+
+    def _apply(self, records):
+        self.rollups.update_many(records)
+        if self.alarm_engine is not None:
+            self.alarm_engine.evaluate(self.vehicle_id, records)
+        self.broadcaster.publish(records)
+        self._applied_seq = records[-1]["seq"]
+
+    def sync(self):
+        """Applies the records this process has not seen yet (written by other workers)."""
+        if self.buffer.head_seq > self._applied_seq:
+            records = self.read_since(self._applied_seq)
+            if records:
+                self._apply(records)
+
+    def read_since(self, since, limit=None):
+        # Un consommateur en retard au-delà du tampon lit la suite dans l'historique
+        if 0 <= since < self.buffer.oldest_seq - 1:
+            return self.history.read_after(since, limit)
+        return self.buffer.read_since(since, limit)
+
+    def record_consumer(self, consumer, cursor):
+        self.consumer_cursors[consumer] = min(cursor, self.buffer.head_seq)
+
+    def oldest_unconsumed(self):
+        """Returns the oldest record the slowest consumer has not read yet (or the oldest buffered one)."""
+        if self.consumer_cursors:
+            cursor = min(self.consumer_cursors.values())
+        else:
+            cursor = self.buffer.oldest_seq - 1
+        records = self.read_since(cursor, 1)
+        return records[0] if records else None
+
+    def latest(self):
+        records = self.buffer.read_since(self.buffer.head_seq - 1)
+        return records[-1] if records else None
+
+
+class Fleet:
+    """Per-vehicle shards, created on the first sample of each vehicle.
+
+    Shards whose history file already exists in ``history_dir`` are reopened
+    at startup so the fleet endpoints list every known vehicle.
+    """
+
+    def __init__(self, fields, history_dir, **shard_options):
+        self.fields = fields
+        self.history_dir = history_dir
+        self.shard_options = shard_options
+        self._shards = {}
+        os.makedirs(history_dir, exist_ok=True)
+        self.discover()
+
+    def discover(self):
+        """Opens the shards of history files not loaded yet (e.g. created by another worker)."""
+        for filename in sorted(os.listdir(self.history_dir)):
+            if filename.endswith(".db") and filename[:-3] not in self._shards:
+                self.shard(filename[:-3])
+
+    def __iter__(self):
+        return iter(list(self._shards.values()))
+
+    def __len__(self):
+        return len(self._shards)
+
+    def _history_path(self, vehicle_id):
+        return os.path.join(self.history_dir, f"{vehicle_id}.db")
+
+    def get(self, vehicle_id):
+        """Returns the shard of a known vehicle, or None; never creates a history file.
+
+        A vehicle whose history file exists but is not loaded yet (created by
+        another worker) is opened.
+        """
+        shard = self._shards.get(vehicle_id)
+        if shard is None and re.match(VEHICLE_ID_PATTERN, vehicle_id) and os.path.exists(self._history_path(vehicle_id)):
+            shard = self.shard(vehicle_id)
+        return shard
+
+    def shard(self, vehicle_id):
+        """Returns the shard of a vehicle, creating it and its history file on first use."""
+        shard = self._shards.get(vehicle_id)
+        if shard is None:
+            shard = VehicleShard(vehicle_id, self.fields, self._history_path(vehicle_id), **self.shard_options)
+            self._shards[vehicle_id] = shard
+        return shard
@@ -0,0 +1,239 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Derniers numéros de séquence où chercher un échantillon encore en cours d'écriture par un autre worker
+SEQ_GAP_WINDOW = 10000
+
+class HistoryStore:
+    """Append-only SQLite store (WAL mode) of every ingested sample.
+
+    Rows are keyed by their sequence number and indexed by the sample
+    'datetime' string, whose "%Y-%m-%d %H:%M:%S.%f" format sorts
+    chronologically, so time-range queries only touch the requested window.
+    """
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = list(fields)
+        # Réentrant : les requêtes d'un instantané (``snapshot``) reprennent le verrou
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._conn = self._connect()
+        columns_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in fields.items())
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS samples (seq INTEGER PRIMARY KEY, {columns_sql})")
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(samples)")}
+        for name, sql_type in fields.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE samples ADD COLUMN {name} {sql_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_datetime ON samples (datetime)")
+        # Agrégats des périodes terminées, pour ne pas reparcourir l'historique à chaque démarrage
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rollup_cache (prefix_length INTEGER, key TEXT, fields TEXT, "
+                           "count INTEGER, sums TEXT, mins TEXT, maxs TEXT, stale INTEGER DEFAULT 0, "
+                           "PRIMARY KEY (prefix_length, key))")
+        if "stale" not in {row[1] for row in self._conn.execute("PRAGMA table_info(rollup_cache)")}:
+            self._conn.execute("ALTER TABLE rollup_cache ADD COLUMN stale INTEGER DEFAULT 0")
+        self._conn.commit()
+        # Résolutions présentes dans le cache, dont les périodes touchées par un ajout sont invalidées
+        self._cache_prefixes = {row[0] for row in self._conn.execute("SELECT DISTINCT prefix_length FROM rollup_cache")}
+        self._insert_sql = (
+            f"INSERT OR REPLACE INTO samples (seq, {', '.join(self.fields)}) "
+            f"VALUES ({', '.join('?' for _ in range(len(self.fields) + 1))})"
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Plusieurs workers peuvent écrire dans le même fichier
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def append(self, records):
+        """Persists records that already carry their 'seq', in one transaction.
+
+        Cached aggregates of the periods the records fall in (late samples,
+        replays) are marked stale in the same transaction.
+        """
+        rows = [(record["seq"], *(record[name] for name in self.fields)) for record in records]
+        with self._lock:
+            stale = {(prefix_length, record["datetime"][:prefix_length])
+                     for prefix_length in self._cache_prefixes for record in records}
+            self._conn.executemany(self._insert_sql, rows)
+            if stale:
+                self._conn.executemany("UPDATE rollup_cache SET stale = 1 WHERE prefix_length = ? AND key = ?", stale)
+            self._conn.commit()
+
+    def last_seq(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM samples").fetchone()[0]
+
+    def last_datetime(self, until_seq=None):
+        if until_seq is None:
+            query, params = "SELECT MAX(datetime) FROM samples", ()
+        else:
+            # Parcours de l'index à rebours : s'arrête au premier échantillon retenu
+            query, params = "SELECT datetime FROM samples WHERE seq <= ? ORDER BY datetime DESC LIMIT 1", (until_seq,)
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            return row[0] if row else None
+
+    @contextmanager
+    def snapshot(self, update_cache=True):
+        """Runs the queries of the block on one consistent state of the file.
+
+        Yields the sequence number up to which every sample is stored: a
+        higher one may already be committed by another worker while a lower
+        one is not yet. Cache writes requested by ``cached_aggregates`` are
+        made at the end, only if no other connection wrote in the meantime,
+        and the write lock is held just for them.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                yield self._snapshot["seq"]
+                return
+            self._conn.execute("BEGIN")
+            try:
+                last = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM samples").fetchone()[0]
+                # Premier échantillon sans successeur : au-delà, des écritures sont peut-être encore en cours
+                seq = self._conn.execute(
+                    "SELECT MIN(seq) FROM samples s WHERE seq >= ? "
+                    "AND NOT EXISTS (SELECT 1 FROM samples n WHERE n.seq = s.seq + 1)",
+                    (last - SEQ_GAP_WINDOW,)).fetchone()[0] or 0
+                self._snapshot = {"seq": seq, "complete": seq == last, "update_cache": update_cache, "writes": []}
+                yield seq
+                self._write_cache(self._snapshot["writes"])
+                self._conn.commit()
+            finally:
+                self._snapshot = None
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+
+    def _write_cache(self, writes):
+        if not writes:
+            return
+        try:
+            for statement, params in writes:
+                self._conn.executemany(statement, params)
+        except sqlite3.OperationalError:
+            # Un autre worker a écrit depuis le début de la lecture : le cache sera complété au prochain démarrage
+            self._conn.rollback()
+
+    def aggregate(self, prefix_length, fields, start=None, until_seq=None, end=None):
+        """Returns (key, count, sums, mins, maxs) per 'datetime' prefix of ``prefix_length`` characters.
+
+        The grouping runs inside SQLite, so rebuilding rollups at start-up
+        does not go through Python one record at a time.
+        """
+        columns = [f"{function}({name})" for function in ("SUM", "MIN", "MAX") for name in fields]
+        query = f"SELECT substr(datetime, 1, ?), COUNT(*), {', '.join(columns)} FROM samples"
+        conditions, params = [], [prefix_length]
+        if start is not None:
+            conditions.append("datetime >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("datetime < ?")
+            params.append(end)
+        if until_seq is not None:
+            conditions.append("seq <= ?")
+            params.append(until_seq)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " GROUP BY 1 ORDER BY 1"
+        n = len(fields)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(row[0], row[1], row[2:2 + n], row[2 + n:2 + 2 * n], row[2 + 2 * n:]) for row in rows]
+
+    def cached_aggregates(self, prefix_length, fields, start=None):
+        """Same rows as ``aggregate`` up to the snapshot sequence, with the finished periods read from a cache.
+
+        Periods before the last one are computed once and kept in
+        'rollup_cache'; only the periods after the last cached one, and the
+        cached ones a later sample fell in (marked stale by ``append``), are
+        grouped again.
+        """
+        fields_key = json.dumps(list(fields))
+        with self.snapshot() as until_seq:
+            self._cache_prefixes.add(prefix_length)
+            cached, stale = [], []
+            for key, count, sums, mins, maxs, is_stale in self._conn.execute(
+                    "SELECT key, count, sums, mins, maxs, stale FROM rollup_cache WHERE prefix_length = ? AND fields = ? "
+                    "AND key >= ? ORDER BY key", (prefix_length, fields_key, (start or "")[:prefix_length])):
+                if is_stale:
+                    stale.append(key)
+                else:
+                    cached.append((key, count, json.loads(sums), json.loads(mins), json.loads(maxs)))
+            # Périodes en cache ayant reçu des échantillons en retard : regroupées à nouveau, une par une
+            regrouped = [row for key in stale
+                         for row in self.aggregate(prefix_length, fields, start=key, end=f"{key}~", until_seq=until_seq)]
+            last_key = max([row[0] for row in cached] + stale, default=None)
+            # '~' est après tous les caractères d'une date : reprendre juste après la dernière période en cache
+            fresh = self.aggregate(prefix_length, fields, start=f"{last_key}~" if last_key else start,
+                                   until_seq=until_seq)
+            snapshot = self._snapshot
+            if snapshot["update_cache"] and snapshot["complete"]:
+                if start is not None:
+                    # Périodes sorties de la fenêtre conservée (minutes, heures)
+                    snapshot["writes"].append(("DELETE FROM rollup_cache WHERE prefix_length = ? AND key < ?",
+                                               [(prefix_length, start[:prefix_length])]))
+                # La dernière période peut encore recevoir des échantillons : elle n'est pas mise en cache
+                finished = regrouped + fresh[:-1]
+                if finished:
+                    snapshot["writes"].append((
+                        "INSERT OR REPLACE INTO rollup_cache (prefix_length, key, fields, count, sums, mins, maxs, stale) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                        [(prefix_length, key, fields_key, count, json.dumps(sums), json.dumps(mins), json.dumps(maxs))
+                         for key, count, sums, mins, maxs in finished]))
+        return sorted(cached + regrouped + fresh, key=lambda row: row[0])
+
+    def tail(self, count):
+        """Returns the last ``count`` records in sequence order (used to refill the ring buffer)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT * FROM (SELECT seq, {', '.join(self.fields)} FROM samples ORDER BY seq DESC LIMIT ?) ORDER BY seq",
+                (count,),
+            )
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def read_after(self, since, limit=None):
+        """Returns the records with a sequence number greater than ``since``, in order."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT seq, {', '.join(self.fields)} FROM samples WHERE seq > ? ORDER BY seq LIMIT ?",
+                (since, -1 if limit is None else limit),
+            )
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def iter_range(self, start=None, end=None, fields=None, chunk_size=1000):
+        """Yields lists of at most ``chunk_size`` records with 'datetime' in [start, end].
+
+        A separate connection is used so that a long read never holds the
+        writer lock; WAL mode lets it run concurrently with ingest.
+        """
+        fields = [name for name in (fields or self.fields) if name not in ("seq", "datetime")]
+        query = f"SELECT {', '.join(['seq', 'datetime'] + fields)} FROM samples"
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("datetime >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("datetime <= ?")
+            params.append(end)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY datetime"
+        conn = self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            names = [description[0] for description in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(zip(names, row)) for row in rows]
+        finally:
+            conn.close()
@@ -0,0 +1,121 @@
+import bisect
+import os
+import resource
+import time
+
+# Durées des requêtes, en secondes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(label_names, label_values, const_labels=()):
+    if not label_names and not const_labels:
+        return ""
+    pairs = []
+    for name, value in (*const_labels, *zip(label_names, label_values)):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_metric(name, help_text, metric_type, samples, label_names=(), const_labels=()):
+    """Renders one metric family; ``samples`` is an iterable of (label_values, value).
+
+    ``const_labels`` ((name, value) pairs) are added to every sample, e.g.
+    the worker that produced them.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for label_values, value in samples:
+        lines.append(f"{name}{_format_labels(label_names, label_values, const_labels)} {value}")
+    return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values (a dict update per call)."""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, const_labels=()):
+        return format_metric(self.name, self.help_text, "counter", self.values.items(), self.label_names, const_labels)
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``observe`` is one bisect and two additions."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._counts = {}
+        self._sums = {}
+
+    def observe(self, label_values, value):
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+            self._sums[label_values] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def render(self, const_labels=()):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        label_names = self.label_names + ("le",)
+        for label_values, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(label_names, label_values + (bound,), const_labels)} "
+                             f"{cumulative}")
+            labels = _format_labels(self.label_names, label_values, const_labels)
+            lines.append(f"{self.name}_sum{labels} {self._sums[label_values]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware counting requests and timing them per route template.
+
+    The route template (e.g. "/alarms/rules/{rule_id}") is used as label so
+    the number of series stays bounded whatever the URLs requested.
+    """
+
+    def __init__(self, app, requests_total, request_duration):
+        self.app = app
+        self.requests_total = requests_total
+        self.request_duration = request_duration
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            path = getattr(scope.get("route"), "path", "unmatched")
+            self.requests_total.inc((scope["method"], path, status))
+            self.request_duration.observe((path,), time.perf_counter() - start)
+
+
+def resident_memory_bytes():
+    """Current resident set size (falls back to the peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,128 @@
+import io
+import json
+import zlib
+
+# Dépendances facultatives : compression zstd et format Apache Arrow
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Formats proposés par les endpoints de données
+RECORDS, COLUMNS, ARROW, NDJSON = "records", "columns", "arrow", "ndjson"
+MEDIA_TYPES = {
+    RECORDS: "application/json",
+    COLUMNS: "application/vnd.telemetry.columns+json",
+    ARROW: "application/vnd.apache.arrow.stream",
+    NDJSON: "application/x-ndjson",
+}
+MIN_COMPRESS_SIZE = 1024  # En dessous, la compression coûte plus qu'elle ne rapporte
+
+
+def negotiate_format(requested, accept, allowed, default):
+    """Picks the response format from ``?format=`` or else the Accept header.
+
+    Raises ValueError for an unknown format or Arrow without pyarrow.
+    """
+    if requested is None:
+        requested = default
+        for media_range in (accept or "").split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            matches = [name for name in allowed if MEDIA_TYPES[name] == media_type]
+            if matches and (matches[0] != ARROW or pa is not None):
+                requested = matches[0]
+                break
+    if requested not in allowed:
+        raise ValueError(f"Unknown format: {requested} (expected one of {', '.join(allowed)})")
+    if requested == ARROW and pa is None:
+        raise ValueError("Arrow format requires pyarrow on the server")
+    return requested
+
+
+def negotiate_encoding(accept_encoding):
+    """Returns "zstd", "gzip" or None from an Accept-Encoding header."""
+    accepted = set()
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.strip().lower())
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compressor(encoding):
+    """Streaming compressor with compress()/flush(), as zlib.compressobj."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 31)  # En-tête gzip
+
+
+def compress(body, encoding):
+    """Compresses a whole body; returns (body, content_encoding)."""
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    stream = compressor(encoding)
+    return stream.compress(body) + stream.flush(), encoding
+
+
+def to_columns(records, field_types):
+    return {name: [record.get(name) for record in records] for name in field_types}
+
+
+def arrow_schema(field_types):
+    return pa.schema([(name, pa.int64() if annotation is int else pa.string() if annotation is str else pa.float64())
+                      for name, annotation in field_types.items()])
+
+
+def encode_records(records, fmt, field_types):
+    """Serializes records in one piece; ``field_types`` maps column name to Python type."""
+    if fmt == COLUMNS:
+        return json.dumps({"count": len(records), "columns": to_columns(records, field_types)}).encode()
+    if fmt == ARROW:
+        return b"".join(iter_arrow([records], field_types))
+    if fmt == NDJSON:
+        return "".join(json.dumps(record) + "\n" for record in records).encode()
+    return json.dumps(records).encode()
+
+
+def iter_arrow(chunks, field_types):
+    """Yields an Arrow IPC stream, one record batch per chunk of records."""
+    schema = arrow_schema(field_types)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_batch(pa.RecordBatch.from_pydict(to_columns(chunk, field_types), schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def iter_encoded(chunks, fmt, field_types):
+    """Serializes chunks of records as they are read; the JSON shapes need the whole result."""
+    if fmt == ARROW:
+        yield from iter_arrow(chunks, field_types)
+    elif fmt == NDJSON:
+        for chunk in chunks:
+            yield "".join(json.dumps(record) + "\n" for record in chunk).encode()
+    else:
+        yield encode_records([record for chunk in chunks for record in chunk], fmt, field_types)
+
+
+def iter_compressed(parts, encoding):
+    if encoding is None:
+        yield from parts
+        return
+    stream = compressor(encoding)
+    for part in parts:
+        compressed = stream.compress(part)
+        if compressed:
+            yield compressed
+    yield stream.flush()
@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+
+class TelemetryRingBuffer:
+    """Fixed-capacity buffer storing each field in its own NumPy column.
+
+    Every record is stamped with a monotonically increasing sequence number so
+    that any number of consumers can read independently with ``read_since``.
+    When the buffer is full the oldest records are overwritten.
+    """
+
+    def __init__(self, fields, capacity=86400, head_seq=0):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.fields = list(fields)
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in fields.items()}
+        self._base_seq = head_seq  # Aucun enregistrement n'est conservé avant ce numéro
+        self._head_seq = head_seq  # Numéro de séquence du dernier enregistrement écrit
+        self._lock = threading.Lock()
+
+    @property
+    def head_seq(self):
+        return self._head_seq
+
+    @property
+    def oldest_seq(self):
+        return max(self._base_seq + 1, self._head_seq - self.capacity + 1)
+
+    @property
+    def nbytes(self):
+        """Memory held by the columns (object columns count their pointers only)."""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def __len__(self):
+        return self._head_seq - self.oldest_seq + 1
+
+    def append(self, record):
+        """Stores one record (dict) and returns its sequence number."""
+        with self._lock:
+            seq = self._head_seq + 1
+            slot = (seq - 1) % self.capacity
+            for name, column in self._columns.items():
+                column[slot] = record[name]
+            self._head_seq = seq
+            return seq
+
+    def extend(self, records):
+        """Stores a list of records and returns (first_seq, last_seq)."""
+        with self._lock:
+            first_seq = self._head_seq + 1
+            # Seuls les derniers 'capacity' enregistrements peuvent survivre
+            skipped = max(0, len(records) - self.capacity)
+            kept = records[skipped:]
+            if kept:
+                slots = (np.arange(first_seq + skipped, first_seq + len(records)) - 1) % self.capacity
+                for name, column in self._columns.items():
+                    column[slots] = [record[name] for record in kept]
+            self._head_seq += len(records)
+            return first_seq, self._head_seq
+
+    def read_since(self, since=0, limit=None):
+        """Returns the records with a sequence number greater than ``since``.
+
+        A cursor ahead of the head (e.g. after a server restart) is treated as
+        a fresh consumer and reads from the oldest retained record.
+        """
+        with self._lock:
+            head = self._head_seq
+            if since > head:
+                since = 0
+            start = max(since + 1, self.oldest_seq)
+            end = head if limit is None else min(head, start + limit - 1)
+            if end < start:
+                return []
+            seqs = np.arange(start, end + 1)
+            slots = (seqs - 1) % self.capacity
+            columns = {name: column[slots].tolist() for name, column in self._columns.items()}
+        columns['seq'] = seqs.tolist()
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
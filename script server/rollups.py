@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+
+# Résolution -> (longueur du préfixe de 'datetime' servant de clé, nombre de périodes conservées)
+RESOLUTIONS = {
+    "minute": (16, 24 * 60),      # "YYYY-MM-DD HH:MM", 1 jour
+    "hour": (13, 31 * 24),        # "YYYY-MM-DD HH", 31 jours
+    "day": (10, None),            # "YYYY-MM-DD"
+    "month": (7, None),           # "YYYY-MM"
+    "total": (0, None),           # toute la durée de vie
+}
+
+TOTAL_BUCKET = "all"
+# Durée d'une période pour les résolutions à conservation limitée
+PERIODS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+
+# Lignes du tableau de statistiques de chaque période
+COUNT, SUM, MIN, MAX = range(4)
+
+
+class RollupAggregator:
+    """Per-minute/hour/day/month/lifetime aggregates updated at ingest time.
+
+    Each bucket holds a (4, n_fields) array of count/sum/min/max, so a sample
+    updates every field of a bucket with a handful of vectorized operations
+    and any KPI is read back with a single dictionary lookup.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._index = {name: i for i, name in enumerate(self.fields)}
+        self._buckets = {resolution: OrderedDict() for resolution in RESOLUTIONS}
+
+    def _bucket(self, resolution, key):
+        buckets = self._buckets[resolution]
+        stats = buckets.get(key)
+        if stats is None:
+            n = len(self.fields)
+            stats = np.array([np.zeros(n), np.zeros(n), np.full(n, np.inf), np.full(n, -np.inf)])
+            buckets[key] = stats
+            retention = RESOLUTIONS[resolution][1]
+            if retention is not None and len(buckets) > retention:
+                buckets.popitem(last=False)
+        return stats
+
+    def update(self, record):
+        values = np.array([record[name] for name in self.fields], dtype=np.float64)
+        timestamp = record["datetime"]
+        for resolution, (prefix_length, _) in RESOLUTIONS.items():
+            key = timestamp[:prefix_length] if prefix_length else TOTAL_BUCKET
+            stats = self._bucket(resolution, key)
+            stats[COUNT] += 1
+            stats[SUM] += values
+            np.minimum(stats[MIN], values, out=stats[MIN])
+            np.maximum(stats[MAX], values, out=stats[MAX])
+
+    def update_many(self, records):
+        for record in records:
+            self.update(record)
+
+    def load(self, rows, resolutions):
+        """Adds precomputed (key, count, sums, mins, maxs) buckets, in key order, to each resolution.
+
+        Rows keyed at a finer resolution are merged into coarser ones, e.g.
+        daily rows fill "day", "month" and "total".
+        """
+        for key, count, sums, mins, maxs in rows:
+            # Champ entièrement vide dans une période : SQLite renvoie NULL
+            sums = np.nan_to_num(np.array(sums, dtype=np.float64), nan=0.0)
+            mins = np.nan_to_num(np.array(mins, dtype=np.float64), nan=np.inf)
+            maxs = np.nan_to_num(np.array(maxs, dtype=np.float64), nan=-np.inf)
+            for resolution in resolutions:
+                prefix_length = RESOLUTIONS[resolution][0]
+                stats = self._bucket(resolution, key[:prefix_length] if prefix_length else TOTAL_BUCKET)
+                stats[COUNT] += count
+                stats[SUM] += sums
+                np.minimum(stats[MIN], mins, out=stats[MIN])
+                np.maximum(stats[MAX], maxs, out=stats[MAX])
+
+    def rebuild(self, history, update_cache=True):
+        """Fills the aggregates from a HistoryStore with SQL GROUP BY queries.
+
+        Days (and from them months and the lifetime total) cover the whole
+        history; minutes and hours only their retention window before the
+        last sample. Finished periods come from the store's cache, so a
+        restart only groups the samples of the last period of each resolution.
+        Every query reads the same snapshot; returns the last sequence number
+        it covers, the following records are left to ``update``.
+        """
+        with history.snapshot(update_cache) as until_seq:
+            self.load(history.cached_aggregates(RESOLUTIONS["day"][0], self.fields), ("day", "month", "total"))
+            last = history.last_datetime(until_seq)
+            if last is None:
+                return until_seq
+            for resolution, period in PERIODS.items():
+                prefix_length, retention = RESOLUTIONS[resolution]
+                start = datetime.strptime(last[:19], "%Y-%m-%d %H:%M:%S") - period * retention
+                self.load(history.cached_aggregates(prefix_length, self.fields, start.strftime("%Y-%m-%d %H:%M:%S")),
+                          (resolution,))
+        return until_seq
+
+    def _format(self, key, stats, fields):
+        count = int(stats[COUNT][0])
+        result = {"bucket": key, "count": count}
+        for name in fields:
+            i = self._index[name]
+            result[name] = {
+                "sum": float(stats[SUM][i]),
+                "mean": float(stats[SUM][i] / count),
+                "min": float(stats[MIN][i]),
+                "max": float(stats[MAX][i]),
+            }
+        return result
+
+    def get(self, resolution, key, fields=None):
+        """Returns one bucket (e.g. resolution="day", key="2024-09-17"), or None."""
+        stats = self._buckets[resolution].get(key)
+        if stats is None:
+            return None
+        return self._format(key, stats, fields or self.fields)
+
+    def query(self, resolution, start=None, end=None, fields=None):
+        """Returns the buckets whose key lies in [start, end], in chronological order.
+
+        Bounds are compared on the bucket key prefix, so "2024-09" as the end
+        of a daily query includes every day of September.
+        """
+        prefix_length = RESOLUTIONS[resolution][0]
+        results = []
+        for key in sorted(self._buckets[resolution]):
+            if prefix_length and start is not None and key < start[:prefix_length]:
+                continue
+            if prefix_length and end is not None and key[:len(end)] > end:
+                continue
+            results.append(self._format(key, self._buckets[resolution][key], fields or self.fields))
+        return results
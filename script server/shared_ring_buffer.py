@@ -0,0 +1,182 @@
+import fcntl
+import glob
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+import numpy as np
+
+# En-tête du segment partagé (entiers 64 bits)
+HEADER_SLOTS = 8
+MAGIC_SLOT, LAYOUT_SLOT, OWNER_SLOT, BASE_SLOT, HEAD_SLOT = range(5)
+MAGIC = 0x54454C454D455452
+STRING_WIDTH = 64  # Octets réservés par champ texte (ASCII)
+
+# Répertoire en mémoire (tmpfs) quand il existe : le segment n'est jamais écrit sur disque
+SHARED_MEMORY_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def remove_segments(directory, prefix):
+    """Deletes the ring buffer segments (and their lock files) named ``{prefix}_*.ring``.
+
+    Only call this once no process maps them any more: /dev/shm is memory,
+    a segment left behind keeps its RAM until the machine reboots.
+    """
+    for path in glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(prefix)}_*.ring")):
+        for name in (path, path + ".lock"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+
+class SharedTelemetryRingBuffer:
+    """Cross-process version of ``TelemetryRingBuffer`` backed by a memory-mapped file.
+
+    All uvicorn workers map the same file (in /dev/shm where available):
+    a header (head sequence number, ...), one fixed-width NumPy column per
+    field and a per-slot sequence array. Writers serialize on an ``flock`` only for the few
+    microseconds needed to reserve sequence numbers and copy their rows.
+    Readers take no lock at all: each slot works like a seqlock, its
+    sequence number being invalidated before the row is overwritten and
+    published afterwards, so a reader keeps only the rows whose slot
+    sequence matched before and after the copy.
+
+    The segment is tagged with the parent process id (the uvicorn
+    supervisor); a segment left by a previous server run is discarded and
+    rebuilt from ``restore()``, which returns (head_seq, records).
+    """
+
+    def __init__(self, path, fields, capacity, restore=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.path = path
+        self.capacity = capacity
+        self.fields = list(fields)
+        self._dtypes = {field: np.dtype(f"S{STRING_WIDTH}") if dtype is object else np.dtype(dtype)
+                        for field, dtype in fields.items()}
+        self._strings = [field for field, dtype in self._dtypes.items() if dtype.kind == "S"]
+        layout = repr((capacity, [(field, dtype.str) for field, dtype in self._dtypes.items()]))
+        self._layout_id = int(hashlib.sha1(layout.encode()).hexdigest()[:15], 16)
+
+        # Décalages des colonnes dans le segment, alignés sur 8 octets
+        self._offsets = {}
+        offset = HEADER_SLOTS * 8 + capacity * 8  # en-tête puis numéros de séquence des cases
+        for field, dtype in self._dtypes.items():
+            self._offsets[field] = offset
+            offset += -(-capacity * dtype.itemsize // 8) * 8
+        self.nbytes = offset
+
+        self._lock_file = open(path + ".lock", "a+")
+        with self._locked():
+            fresh = self._open()
+            # Vrai pour le seul processus qui a initialisé le segment
+            self.created = fresh
+            if fresh:
+                head_seq, records = restore() if restore else (0, [])
+                self._header[BASE_SLOT] = head_seq
+                self._header[HEAD_SLOT] = head_seq
+                if records:
+                    self._write(records)
+                self._header[OWNER_SLOT] = os.getppid()
+                self._header[LAYOUT_SLOT] = self._layout_id
+                self._header[MAGIC_SLOT] = MAGIC
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _map(self, file):
+        self._mmap = mmap.mmap(file.fileno(), self.nbytes)
+        self._header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self._mmap)
+        self._slot_seq = np.ndarray((self.capacity,), dtype=np.int64, buffer=self._mmap, offset=HEADER_SLOTS * 8)
+        self._columns = {field: np.ndarray((self.capacity,), dtype=dtype, buffer=self._mmap, offset=self._offsets[field])
+                         for field, dtype in self._dtypes.items()}
+
+    def _open(self):
+        """Maps the segment, resetting it if it is stale; returns True if it must be initialized."""
+        with open(self.path, "a+b") as file:
+            valid = False
+            if os.fstat(file.fileno()).st_size == self.nbytes:
+                self._map(file)
+                valid = (self._header[MAGIC_SLOT] == MAGIC and self._header[LAYOUT_SLOT] == self._layout_id
+                         and self._header[OWNER_SLOT] == os.getppid())
+            if not valid:
+                # Segment neuf, d'une exécution précédente ou d'une autre configuration
+                file.truncate(0)
+                file.truncate(self.nbytes)
+                self._map(file)
+                self._slot_seq[:] = -1
+            return not valid
+
+    @property
+    def head_seq(self):
+        return int(self._header[HEAD_SLOT])
+
+    def _oldest_seq(self, head):
+        return max(int(self._header[BASE_SLOT]) + 1, head - self.capacity + 1)
+
+    @property
+    def oldest_seq(self):
+        return self._oldest_seq(self.head_seq)
+
+    def __len__(self):
+        head = self.head_seq
+        return head - self._oldest_seq(head) + 1
+
+    def _write(self, records):
+        head = int(self._header[HEAD_SLOT])
+        first_seq = head + 1
+        skipped = max(0, len(records) - self.capacity)
+        kept = records[skipped:]
+        if kept:
+            seqs = np.arange(first_seq + skipped, first_seq + len(records))
+            slots = (seqs - 1) % self.capacity
+            # Invalider les cases avant de les réécrire (lecteurs sans verrou)
+            self._slot_seq[slots] = -1
+            for field, column in self._columns.items():
+                if field in self._strings:
+                    column[slots] = ["" if record[field] is None else record[field] for record in kept]
+                else:
+                    column[slots] = [record[field] for record in kept]
+            self._slot_seq[slots] = seqs
+        self._header[HEAD_SLOT] = head + len(records)
+        return first_seq, head + len(records)
+
+    def append(self, record):
+        return self.extend([record])[0]
+
+    def extend(self, records):
+        """Stores records for every process sharing the segment; returns (first_seq, last_seq)."""
+        with self._locked():
+            return self._write(records)
+
+    def read_since(self, since=0, limit=None):
+        """Lock-free read of the records newer than ``since`` (same contract as TelemetryRingBuffer)."""
+        head = self.head_seq
+        if since > head:
+            since = 0
+        start = max(since + 1, self._oldest_seq(head))
+        end = head if limit is None else min(head, start + limit - 1)
+        if end < start:
+            return []
+        seqs = np.arange(start, end + 1)
+        slots = (seqs - 1) % self.capacity
+        before = self._slot_seq[slots]
+        columns = {field: column[slots] for field, column in self._columns.items()}
+        after = self._slot_seq[slots]
+        valid = (before == seqs) & (after == seqs)
+        if not valid.all():
+            # Les plus anciennes cases ont été réécrites pendant la lecture
+            keep = np.flatnonzero(~valid).max() + 1
+            seqs = seqs[keep:]
+            columns = {field: values[keep:] for field, values in columns.items()}
+        result = {field: np.char.decode(values, "ascii").tolist() if field in self._strings else values.tolist()
+                  for field, values in columns.items()}
+        result["seq"] = seqs.tolist()
+        names = list(result)
+        return [dict(zip(names, values)) for values in zip(*result.values())]
@@ -0,0 +1,70 @@
+KEY_FIELDS = ('vehicle_id', 'datetime')  # Toujours transmis : identifient l'échantillon
+
+
+class DeadbandFilter:
+    """Decides which samples, and which of their fields, are worth sending.
+
+    A numeric field counts as changed once it moved more than its deadband
+    away from the last value sent for it (other fields: any change). Samples
+    are offered at the fastest reporting rate; one goes out, with only its
+    changed fields plus ``KEY_FIELDS``, when something changed and the
+    current reporting interval has elapsed. That interval halves after each
+    sample sent because of a change, down to ``min_interval``, and doubles
+    back up to ``max_interval`` once readings settle, so fast changes are
+    reported quickly and quiet periods cost almost nothing. A full sample
+    is sent first and then every ``heartbeat`` seconds, which lets the
+    server rebuild complete records and detect a silent vehicle.
+    """
+
+    def __init__(self, deadbands, heartbeat=60.0, min_interval=0.25, max_interval=1.0):
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = max_interval
+        self.sent_values = {}
+        self.last_sent = None
+        self.last_full = None
+        self.offered = 0
+        self.sent = 0
+        self.full = 0
+        self.fields_sent = 0
+
+    def _changed(self, field, value):
+        if field not in self.sent_values:
+            return True
+        deadband = self.deadbands.get(field)
+        if deadband is None or isinstance(value, str):
+            return value != self.sent_values[field]
+        return abs(value - self.sent_values[field]) > deadband
+
+    def offer(self, record, now):
+        """Returns the record or partial record to send for this sample, or None; ``now`` is in seconds."""
+        self.offered += 1
+        if self.last_full is None or now - self.last_full >= self.heartbeat:
+            self.last_full = self.last_sent = now
+            self.interval = self.max_interval
+            self.sent_values = dict(record)
+            self.full += 1
+            return self._count(dict(record))
+        if now - self.last_sent < self.interval:
+            return None
+        changed = {field: value for field, value in record.items()
+                   if field not in KEY_FIELDS and self._changed(field, value)}
+        if not changed:
+            # Rien ne bouge : revenir progressivement au rythme normal
+            self.interval = min(self.max_interval, self.interval * 2)
+            return None
+        self.interval = max(self.min_interval, self.interval / 2)
+        self.last_sent = now
+        self.sent_values.update(changed)
+        return self._count({**{field: record[field] for field in KEY_FIELDS}, **changed})
+
+    def _count(self, record):
+        self.sent += 1
+        self.fields_sent += len(record)
+        return record
+
+    def stats(self):
+        return {"offered": self.offered, "sent": self.sent, "full": self.full,
+                "fields_per_sample": self.fields_sent / self.sent if self.sent else 0.0}
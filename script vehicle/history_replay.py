@@ -0,0 +1,235 @@
+# Rejeu accéléré d'un historique enregistré vers api_server (/send_batch/)
+#
+#   python history_replay.py position_data.csv --speed 1000
+#   python history_replay.py telemetry_history/ugv-1.db --speed max --timestamps shift --repeat 30
+#   python history_replay.py history.parquet --vehicle-id ugv-7 --speed 10 --timestamps compressed
+#   python history_replay.py --source-server http://192.168.174.45:8000 --source-vehicle ugv-1 --speed 100
+#
+# Les échantillons sont envoyés à l'instant (date d'origine - première date) / vitesse après le
+# début du rejeu ; ceux qui sont dus au même moment partent dans le même lot. Si le serveur ne
+# suit pas, les lots grossissent jusqu'à --batch-size et le retard est affiché.
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import requests
+from fleet_simulator import COLUMNS, post_batch
+
+# Dépendance facultative : lecture des fichiers Parquet par blocs
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+DEFAULT_SERVER_URL = os.environ.get("UGV_SERVER_URL", "http://127.0.0.1:8000")
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+# Champs attendus par le modèle SensorData du serveur ('roll' est facultatif)
+SAMPLE_COLUMNS = [name for name in COLUMNS if name not in ('vehicle_id', 'roll')]
+HISTORY_TABLES = ('samples', 'telemetry')  # Historique du serveur, base locale du tableau de bord
+TIMESTAMP_MODES = ('original', 'shift', 'compressed')
+
+
+def read_chunks(path, chunk_size=10000):
+    """Yields DataFrames of at most ``chunk_size`` rows from a CSV, Parquet or SQLite history file."""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise SystemExit("Parquet input requires pyarrow")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif path.endswith('.db'):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            table = next((name for name in HISTORY_TABLES if name in tables), None)
+            if table is None:
+                raise SystemExit(f"{path}: no {' or '.join(HISTORY_TABLES)} table")
+            cursor = conn.execute(f"SELECT * FROM {table} ORDER BY datetime")
+            names = [description[0] for description in cursor.description]
+            while rows := cursor.fetchmany(chunk_size):
+                yield pd.DataFrame(rows, columns=names)
+        finally:
+            conn.close()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def fetch_chunks(server_url, vehicle_id, chunk_size=10000):
+    """Yields DataFrames streamed from another server's /history endpoint (NDJSON)."""
+    params = {'vehicle_id': vehicle_id, 'format': 'ndjson', 'chunk_size': chunk_size}
+    with requests.get(f"{server_url}/history", params=params, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        rows = []
+        for line in response.iter_lines():
+            if line:
+                rows.append(json.loads(line))
+            if len(rows) >= chunk_size:
+                yield pd.DataFrame(rows)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows)
+
+
+def parse_datetimes(values):
+    try:
+        return pd.to_datetime(values, format=DATETIME_FORMAT)
+    except ValueError:
+        # Anciens fichiers : dates sans microsecondes ou dans un autre format
+        return pd.to_datetime(values, format="mixed")
+
+
+class HistoryReplay:
+    """Posts recorded samples to a server at ``speed`` times their original pace (inf = no waiting).
+
+    Timestamps are kept (``original``), moved so the first sample is dated
+    from the start of the replay with the original spacing (``shift``), or
+    dated when they are due, i.e. compressed by ``speed`` like a vehicle
+    running faster (``compressed``). ``repeat`` replays the source several
+    times back to back, each pass dated after the previous one, to build up
+    weeks or months of history from a short recording.
+    """
+
+    def __init__(self, server_url, speed=float('inf'), timestamps='original', vehicle_id=None,
+                 batch_size=1000, report_interval=5.0):
+        if timestamps not in TIMESTAMP_MODES:
+            raise ValueError(f"Unknown timestamp mode {timestamps!r}, expected one of {TIMESTAMP_MODES}")
+        if timestamps == 'compressed' and speed == float('inf'):
+            raise ValueError("Compressed timestamps need a finite speed")
+        self.server_url = server_url
+        self.speed = speed
+        self.timestamps = timestamps
+        self.vehicle_id = vehicle_id
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self.session = requests.Session()
+        self.sent = 0
+        self.lag = 0.0
+        self._origin = None      # Première date d'origine (datetime64)
+        self._offset = np.timedelta64(0, 'us')  # Décalage du passage en cours (option repeat)
+        self._last = None        # Dernière date d'origine lue, décalage compris
+        self._sent_until = None  # Date d'origine du dernier échantillon envoyé
+        self._step = np.timedelta64(0, 'us')
+        self._start_wall = None
+        self._start_monotonic = None
+        self._next_report = None
+
+    def _prepare(self, frame):
+        missing = [name for name in SAMPLE_COLUMNS if name not in frame]
+        if missing:
+            raise SystemExit(f"Source is missing columns {missing}")
+        times = parse_datetimes(frame['datetime']).to_numpy(dtype='datetime64[us]') + self._offset
+        if self._origin is None:
+            self._origin = times[0]
+            self._start_wall = np.datetime64(datetime.now(), 'us')
+            self._start_monotonic = time.monotonic()
+            self._next_report = self._start_monotonic + self.report_interval
+        if len(times) > 1:
+            self._step = np.median(np.diff(times))
+        self._last = times[-1]
+
+        elapsed = (times - self._origin).astype(np.float64) / 1e6
+        due = self._start_monotonic + (elapsed / self.speed if self.speed != float('inf') else np.zeros_like(elapsed))
+        records = frame[[name for name in SAMPLE_COLUMNS + ['roll'] if name in frame]].copy()
+        if self.timestamps != 'original':
+            if self.timestamps == 'compressed':
+                new_times = self._start_wall + (elapsed / self.speed * 1e6).astype('timedelta64[us]')
+            else:
+                new_times = times + (self._start_wall - self._origin)
+            new_times = pd.Series(new_times)
+            records['datetime'] = new_times.dt.strftime(DATETIME_FORMAT).to_numpy()
+            records['timestamp'] = new_times.dt.floor('h').dt.strftime(DATETIME_FORMAT).to_numpy()
+        records.insert(0, 'vehicle_id', self.vehicle_id or (frame['vehicle_id'] if 'vehicle_id' in frame else 'ugv-1'))
+        return records.reset_index(drop=True), times, due
+
+    def replay(self, chunks):
+        """Sends every sample of an iterable of DataFrames; returns the number of samples sent."""
+        for frame in chunks:
+            if frame.empty:
+                continue
+            records, times, due = self._prepare(frame)
+            i = 0
+            while i < len(records):
+                wait = due[i] - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                now = time.monotonic()
+                # Tout ce qui est dû maintenant part d'un coup, dans la limite d'un lot
+                end = max(i + 1, min(len(records), i + self.batch_size, int(np.searchsorted(due, now, 'right'))))
+                post_batch(self.session, self.server_url, records.iloc[i:end].to_json(orient='records'))
+                self.sent += end - i
+                self._sent_until = times[end - 1]
+                self.lag = max(0.0, time.monotonic() - due[end - 1])
+                i = end
+                if self.report_interval and time.monotonic() >= self._next_report:
+                    self._next_report += self.report_interval
+                    self.report()
+        return self.sent
+
+    def next_pass(self):
+        """Dates the next pass over the source right after the samples replayed so far."""
+        if self._last is not None:
+            self._offset = self._last + self._step - self._origin
+
+    def replayed_span(self):
+        if self._sent_until is None:
+            return timedelta(0)
+        return timedelta(microseconds=int((self._sent_until - self._origin).astype(np.int64)))
+
+    def report(self):
+        elapsed = time.monotonic() - self._start_monotonic
+        span = self.replayed_span().total_seconds()
+        lag = f", lag {self.lag:.2f} s" if self.speed != float('inf') else ""
+        print(f"{self.sent} samples, {span / 86400:.2f} days of data in {elapsed:.1f} s "
+              f"({self.sent / elapsed:.0f} samples/s, x{span / elapsed:.0f}){lag}")
+
+
+def parse_speed(value):
+    if value in ('max', 'inf', '0'):
+        return float('inf')
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive, or 'max'")
+    return speed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded telemetry to the server at a chosen speed")
+    parser.add_argument("input", nargs="?", help="position_data.csv, a CSV/Parquet log or a history .db file")
+    parser.add_argument("--source-server", help="read the history from this server's /history instead of a file")
+    parser.add_argument("--source-vehicle", default="ugv-1", help="vehicle to read with --source-server")
+    parser.add_argument("--server", default=DEFAULT_SERVER_URL, help="server receiving the samples")
+    parser.add_argument("--speed", type=parse_speed, default=float('inf'),
+                        help="speed-up over the original pace (10, 1000...) or 'max' for no waiting (default)")
+    parser.add_argument("--timestamps", choices=TIMESTAMP_MODES, default='original',
+                        help="keep the original dates, shift them to start now, or compress them by --speed")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the source N times back to back")
+    parser.add_argument("--vehicle-id", help="send every sample as this vehicle (default: the source's)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="maximum samples per POST")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="seconds between progress lines (0 = none)")
+    args = parser.parse_args()
+    if bool(args.input) == bool(args.source_server):
+        parser.error("give either an input file or --source-server")
+    if args.repeat > 1 and args.timestamps == 'original':
+        parser.error("--repeat needs --timestamps shift or compressed, otherwise the passes overlap")
+
+    try:
+        replay = HistoryReplay(args.server, args.speed, args.timestamps, args.vehicle_id, args.batch_size,
+                               args.report_interval)
+    except ValueError as e:
+        parser.error(str(e))
+    for _ in range(args.repeat):
+        chunks = (read_chunks(args.input) if args.input
+                  else fetch_chunks(args.source_server, args.source_vehicle))
+        replay.replay(chunks)
+        replay.next_pass()
+    if replay.sent:
+        replay.report()
+    else:
+        print("No samples to replay")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import numpy as np
+from scipy.signal import lfilter
+
+GRAVITY = 9.81  # m/s²
+# Champ magnétique terrestre dans le repère monde (x = nord, z = vertical), unités arbitraires
+EARTH_FIELD = np.array([0.3, 0.0, 0.4])
+
+
+def rotation_matrices(roll, pitch, yaw):
+    """Body-to-world rotation matrices R = Rz(yaw) Ry(pitch) Rx(roll), shape (n, 3, 3); angles in radians."""
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    return np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], axis=-1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], axis=-1),
+        np.stack([-sp, cp * sr, cp * cr], axis=-1),
+    ], axis=-2)
+
+
+def measured_angles(accel, mag):
+    """Roll, pitch (accelerometer) and tilt-compensated yaw (magnetometer) in radians for (n, 3) samples.
+
+    Same formulas as ``calculate_orientation`` in ugv_data_sender.py, on whole blocks.
+    """
+    ax, ay, az = accel.T
+    mx, my, mz = mag.T
+    roll = np.arctan2(ay, az)
+    pitch = np.arctan2(-ax, np.hypot(ay, az))
+    mag_x = mx * np.cos(pitch) + mz * np.sin(pitch)
+    mag_y = mx * np.sin(roll) * np.sin(pitch) + my * np.cos(roll) - mz * np.sin(roll) * np.cos(pitch)
+    return roll, pitch, np.arctan2(-mag_y, mag_x)
+
+
+def exponential_filter(inputs, coefficient, previous):
+    """y[k] = coefficient * y[k-1] + inputs[k] along axis 0, starting from ``previous`` (vectorized)."""
+    outputs, _ = lfilter([1.0], [1.0, -coefficient], inputs, axis=0, zi=(coefficient * previous)[None, :])
+    return outputs
+
+
+class ImuSimulator:
+    """Simulated IMU read in blocks, as from the sensor's hardware FIFO.
+
+    A slowly manoeuvring vehicle (low-pass random roll/pitch from the
+    terrain, yaw rate and forward acceleration) is integrated at
+    ``rate_hz``; accelerometer, gyroscope and magnetometer readings are
+    derived from it and noised. The true attitude and speed are kept for
+    checking the fusion.
+    """
+
+    def __init__(self, rate_hz=100.0, accel_std=0.05, gyro_std=0.01, mag_std=0.01, seed=None):
+        self.dt = 1.0 / rate_hz
+        self.accel_std, self.gyro_std, self.mag_std = accel_std, gyro_std, mag_std
+        self.rng = np.random.default_rng(seed)
+        self.angles = np.zeros(3)  # roll, pitch, yaw (rad)
+        self.yaw_rate = np.zeros(1)
+        self.forward_accel = np.zeros(1)
+        self.speed = 0.0
+        self.velocity = np.zeros(3)
+
+    def _low_pass_noise(self, count, previous, time_constant, std):
+        """First-order random process of standard deviation ``std`` (per column) and given time constant."""
+        coefficient = np.exp(-self.dt / time_constant)
+        noise = self.rng.normal(0, np.asarray(std) * np.sqrt(1 - coefficient ** 2), (count, len(previous)))
+        return exponential_filter(noise, coefficient, previous)
+
+    def read(self, count):
+        """Returns (accel, gyro, mag) arrays of shape (count, 3) and advances the true state."""
+        dt = self.dt
+        # Roulis/tangage : inclinaison du terrain (~2°) ; lacet : vitesse de lacet intégrée
+        tilt = self._low_pass_noise(count, self.angles[:2], 1.0, [0.03, 0.03])
+        yaw_rate = self._low_pass_noise(count, self.yaw_rate, 5.0, [0.1])[:, 0]
+        yaw = self.angles[2] + np.cumsum(yaw_rate) * dt
+        roll_rate, pitch_rate = (np.diff(np.vstack([self.angles[:2], tilt]), axis=0) / dt).T
+        roll, pitch = tilt.T
+        self.angles = np.array([roll[-1], pitch[-1], yaw[-1]])
+        self.yaw_rate = yaw_rate[-1:]
+
+        # Accélération longitudinale, vitesse bornée entre 0 et 3 m/s
+        forward = self._low_pass_noise(count, self.forward_accel, 2.0, [0.2])[:, 0]
+        speed = np.clip(self.speed + np.cumsum(forward) * dt, 0.0, 3.0)
+        forward = np.diff(np.concatenate([[self.speed], speed])) / dt
+        self.forward_accel, self.speed = forward[-1:], speed[-1]
+
+        # Accélération monde = dérivée du vecteur vitesse (longitudinale + centripète)
+        velocity = np.stack([speed * np.cos(yaw), speed * np.sin(yaw), np.zeros(count)], axis=-1)
+        world_accel = np.diff(np.vstack([self.velocity, velocity]), axis=0) / dt
+        self.velocity = velocity[-1]
+        world_accel[:, 2] += GRAVITY  # L'accéléromètre mesure la force spécifique
+        rotations = rotation_matrices(roll, pitch, yaw)
+        accel = np.einsum('nji,nj->ni', rotations, world_accel)
+        mag = np.einsum('nji,j->ni', rotations, EARTH_FIELD)
+        # Vitesses d'Euler -> vitesses angulaires dans le repère du véhicule
+        gyro = np.stack([
+            roll_rate - yaw_rate * np.sin(pitch),
+            pitch_rate * np.cos(roll) + yaw_rate * np.sin(roll) * np.cos(pitch),
+            -pitch_rate * np.sin(roll) + yaw_rate * np.cos(roll) * np.cos(pitch),
+        ], axis=-1)
+        accel = accel + self.rng.normal(0, self.accel_std, accel.shape)
+        gyro = gyro + self.rng.normal(0, self.gyro_std, gyro.shape)
+        mag = mag + self.rng.normal(0, self.mag_std, mag.shape)
+        return accel, gyro, mag
+
+
+class ImuFusion:
+    """Complementary filter for roll/pitch/yaw and velocity, applied one block at a time.
+
+    For each angle, angle[k] = alpha * (angle[k-1] + rate[k] * dt) + (1 - alpha) * measured[k],
+    where rate comes from the gyroscope (converted to Euler rates) and
+    measured from the accelerometer (roll, pitch) or the tilt-compensated
+    magnetometer (yaw). This first-order recurrence runs over the whole
+    block in one ``lfilter`` call. Velocity integrates the world-frame
+    acceleration minus gravity with a slight leak (``velocity_leak``) so
+    that accelerometer bias cannot make it drift without bound.
+    """
+
+    def __init__(self, rate_hz=100.0, alpha=0.98, velocity_leak=0.999):
+        self.dt = 1.0 / rate_hz
+        self.alpha = alpha
+        self.velocity_leak = velocity_leak
+        self.angles = None  # roll, pitch, yaw (rad)
+        self.velocity = np.zeros(3)
+        self.samples = 0
+
+    def update(self, accel, gyro, mag):
+        """Fuses a block of samples of shape (n, 3); returns the state after the last sample."""
+        roll_m, pitch_m, yaw_m = measured_angles(accel, mag)
+        if self.angles is None:
+            self.angles = np.array([roll_m[0], pitch_m[0], yaw_m[0]])
+        roll, pitch, yaw = self.angles
+        # Vitesses d'Euler calculées avec l'attitude au début du bloc (le véhicule tourne lentement)
+        p, q, r = gyro.T
+        rates = np.stack([
+            p + (q * np.sin(roll) + r * np.cos(roll)) * np.tan(pitch),
+            q * np.cos(roll) - r * np.sin(roll),
+            (q * np.sin(roll) + r * np.cos(roll)) / np.cos(pitch),
+        ], axis=-1)
+        # Lacet mesuré déroulé autour de l'estimation courante pour éviter le saut à ±180°
+        yaw_m = np.unwrap(np.concatenate([[yaw], yaw_m]))[1:]
+        measured = np.stack([roll_m, pitch_m, yaw_m], axis=-1)
+        inputs = self.alpha * rates * self.dt + (1 - self.alpha) * measured
+        angles = exponential_filter(inputs, self.alpha, self.angles)
+        self.angles = angles[-1].copy()
+        self.angles[2] = np.angle(np.exp(1j * self.angles[2]))
+
+        # Accélération dans le repère monde, gravité retirée, intégrée avec fuite
+        rotations = rotation_matrices(*angles.T)
+        linear = np.einsum('nij,nj->ni', rotations, accel)
+        linear[:, 2] -= GRAVITY
+        self.velocity = exponential_filter(linear * self.dt, self.velocity_leak, self.velocity)[-1]
+        self.samples += len(accel)
+        return self.state()
+
+    def state(self):
+        roll, pitch, yaw = np.degrees(self.angles) if self.angles is not None else (0.0, 0.0, 0.0)
+        return {'roll': roll, 'pitch': pitch, 'yaw': yaw,
+                'velocity': self.velocity, 'speed': float(np.linalg.norm(self.velocity))}
@@ -0,0 +1,102 @@
+import heapq
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+
+
+class PeriodicTask:
+    """One sensor task and its timing statistics."""
+
+    def __init__(self, name, period, callback, history=1000):
+        self.name = name
+        self.period = period
+        self.callback = callback
+        self.runs = 0
+        self.overruns = 0  # Exécutions terminées après l'échéance suivante
+        self.skipped = 0   # Échéances abandonnées pour rattraper le retard
+        self.jitters = deque(maxlen=history)    # Retard du démarrage sur l'échéance (s)
+        self.durations = deque(maxlen=history)  # Durée d'exécution (s)
+
+    def stats(self):
+        jitters = np.array(self.jitters) * 1000
+        durations = np.array(self.durations) * 1000
+        return {
+            "task": self.name,
+            "rate_hz": 1 / self.period,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "jitter_mean_ms": float(jitters.mean()) if len(jitters) else 0.0,
+            "jitter_p99_ms": float(np.percentile(jitters, 99)) if len(jitters) else 0.0,
+            "jitter_max_ms": float(jitters.max()) if len(jitters) else 0.0,
+            "duration_mean_ms": float(durations.mean()) if len(durations) else 0.0,
+            "duration_max_ms": float(durations.max()) if len(durations) else 0.0,
+        }
+
+
+class SensorScheduler:
+    """Runs each sensor task at its own fixed rate on a single thread.
+
+    Deadlines are absolute (start + k × period on the monotonic clock), so
+    the time spent in a task never accumulates into drift. A task that ends
+    after its next deadline counts as an overrun; the deadlines it missed are
+    skipped rather than run in a burst. Callbacks receive the scheduled
+    time as a datetime, which makes sample timestamps exact multiples of the
+    period instead of "whenever the loop got there".
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self._start_monotonic = None
+        self._start_wall = None
+
+    def add(self, name, rate_hz, callback):
+        task = PeriodicTask(name, 1.0 / rate_hz, callback)
+        self.tasks.append(task)
+        return task
+
+    def scheduled_datetime(self, deadline):
+        return self._start_wall + timedelta(seconds=deadline - self._start_monotonic)
+
+    def run(self, duration=None):
+        """Runs the tasks until ``duration`` seconds have elapsed (forever if None)."""
+        self._start_monotonic = time.monotonic()
+        self._start_wall = datetime.now()
+        end = None if duration is None else self._start_monotonic + duration
+        # File de priorité des prochaines échéances : (échéance, ordre d'ajout, tâche)
+        queue = [(self._start_monotonic, i, task) for i, task in enumerate(self.tasks)]
+        heapq.heapify(queue)
+        while queue:
+            deadline, order, task = heapq.heappop(queue)
+            if end is not None and deadline >= end:
+                break
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.monotonic()
+            task.callback(self.scheduled_datetime(deadline))
+            finished = time.monotonic()
+            task.runs += 1
+            task.jitters.append(started - deadline)
+            task.durations.append(finished - started)
+            next_deadline = deadline + task.period
+            if finished > next_deadline:
+                task.overruns += 1
+                missed = math.floor((finished - next_deadline) / task.period) + 1
+                task.skipped += missed
+                next_deadline += missed * task.period
+            heapq.heappush(queue, (next_deadline, order, task))
+
+    def stats(self):
+        return [task.stats() for task in self.tasks]
+
+    def format_stats(self):
+        lines = [f"{'task':12s} {'Hz':>6s} {'runs':>8s} {'overruns':>8s} {'skipped':>8s} "
+                 f"{'jitter ms (mean/p99/max)':>26s} {'run ms (mean/max)':>18s}"]
+        for s in self.stats():
+            lines.append(f"{s['task']:12s} {s['rate_hz']:6.1f} {s['runs']:8d} {s['overruns']:8d} {s['skipped']:8d} "
+                         f"{s['jitter_mean_ms']:8.2f}/{s['jitter_p99_ms']:7.2f}/{s['jitter_max_ms']:8.2f} "
+                         f"{s['duration_mean_ms']:8.3f}/{s['duration_max_ms']:8.3f}")
+        return "\n".join(lines)
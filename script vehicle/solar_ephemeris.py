@@ -0,0 +1,59 @@
+import math
+import numpy as np
+import pandas as pd
+import pvlib
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class SolarEphemeris:
+    """Sun elevation/azimuth table for one day and one location.
+
+    The table is computed with a single vectorized pvlib call (one row every
+    ``step_seconds``) and interpolated linearly for each tick; the azimuth is
+    unwrapped before interpolation so it never jumps across north. It is
+    rebuilt when the date changes or when the vehicle has moved more than
+    ``max_distance_m`` from the location it was computed for.
+    """
+
+    def __init__(self, step_seconds=60, max_distance_m=1000.0):
+        self.step_seconds = step_seconds
+        self.max_distance_m = max_distance_m
+        self.day = None
+        self.latitude = None
+        self.longitude = None
+        self.rebuilds = 0
+
+    def _build(self, day, latitude, longitude):
+        start = pd.Timestamp(day)
+        times = pd.date_range(start, start + pd.Timedelta(days=1), freq=f"{self.step_seconds}s")
+        solar = pvlib.solarposition.get_solarposition(times, latitude, longitude)
+        self._seconds = (times - start).total_seconds().to_numpy()
+        self._elevation = solar['elevation'].to_numpy()
+        self._azimuth = np.degrees(np.unwrap(np.radians(solar['azimuth'].to_numpy())))
+        self.day, self.latitude, self.longitude = day, latitude, longitude
+        self.rebuilds += 1
+
+    def interpolate(self, day, seconds, latitude, longitude):
+        """Returns (elevation, azimuth) at ``seconds`` after midnight of ``day`` (scalars or arrays)."""
+        if (day != self.day
+                or distance_m(self.latitude, self.longitude, latitude, longitude) > self.max_distance_m):
+            self._build(day, latitude, longitude)
+        elevation = np.interp(seconds, self._seconds, self._elevation)
+        azimuth = np.interp(seconds, self._seconds, self._azimuth) % 360
+        return elevation, azimuth
+
+    def position(self, when, latitude, longitude):
+        """Returns (elevation, azimuth) in degrees at datetime ``when``."""
+        seconds = when.hour * 3600 + when.minute * 60 + when.second + when.microsecond / 1e6
+        elevation, azimuth = self.interpolate(when.date(), seconds, latitude, longitude)
+        return float(elevation), float(azimuth)
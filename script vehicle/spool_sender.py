@@ -0,0 +1,248 @@
+import json
+import os
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+CURSOR_FILE = "cursor.json"
+REJECTED_FILE = "rejected.ndjson"
+STATE_FILE = "state.json"
+
+
+class SegmentSpool:
+    """Disk-backed FIFO of samples that survives link losses and restarts.
+
+    Samples are appended as NDJSON lines to numbered segment files; a
+    cursor file records the committed read position (segment, byte offset).
+    A batch is read with ``peek`` and only removed by ``commit`` once the
+    server acknowledged it, so nothing is lost if the process stops in
+    between (a batch may be sent twice). Fully read segments are deleted.
+    """
+
+    def __init__(self, directory, segment_records=10000, fsync=False):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._read_segment, self._read_offset = 0, 0
+        cursor_path = os.path.join(directory, CURSOR_FILE)
+        if os.path.exists(cursor_path):
+            with open(cursor_path) as f:
+                cursor = json.load(f)
+            self._read_segment, self._read_offset = cursor["segment"], cursor["offset"]
+        segments = self._segments()
+        if not segments or segments[0] > self._read_segment:
+            self._read_offset = 0
+        self._read_segment = segments[0] if segments else max(self._read_segment, 1)
+
+        # Compter les échantillons restant à envoyer
+        self.pending = 0
+        for segment in segments:
+            with open(self._path(segment), "rb") as f:
+                if segment == self._read_segment:
+                    f.seek(self._read_offset)
+                self.pending += sum(1 for line in f if line.endswith(b"\n"))
+
+        self._write_segment = segments[-1] if segments else self._read_segment
+        with open(self._path(self._write_segment), "ab+") as f:
+            f.seek(0)
+            lines = f.readlines()
+            if lines and not lines[-1].endswith(b"\n"):
+                # Ligne tronquée par un arrêt brutal : la supprimer avant d'écrire à la suite
+                f.truncate(f.tell() - len(lines.pop()))
+            self._write_count = len(lines)
+        self._write_file = open(self._path(self._write_segment), "ab")
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        return sorted(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+
+    def append(self, records):
+        data = "".join(json.dumps(record, default=float) + "\n" for record in records).encode()
+        with self._lock:
+            if self._write_count >= self.segment_records:
+                # Nouveau segment : les anciens pourront être supprimés une fois envoyés
+                self._write_file.close()
+                self._write_segment += 1
+                self._write_file = open(self._path(self._write_segment), "ab")
+                self._write_count = 0
+            self._write_file.write(data)
+            self._write_file.flush()
+            if self.fsync:
+                os.fsync(self._write_file.fileno())
+            self._write_count += len(records)
+            self.pending += len(records)
+
+    def peek(self, max_records):
+        """Returns (records, position) for the oldest uncommitted records, without removing them."""
+        with self._lock:
+            while True:
+                records, offset = [], self._read_offset
+                with open(self._path(self._read_segment), "rb") as f:
+                    f.seek(offset)
+                    while len(records) < max_records:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break  # Fin du segment, ou ligne en cours d'écriture
+                        offset += len(line)
+                        records.append(json.loads(line))
+                if records or self._read_segment >= self._write_segment:
+                    return records, (self._read_segment, offset, len(records))
+                # Segment entièrement envoyé : passer au suivant
+                os.remove(self._path(self._read_segment))
+                self._read_segment, self._read_offset = self._read_segment + 1, 0
+                self._save_cursor()
+
+    def commit(self, position):
+        """Removes the records returned by ``peek`` once the server has acknowledged them."""
+        segment, offset, count = position
+        with self._lock:
+            self._read_segment, self._read_offset = segment, offset
+            self.pending -= count
+            self._save_cursor()
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": self._read_segment, "offset": self._read_offset}, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+
+class SpoolSender:
+    """Background thread draining a ``SegmentSpool`` to the server's /send_batch/ (or ``path``).
+
+    The sampling loop only calls ``submit``, which writes to the spool and
+    never touches the network. The thread posts up to ``max_batch`` samples
+    at a time over one keep-alive session as soon as ``batch_size`` samples
+    are waiting or every ``flush_interval`` seconds. Connection errors, 5xx
+    and 429 responses are retried with capped exponential backoff (429
+    honours Retry-After); batches the server rejects as invalid are moved to
+    rejected.ndjson so they cannot block the queue.
+
+    With ``full_path``, the spool holds partial samples (changed fields
+    only) posted to ``path``. The sender keeps, per vehicle, the merge of
+    every sample acknowledged so far (saved in state.json). When the server
+    answers 409 because it has no base state to complete them (after a
+    restart, or for a new vehicle), the batch is completed from that state
+    and sent again as full samples to ``full_path``.
+    """
+
+    def __init__(self, server_url, spool, batch_size=1, flush_interval=5.0, max_batch=1000,
+                 timeout=10.0, max_backoff=60.0, path="/send_batch/", full_path=None):
+        self.url = f"{server_url}{path}"
+        self.full_url = f"{server_url}{full_path}" if full_path else None
+        self.state = {}
+        self._state_path = os.path.join(spool.directory, STATE_FILE)
+        if self.full_url and os.path.exists(self._state_path):
+            with open(self._state_path) as f:
+                self.state = json.load(f)
+        self.spool = spool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_batch = max(max_batch, self.batch_size)
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.sent = 0
+        self.failures = 0
+        self.link_up = True
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+    def submit(self, record):
+        self.spool.append([record])
+        if self.spool.pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        backoff = 0.0
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            while not self._stopped.is_set():
+                records, position = self.spool.peek(self.max_batch)
+                if not records:
+                    break
+                delay = self._send_batch(records, position)
+                if delay is None:
+                    backoff = 0.0
+                    continue
+                # Lien coupé ou serveur saturé : attendre de plus en plus longtemps
+                backoff = min(self.max_backoff, max(1.0, backoff * 2))
+                self._stopped.wait(max(delay, backoff * random.uniform(0.5, 1.0)))
+
+    def _complete(self, records):
+        """Merges partial samples onto the last acknowledged state of their vehicle."""
+        state, full = {vehicle_id: dict(record) for vehicle_id, record in self.state.items()}, []
+        for record in records:
+            merged = state.setdefault(record.get("vehicle_id"), {})
+            merged.update(record)
+            full.append(dict(merged))
+        return full
+
+    def _acknowledged(self, records):
+        if not self.full_url:
+            return
+        for record in self._complete(records):
+            self.state[record.get("vehicle_id")] = record
+        with open(self._state_path + ".tmp", "w") as f:
+            json.dump(self.state, f, default=float)
+        os.replace(self._state_path + ".tmp", self._state_path)
+
+    def _send_batch(self, records, position):
+        """Posts one batch; returns None once it left the spool, or the minimum delay before retrying."""
+        try:
+            response = self.session.post(self.url, json=records, timeout=self.timeout)
+            if response.status_code == 409 and self.full_url:
+                # Le serveur n'a pas d'état de référence pour ce véhicule : envoyer les échantillons complets
+                response = self.session.post(self.full_url, json=self._complete(records), timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self._link_down(f"{type(e).__name__}")
+            return 0.0
+        if response.ok:
+            self._acknowledged(records)
+            self.spool.commit(position)
+            self.sent += len(records)
+            if not self.link_up:
+                print(f"Link restored, {self.spool.pending} samples still spooled")
+                self.link_up = True
+            return None
+        if response.status_code == 429 or response.status_code >= 500:
+            self._link_down(f"HTTP {response.status_code}")
+            retry_after = response.headers.get("Retry-After", "")
+            return float(retry_after) if retry_after.isdigit() else 0.0
+        # Lot refusé par le serveur (données invalides) : le mettre de côté
+        print(f"Batch rejected (HTTP {response.status_code}): {response.text[:200]}")
+        with open(os.path.join(self.spool.directory, REJECTED_FILE), "a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        self.spool.commit(position)
+        return None
+
+    def _link_down(self, reason):
+        self.failures += 1
+        if self.link_up:
+            print(f"Send failed ({reason}), spooling {self.spool.pending} samples")
+            self.link_up = False
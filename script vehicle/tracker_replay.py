@@ -0,0 +1,316 @@
+# Rejeu vectorisé du suivi solaire et comparaison de stratégies de pilotage
+#
+#   python tracker_replay.py --synthetic-days 365
+#   python tracker_replay.py --input history.parquet --vehicle-id ugv-3
+#   python tracker_replay.py --server http://127.0.0.1:8000 --vehicle-id ugv-1 --start 2024-06-01 --end 2024-06-30
+#
+# Chaque journée est traitée d'un bloc : position du soleil interpolée dans la table du jour,
+# angles commandés, angles compensés (tangage/lacet du véhicule), erreur de suivi et
+# puissance estimée, pour chaque stratégie. Les décisions reprennent actuator_angles et
+# process_angles de ugv_data_sender.py, appliquées à des tableaux NumPy.
+import argparse
+import io
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import requests
+from solar_ephemeris import SolarEphemeris
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+INPUT_COLUMNS = ['datetime', 'latitude', 'longitude', 'pitch', 'orientation_north', 'current_light_level']
+FLEET_LATITUDE = 31.6802337
+FLEET_LONGITUDE = -8.0440754
+
+CLEAR_SKY_LIGHT = 1000.0  # Luminosité mesurée en plein soleil, soleil au zénith (≈ W/m²)
+LIGHT_THRESHOLD = 200.0  # Seuil de luminosité du logiciel embarqué (actuator_angles)
+STOW_ELEVATION = 5.0  # Hauteur du soleil sous laquelle le panneau est rangé à plat (°)
+GROUND_COVERAGE_RATIO = 0.4  # Longueur des panneaux / espacement entre véhicules garés en rang
+MAX_TILT = 75.0  # Inclinaison maximale du panneau permise par les vérins (°)
+RATED_POWER_W = 100.0  # Puissance crête du panneau
+
+STRATEGIES = ['light_threshold', 'night_stow', 'backtracking', 'flat']
+
+
+def actuator_angles_array(sun_elevation, sun_azimuth, light_level, light_threshold=LIGHT_THRESHOLD):
+    """Vectorized ``actuator_angles``: (0, 0), i.e. flat, at night or in low light."""
+    tracking = (sun_elevation >= 0) & (light_level >= light_threshold)
+    return np.where(tracking, sun_elevation, 0.0), np.where(tracking, sun_azimuth, 0.0)
+
+
+def process_angles_array(elevation, azimuth, yaw, pitch):
+    """Vectorized ``process_angles``: commanded angles in the vehicle frame, (0, 0) when flat."""
+    compensated = (elevation != 0) & (azimuth != 0)
+    return np.where(compensated, elevation - pitch, 0.0), np.where(compensated, azimuth - yaw, 0.0)
+
+
+def backtracking_elevation(sun_elevation, gcr=GROUND_COVERAGE_RATIO):
+    """Panel normal elevation that avoids shading the next panel in a row, in degrees.
+
+    A panel tilted by β throws a shadow of length sin(α + β) / sin(α) panel
+    lengths towards the next one for a sun at elevation α; it stays clear
+    while that is at most 1 / gcr. When facing the sun (β = 90° - α) would
+    shade, the panel is laid flatter to β = arcsin(sin α / gcr) - α.
+    """
+    alpha = np.radians(np.clip(sun_elevation, 1e-3, 90.0))
+    ratio = np.sin(alpha) / gcr
+    tilt = np.where(ratio >= 1, np.pi / 2 - alpha, np.arcsin(np.minimum(ratio, 1.0)) - alpha)
+    return 90.0 - np.degrees(np.clip(tilt, 0.0, None))
+
+
+def direction_vectors(elevation, azimuth):
+    """Unit vectors (east, north, up) for elevation/azimuth arrays in degrees."""
+    elevation, azimuth = np.radians(elevation), np.radians(azimuth)
+    return np.stack([np.cos(elevation) * np.sin(azimuth), np.cos(elevation) * np.cos(azimuth), np.sin(elevation)])
+
+
+def diffuse_fraction(clearness):
+    """Erbs et al. diffuse fraction of global horizontal light as a function of the clearness index."""
+    return np.select([clearness <= 0.22, clearness <= 0.8],
+                     [1 - 0.09 * clearness,
+                      0.9511 - 0.1604 * clearness + 4.388 * clearness ** 2 - 16.638 * clearness ** 3
+                      + 12.336 * clearness ** 4],
+                     0.165)
+
+
+class TrackerReplay:
+    """Replays tracker decisions and estimated panel power for blocks of samples.
+
+    ``replay`` takes a DataFrame with ``INPUT_COLUMNS`` (datetime as text
+    or datetime64) and returns one row per sample for one strategy;
+    ``compare`` sums the daily energy of several strategies:
+
+    - light_threshold: the firmware, tracking the sun only above the
+      horizon and when the light sensor reads at least ``light_threshold``.
+    - night_stow: tracking whenever the sun is above ``stow_elevation``,
+      whatever the light.
+    - backtracking: night_stow, laying the panel flatter at low sun so
+      vehicles parked in a row do not shade each other.
+    - flat: panel never moves, as a reference.
+
+    The light sensor is taken as global horizontal irradiance; it is split
+    into direct and diffuse parts (Erbs) and projected on the panel, whose
+    tilt is limited to ``max_tilt`` in the vehicle frame.
+    """
+
+    def __init__(self, light_threshold=LIGHT_THRESHOLD, stow_elevation=STOW_ELEVATION, gcr=GROUND_COVERAGE_RATIO,
+                 max_tilt=MAX_TILT, rated_power=RATED_POWER_W, ephemeris=None):
+        self.light_threshold = light_threshold
+        self.stow_elevation = stow_elevation
+        self.gcr = gcr
+        self.max_tilt = max_tilt
+        self.rated_power = rated_power
+        self.ephemeris = ephemeris or SolarEphemeris()
+
+    def sun_position(self, times, latitude, longitude):
+        """Sun elevation/azimuth for datetime64 ``times``, one ephemeris table per day."""
+        days = times.astype('datetime64[D]')
+        seconds = (times - days).astype('timedelta64[us]').astype(np.float64) / 1e6
+        elevation, azimuth = np.empty(len(times)), np.empty(len(times))
+        # Une table par jour, à la position moyenne du jour (le véhicule reste dans un rayon de quelques km)
+        bounds = [0, *(np.flatnonzero(days[1:] != days[:-1]) + 1), len(times)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            day = days[start].astype(object)
+            elevation[start:end], azimuth[start:end] = self.ephemeris.interpolate(
+                day, seconds[start:end], float(np.mean(latitude[start:end])), float(np.mean(longitude[start:end])))
+        return elevation, azimuth
+
+    def commanded_angles(self, strategy, sun_elevation, sun_azimuth, light_level):
+        """Returns (panel_elevation, panel_azimuth) as reported by the vehicle: (0, 0) means flat."""
+        if strategy == 'light_threshold':
+            return actuator_angles_array(sun_elevation, sun_azimuth, light_level, self.light_threshold)
+        up = sun_elevation >= self.stow_elevation
+        if strategy == 'night_stow':
+            return np.where(up, sun_elevation, 0.0), np.where(up, sun_azimuth, 0.0)
+        if strategy == 'backtracking':
+            return np.where(up, backtracking_elevation(sun_elevation, self.gcr), 0.0), np.where(up, sun_azimuth, 0.0)
+        if strategy == 'flat':
+            return np.zeros_like(sun_elevation), np.zeros_like(sun_azimuth)
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+
+    def prepare(self, frame):
+        """Converts a block of samples to arrays and adds what every strategy shares.
+
+        That is the sun position and, for daylight samples only (night
+        power is zero), the sun direction and the split of the measured
+        light into direct normal and diffuse parts.
+        """
+        times = frame['datetime']
+        if not pd.api.types.is_datetime64_any_dtype(times):
+            times = pd.to_datetime(times, format=DATETIME_FORMAT)
+        block = {'datetime': times.to_numpy(dtype='datetime64[us]')}
+        for name in INPUT_COLUMNS[1:]:
+            block[name] = frame[name].to_numpy(dtype=float)
+        block['sun_elevation'], block['sun_azimuth'] = self.sun_position(
+            block['datetime'], block['latitude'], block['longitude'])
+
+        daylight = np.flatnonzero(block['sun_elevation'] > 0)
+        sun_elevation = block['sun_elevation'][daylight]
+        light = block['current_light_level'][daylight]
+        # Lumière globale horizontale -> directe (normale au soleil) + diffuse
+        sin_elevation = np.sin(np.radians(sun_elevation))
+        valid = sin_elevation > 0.05
+        clearness = np.clip(np.divide(light, CLEAR_SKY_LIGHT * sin_elevation, out=np.zeros_like(light), where=valid),
+                            0.0, 1.0)
+        diffuse = light * diffuse_fraction(clearness)
+        block['daylight'] = daylight
+        block['sun_vector'] = direction_vectors(sun_elevation, block['sun_azimuth'][daylight])
+        block['diffuse'] = diffuse
+        block['direct_normal'] = np.divide(light - diffuse, sin_elevation, out=np.zeros_like(light), where=valid)
+        return block
+
+    def evaluate(self, block, strategy):
+        """Per-sample arrays of one strategy for a block returned by ``prepare``."""
+        pitch, yaw = block['pitch'], block['orientation_north']
+        panel_elevation, panel_azimuth = self.commanded_angles(
+            strategy, block['sun_elevation'], block['sun_azimuth'], block['current_light_level'])
+        processed_elevation, processed_azimuth = process_angles_array(panel_elevation, panel_azimuth, yaw, pitch)
+
+        # Orientation réellement atteinte : à plat (normale au zénith) ou inclinaison limitée par les vérins
+        daylight = block['daylight']
+        flat = (panel_elevation[daylight] == 0) & (panel_azimuth[daylight] == 0)
+        normal_elevation = np.where(flat, 90.0, np.clip(processed_elevation[daylight], 90.0 - self.max_tilt, 90.0)
+                                    + pitch[daylight])
+        normal_azimuth = np.where(flat, 0.0, processed_azimuth[daylight] + yaw[daylight])
+        normal = direction_vectors(normal_elevation, normal_azimuth)
+        cos_incidence = np.einsum('ij,ij->j', normal, block['sun_vector'])
+        on_panel = block['direct_normal'] * np.maximum(cos_incidence, 0.0) + block['diffuse'] * (1 + normal[2]) / 2
+
+        tracking_error = np.full(len(panel_elevation), np.nan)
+        tracking_error[daylight] = np.degrees(np.arccos(np.clip(cos_incidence, -1.0, 1.0)))
+        power = np.zeros(len(panel_elevation))
+        power[daylight] = self.rated_power * on_panel / CLEAR_SKY_LIGHT
+        return {'panel_elevation': panel_elevation, 'panel_azimuth': panel_azimuth,
+                'processed_elevation': processed_elevation, 'processed_azimuth': processed_azimuth,
+                'tracking_error': tracking_error, 'power': power}
+
+    def replay(self, frame, strategy='light_threshold'):
+        """Returns the per-sample angles, tracking error (°) and power (W) of one strategy."""
+        block = self.prepare(frame)
+        return pd.DataFrame({'datetime': block['datetime'], 'sun_elevation': block['sun_elevation'],
+                             'sun_azimuth': block['sun_azimuth'], **self.evaluate(block, strategy)})
+
+    def compare(self, frames, strategies=STRATEGIES):
+        """Daily energy (Wh) of each strategy over an iterable of sample blocks, one row per day."""
+        rows = []
+        for frame in frames:
+            block = self.prepare(frame)
+            if not len(block['datetime']):
+                continue
+            seconds = block['datetime'].astype(np.float64) / 1e6
+            days = block['datetime'].astype('datetime64[D]')
+            # Énergie par la méthode des trapèzes sur les pas de temps réels (trous des journaux compris)
+            steps = np.diff(seconds, prepend=seconds[0]) / 3600
+            energy = {}
+            for strategy in strategies:
+                power = self.evaluate(block, strategy)['power']
+                energy[strategy] = steps * (power + np.concatenate([power[:1], power[:-1]])) / 2
+            daily = pd.DataFrame(energy).groupby(days).sum()
+            rows.extend({'day': day.date(), **values} for day, values in daily.iterrows())
+        table = pd.DataFrame(rows, columns=['day'] + list(strategies))
+        return table.groupby('day', as_index=False).sum()
+
+
+def synthetic_days(start, days, interval=1.0, latitude=FLEET_LATITUDE, longitude=FLEET_LONGITUDE, seed=0,
+                   ephemeris=None):
+    """Yields one DataFrame per day of a parked vehicle's log with a plausible light level.
+
+    Light is clear-sky horizontal light scaled by a cloud factor: a random
+    daily cloudiness plus slow passing clouds. Passing the replay engine's
+    ephemeris lets both use the same daily sun table.
+    """
+    ephemeris = ephemeris or SolarEphemeris()
+    window = max(1, int(600 / interval))  # Nuages de passage : moyenne glissante sur ~10 min
+    seconds = np.arange(0, 86400, interval)
+    steps = len(seconds)
+    for day_index in range(days):
+        day = start + timedelta(days=day_index)
+        rng = np.random.default_rng([seed, day_index])
+        elevation, _ = ephemeris.interpolate(day, seconds, latitude, longitude)
+        clear_sky = CLEAR_SKY_LIGHT * np.maximum(np.sin(np.radians(elevation)), 0.0) ** 1.15
+        cloudiness = rng.beta(0.6, 1.5)
+        noise = np.concatenate([[0.0], np.cumsum(rng.random(steps + window - 1))])
+        passing = (noise[window:] - noise[:-window]) / window
+        cloud_factor = 1 - 0.8 * cloudiness * np.clip(2 * passing, 0, 1)
+        light = clear_sky * cloud_factor * rng.normal(1, 0.01, steps)
+        yield pd.DataFrame({
+            'datetime': np.datetime64(day) + (seconds * 1e6).astype('timedelta64[us]'),
+            'latitude': np.full(steps, latitude), 'longitude': np.full(steps, longitude),
+            'pitch': rng.normal(rng.normal(0, 2), 0.2, steps),
+            'orientation_north': np.full(steps, rng.uniform(-180, 180)),
+            'current_light_level': np.maximum(light, 0.0),
+        })
+
+
+def load_file(path, vehicle_id=None):
+    frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    if vehicle_id is not None and 'vehicle_id' in frame:
+        frame = frame[frame['vehicle_id'] == vehicle_id]
+    return frame[INPUT_COLUMNS]
+
+
+def fetch_history(server_url, vehicle_id, start=None, end=None):
+    """Reads a vehicle's stored history from the server's /history endpoint (NDJSON)."""
+    params = {'vehicle_id': vehicle_id, 'fields': ','.join(INPUT_COLUMNS[1:]), 'format': 'ndjson',
+              'chunk_size': 10000}
+    if start:
+        params['start'] = start
+    if end:
+        params['end'] = end
+    response = requests.get(f"{server_url}/history", params=params, timeout=300)
+    response.raise_for_status()
+    return pd.read_json(io.StringIO(response.text), lines=True, dtype={'datetime': str})[INPUT_COLUMNS]
+
+
+def iter_by_day(frame):
+    days = pd.to_datetime(frame['datetime'], format=DATETIME_FORMAT).dt.date
+    for _, day_frame in frame.groupby(days.to_numpy(), sort=True):
+        yield day_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized solar tracker replay and strategy comparison")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV or Parquet telemetry log (e.g. from fleet_simulator.py)")
+    source.add_argument("--server", metavar="SERVER_URL", help="read the vehicle's history from SERVER_URL/history")
+    source.add_argument("--synthetic-days", type=int, help="replay a synthetic log of this many days")
+    parser.add_argument("--vehicle-id", default="ugv-1")
+    parser.add_argument("--start", help="first day (YYYY-MM-DD): history range or synthetic start")
+    parser.add_argument("--end", help="last day (YYYY-MM-DD) of the history range")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between synthetic samples")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help=f"comma-separated among {STRATEGIES}")
+    parser.add_argument("--light-threshold", type=float, default=LIGHT_THRESHOLD)
+    parser.add_argument("--stow-elevation", type=float, default=STOW_ELEVATION)
+    parser.add_argument("--gcr", type=float, default=GROUND_COVERAGE_RATIO, help="ground coverage ratio for backtracking")
+    parser.add_argument("--daily", help="write the daily energy table to this CSV file")
+    args = parser.parse_args()
+
+    strategies = [name.strip() for name in args.strategies.split(",") if name.strip()]
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies {unknown}, expected among {STRATEGIES}")
+    engine = TrackerReplay(light_threshold=args.light_threshold, stow_elevation=args.stow_elevation, gcr=args.gcr)
+    if args.synthetic_days:
+        start = date.fromisoformat(args.start) if args.start else date(date.today().year - 1, 1, 1)
+        frames = synthetic_days(start, args.synthetic_days, args.interval, ephemeris=engine.ephemeris)
+    elif args.input:
+        frames = iter_by_day(load_file(args.input, args.vehicle_id))
+    else:
+        frames = iter_by_day(fetch_history(args.server, args.vehicle_id, args.start, args.end))
+
+    t0 = time.perf_counter()
+    daily = engine.compare(frames, strategies)
+    elapsed = time.perf_counter() - t0
+    if args.daily:
+        daily.to_csv(args.daily, index=False)
+    totals = daily[strategies].sum() / 1000
+    reference = totals[strategies[0]]
+    print(f"{len(daily)} days replayed in {elapsed:.1f} s")
+    print(f"{'strategy':16s} {'kWh':>10s} {'vs ' + strategies[0]:>22s}")
+    for name in strategies:
+        gain = (totals[name] / reference - 1) * 100 if reference else 0.0
+        print(f"{name:16s} {totals[name]:10.2f} {gain:+21.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,37 @@
 import os
 import numpy as np
-import pandas as pd
 import pvlib
 import matplotlib.pyplot as plt
 from matplotlib.dates import DateFormatter, HourLocator
-from datetime import datetime
-import time as tm
 import streamlit as st
 import plotly.graph_objects as go
 import json
-import requests
+import argparse
+from solar_ephemeris import SolarEphemeris
+from spool_sender import SegmentSpool, SpoolSender
+from sensor_scheduler import SensorScheduler
+from imu_fusion import ImuFusion, ImuSimulator
+from deadband_filter import DeadbandFilter
+
+SERVER_URL = os.environ.get("UGV_SERVER_URL", "http://192.168.174.45:8000")
+VEHICLE_ID = "ugv-1"
+# Fréquence de chaque tâche (Hz) : lecture de la FIFO IMU, GPS et publication à 1 Hz, environnement plus lent
+SENSOR_RATES = {'imu': 10.0, 'gps': 1.0, 'environment': 0.2, 'power': 1.0, 'publish': 1.0}
+# Échantillons en attente d'envoi, conservés sur disque tant que le lien est coupé
+SPOOL_DIR = os.environ.get("UGV_SPOOL_DIR", "spool")
+EPHEMERIS_DISTANCE_M = 1000.0  # Déplacement au-delà duquel la table solaire est recalculée
+# Bande morte par champ : variation en dessous de laquelle le champ n'est pas retransmis
+DEADBANDS = {
+    'latitude': 1e-5, 'longitude': 1e-5,  # ~1 m
+    'sun_elevation': 0.1, 'sun_azimuth': 0.1, 'panel_elevation': 0.1, 'panel_azimuth': 0.1,
+    'processed_elevation': 0.1, 'processed_azimuth': 0.1,
+    'orientation_north': 0.5, 'pitch': 0.5, 'roll': 0.5,
+    'current_light_level': 10.0, 'temperature': 0.2, 'humidity': 1.0,
+    'velocity_total': 0.05, 'current_energy': 0.05, 'battery_level': 0.5, 'operating_time': 0.5,
+}
+HEARTBEAT_INTERVAL = 60.0  # Échantillon complet au moins toutes les N secondes (0 = tout envoyer)
+MAX_PUBLISH_RATE = 4.0  # Fréquence de publication maximale pendant les changements rapides (Hz)
+IMU_SAMPLE_RATE = 100.0  # Fréquence d'échantillonnage de l'IMU (Hz), lue par blocs depuis sa FIFO
 
 def simulate_imu_data(accel_mean=0, accel_std=1, gyro_mean=0, gyro_std=0.1, mag_mean=0, mag_std=1):
     accel_data = np.random.normal(accel_mean, accel_std, 3)
@@ -69,17 +91,15 @@ def simulate_sun_sensor(latitudes, longitudes, timestamps):
         solar_positions.append(solar_position)
     return solar_positions
 
+def actuator_angles(sun_elevation, sun_azimuth, current_light_level):
+    # Panneau à plat la nuit ou par faible luminosité
+    if sun_elevation < 0 or current_light_level < 200:
+        return 0, 0
+    return sun_elevation, sun_azimuth
+
 def simulate_actuator_movements(solar_positions, current_light_level):
-    panel_angles = []
-    for _, position in solar_positions.iterrows():
-        if position['elevation'] < 0 or current_light_level < 200:
-            elevation_angle = 0
-            azimuth_angle = 0
-        else:
-            elevation_angle = position['elevation']
-            azimuth_angle = position['azimuth']
-        panel_angles.append((elevation_angle, azimuth_angle))
-    return panel_angles
+    return [actuator_angles(elevation, azimuth, current_light_level)
+            for elevation, azimuth in zip(solar_positions['elevation'], solar_positions['azimuth'])]
 
 def process_angles(elevation_angle, azimuth_angle, yaw, pitch):
     if elevation_angle != 0 and azimuth_angle != 0:
@@ -90,83 +110,155 @@ def process_angles(elevation_angle, azimuth_angle, yaw, pitch):
         compensated_azimuth = 0
     return compensated_elevation, compensated_azimuth
 
-def main():
-    # Conditions initiales pour la vitesse
-    initial_velocity = np.array([0, 0, 0])  # En supposant que la vitesse initiale est nulle
-    previous_velocity = initial_velocity
-    delta_time = 1  # Intervalle de temps entre chaque lecture des données IMU (en secondes)
-
-    while True:
-        current_light_level = simulate_light_level()
-        current_temperature = simulate_temperature()
-        current_humidity = simulate_humidity()
-        current_datetime = datetime.now()
-        now = datetime.now().replace(minute=0, second=0, microsecond=0)
-        timestamps = now # Utilisation d'une chaîne au lieu d'une liste
-        latitude, longitude = simulate_gps_data()
-        latitudes = [latitude]
-        longitudes = [longitude]
-        solar_positions = simulate_sun_sensor(latitudes, longitudes, [now])
-        solar_positions_df = pd.concat(solar_positions).reset_index(drop=True)
-        panel_angles = simulate_actuator_movements(solar_positions_df, current_light_level)
-        panel_angles_df = pd.DataFrame(panel_angles, columns=['elevation_angle', 'azimuth_angle'])
-        accel_data, gyro_data, mag_data = simulate_imu_data()
-        roll, pitch, yaw = calculate_orientation(accel_data, mag_data)
+def main(batch_size=1, flush_interval=5.0, vehicle_id=VEHICLE_ID, ephemeris_distance=EPHEMERIS_DISTANCE_M,
+         server_url=SERVER_URL, spool_dir=SPOOL_DIR, rates=None, stats_interval=60.0,
+         imu_sample_rate=IMU_SAMPLE_RATE, deadbands=None, heartbeat=HEARTBEAT_INTERVAL,
+         max_publish_rate=MAX_PUBLISH_RATE, delta=False):
+    rates = {**SENSOR_RATES, **(rates or {})}
+    # Mode delta (facultatif) : seuls les champs modifiés partent vers /send_delta/, qui les
+    # complète avec le dernier état connu ; la tâche de publication tourne à la fréquence maximale
+    deadband = None
+    if delta and heartbeat:
+        deadband = DeadbandFilter({**DEADBANDS, **(deadbands or {})}, heartbeat=heartbeat,
+                                  min_interval=1.0 / max(max_publish_rate, rates['publish']),
+                                  max_interval=1.0 / rates['publish'])
+        rates['publish'] = max(max_publish_rate, rates['publish'])
+    # Les échantillons passent par la file sur disque ; un thread les envoie au serveur
+    # dès que batch_size échantillons sont prêts ou au plus tard toutes les flush_interval secondes.
+    # Deltas refusés faute d'état sur le serveur (409) : renvoyés complets vers /send_batch/
+    sender = SpoolSender(server_url, SegmentSpool(spool_dir), batch_size=batch_size, flush_interval=flush_interval,
+                         path="/send_delta/" if deadband else "/send_batch/",
+                         full_path="/send_batch/" if deadband else None).start()
+
+    # Position du soleil : table du jour calculée une fois, interpolée à chaque lecture
+    ephemeris = SolarEphemeris(max_distance_m=ephemeris_distance)
+    # Dernières valeurs de chaque capteur, mises à jour chacune à sa fréquence
+    latest = {}
+    # IMU échantillonnée à imu_sample_rate ; chaque lecture vide la FIFO et fusionne le bloc
+    # d'un coup (filtre complémentaire vectorisé), seul l'état final est publié
+    imu = ImuSimulator(imu_sample_rate)
+    fusion = ImuFusion(imu_sample_rate)
+
+    def read_imu(scheduled):
+        samples = max(1, round(imu_sample_rate * imu_task.period))
+        latest.update(fusion.update(*imu.read(samples)))
+
+    def read_gps(scheduled):
+        latest['latitude'], latest['longitude'] = simulate_gps_data()
+
+    def read_environment(scheduled):
+        latest['light_level'] = simulate_light_level()
+        latest['temperature'] = simulate_temperature()
+        latest['humidity'] = simulate_humidity()
+
+    def read_power(scheduled):
+        latest['energy'] = currently_produced_energy()
+        latest['battery_level'] = estimate_battery_level()
+        latest['operating_time'] = estimate_operating_time()
+
+    def publish(scheduled):
+        latitude, longitude = latest['latitude'], latest['longitude']
+        roll, pitch, yaw = latest['roll'], latest['pitch'], latest['yaw']
+        current_light_level = latest['light_level']
+        sun_elevation, sun_azimuth = ephemeris.position(scheduled, latitude, longitude)
+        panel_elevation, panel_azimuth = actuator_angles(sun_elevation, sun_azimuth, current_light_level)
         # Process angles
-        compensated_elevation, compensated_azimuth = process_angles(
-            panel_angles_df['elevation_angle'][0], 
-            panel_angles_df['azimuth_angle'][0], 
-            yaw, pitch
-        )
-
-        # Vitesse
-        accel_data = simulate_imu_data()
-        velocity = calculate_velocity(accel_data, previous_velocity, delta_time)
-        previous_velocity = velocity
-        velocity_total = estimate_vehicle_speed(velocity)
-
-        # Définir les valeurs d'énergie et d'angle
-        current_energy = currently_produced_energy()
-
-        battery_level = estimate_battery_level()
-        operating_time = estimate_operating_time()
-
-        # Créer le dictionnaire pour affichage
-        formatted_datetime = current_datetime.strftime("%Y-%m-%d %H:%M:%S.%f")
-        formatted_timestamps = timestamps.strftime("%Y-%m-%d %H:%M:%S.%f")
+        compensated_elevation, compensated_azimuth = process_angles(panel_elevation, panel_azimuth, yaw, pitch)
+        velocity_total = latest['speed']
+
+        # Horodatage = échéance prévue, et non l'instant où la boucle y est arrivée
+        formatted_datetime = scheduled.strftime("%Y-%m-%d %H:%M:%S.%f")
+        formatted_timestamps = scheduled.replace(minute=0, second=0, microsecond=0).strftime("%Y-%m-%d %H:%M:%S.%f")
         new_data = {
+            'vehicle_id': vehicle_id,  # Identifiant du véhicule dans la flotte
             'datetime': formatted_datetime,   # Utilisation directe de la chaîne
             'timestamp': formatted_timestamps,  # Utilisation directe de la chaîne
             'latitude': latitude,  # Valeur flottante
             'longitude': longitude,  # Valeur flottante
-            'sun_elevation': float(solar_positions_df['elevation'][0]),  # Valeur flottante
-            'sun_azimuth': float(solar_positions_df['azimuth'][0]),  # Valeur flottante
-            'panel_elevation': float(panel_angles_df['elevation_angle'][0]),  # Valeur flottante
-            'panel_azimuth': float(panel_angles_df['azimuth_angle'][0]),  # Valeur flottante
+            'sun_elevation': sun_elevation,  # Valeur flottante
+            'sun_azimuth': sun_azimuth,  # Valeur flottante
+            'panel_elevation': float(panel_elevation),  # Valeur flottante
+            'panel_azimuth': float(panel_azimuth),  # Valeur flottante
             'processed_elevation': float(compensated_elevation),  # Valeur flottante
             'processed_azimuth': float(compensated_azimuth),  # Valeur flottante
             'orientation_north': float(yaw),  # Valeur flottante
             'pitch': float(pitch),  # Valeur flottante
             'roll': float(roll),  # Valeur flottante
             'current_light_level': float(current_light_level),  # Valeur flottante
-            'temperature': float(current_temperature),  # Valeur flottante
-            'humidity': float(current_humidity),  # Valeur flottante
+            'temperature': float(latest['temperature']),  # Valeur flottante
+            'humidity': float(latest['humidity']),  # Valeur flottante
             'velocity_total': float(velocity_total),  # Valeur flottante
-            'current_energy': float(current_energy),  # Valeur flottante
-            'battery_level': int(battery_level),  # Valeur entière
-            'operating_time': int(operating_time)  # Valeur entière
+            'current_energy': float(latest['energy']),  # Valeur flottante
+            'battery_level': int(latest['battery_level']),  # Valeur entière
+            'operating_time': int(latest['operating_time'])  # Valeur entière
         }
 
         # Afficher le JSON pour vérifier son contenu
         #json_payload = json.dumps(new_data, indent=4)
         #print("JSON Payload being sent:\n", json_payload)
 
-        # Envoyer la requête POST
-        response = requests.post("http://192.168.174.45:8000/send_data/", json=new_data)
-        print(f"Response Status Code: {response.status_code}")
-        print(f"Response Content: {response.text}")
+        if deadband is not None:
+            new_data = deadband.offer(new_data, scheduled.timestamp())
+            if new_data is None:
+                return
+        # Mise en file : l'envoi ne bloque jamais l'acquisition
+        sender.submit(new_data)
+
+    def report(scheduled):
+        print(scheduler.format_stats())
+        if deadband is not None:
+            stats = deadband.stats()
+            print(f"deadband: {stats['sent']}/{stats['offered']} samples sent ({stats['full']} full), "
+                  f"{stats['fields_per_sample']:.1f} fields per sample")
 
-        tm.sleep(1)
+    # Chaque capteur à sa fréquence ; les tâches sont ajoutées dans l'ordre où elles doivent
+    # s'exécuter au démarrage pour que 'publish' trouve toutes les valeurs
+    scheduler = SensorScheduler()
+    imu_task = scheduler.add('imu', rates['imu'], read_imu)
+    scheduler.add('gps', rates['gps'], read_gps)
+    scheduler.add('environment', rates['environment'], read_environment)
+    scheduler.add('power', rates['power'], read_power)
+    scheduler.add('publish', rates['publish'], publish)
+    if stats_interval:
+        scheduler.add('stats', 1.0 / stats_interval, report)
+    scheduler.run()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Simulated UGV telemetry sender")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="number of spooled samples that triggers a POST to the server (1 = send each sample)")
+    parser.add_argument("--flush-interval", type=float, default=5.0,
+                        help="maximum number of seconds a sample waits in the spool while the link is up")
+    parser.add_argument("--vehicle-id", default=VEHICLE_ID,
+                        help="identifier of this vehicle in the fleet (letters, digits, '-' and '_')")
+    parser.add_argument("--ephemeris-distance", type=float, default=EPHEMERIS_DISTANCE_M,
+                        help="distance in meters the vehicle may move before the solar table is recomputed")
+    parser.add_argument("--server-url", default=SERVER_URL, help="base URL of the telemetry server")
+    parser.add_argument("--spool-dir", default=SPOOL_DIR, help="directory of the on-disk store-and-forward queue")
+    for task, rate in SENSOR_RATES.items():
+        parser.add_argument(f"--{task}-rate", type=float, default=rate, help=f"{task} task rate in Hz")
+    parser.add_argument("--imu-sample-rate", type=float, default=IMU_SAMPLE_RATE,
+                        help="IMU sampling rate in Hz; each imu task run fuses the samples accumulated since the last one")
+    parser.add_argument("--delta", action="store_true",
+                        help="send only the fields that moved beyond their deadband to /send_delta/, "
+                             "with an adaptive publish rate (default: one full sample per publish tick)")
+    parser.add_argument("--heartbeat", type=float, default=HEARTBEAT_INTERVAL,
+                        help="with --delta, seconds between full samples (0 = send every field of every sample)")
+    parser.add_argument("--max-publish-rate", type=float, default=MAX_PUBLISH_RATE,
+                        help="with --delta, publish rate in Hz reached while readings change quickly")
+    parser.add_argument("--deadband", action="append", default=[], metavar="FIELD=VALUE",
+                        help="override the deadband of one field (repeatable)")
+    parser.add_argument("--stats-interval", type=float, default=60.0,
+                        help="seconds between scheduler jitter/overrun reports (0 = never)")
+    args = parser.parse_args()
+    deadbands = {}
+    for item in args.deadband:
+        field, _, value = item.partition("=")
+        if field not in DEADBANDS or not value:
+            parser.error(f"invalid --deadband {item!r}: expected FIELD=VALUE with FIELD among {', '.join(DEADBANDS)}")
+        deadbands[field] = float(value)
+    main(batch_size=args.batch_size, flush_interval=args.flush_interval, vehicle_id=args.vehicle_id,
+         ephemeris_distance=args.ephemeris_distance, server_url=args.server_url, spool_dir=args.spool_dir,
+         rates={task: getattr(args, f"{task}_rate") for task in SENSOR_RATES}, stats_interval=args.stats_interval,
+         imu_sample_rate=args.imu_sample_rate, deadbands=deadbands, heartbeat=args.heartbeat,
+         max_publish_rate=args.max_publish_rate, delta=args.delta)